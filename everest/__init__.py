@@ -19,8 +19,15 @@ if not __EVEREST_SETUP__:
   from . import config
   from . import utils
   from . import math
+  from . import gram
+  from . import design
+  from . import mask
+  from . import linalg
+  from . import semisep
   from . import transit
   from . import pool
+  from . import pack
+  from . import store
   from . import fits
   from . import dvs
   from . import gp
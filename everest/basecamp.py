@@ -12,11 +12,16 @@ inherit from :py:class:`Basecamp`.
 from __future__ import division, print_function, absolute_import, unicode_literals
 from . import missions
 from .utils import InitLog, Formatter, AP_SATURATED_PIXEL, AP_COLLAPSED_PIXEL
-from .math import Chunks, Scatter, SavGol, Interpolate
-from .gp import GetCovariance
-from .search import Search
+from .math import Chunks, Scatter, SavGol, Interpolate, NumRegressors
+from .gp import GetCovariance, GetCovarianceSolver, GetCovarianceOperator
+from .gram import Gram
+from .design import DesignMatrices
+from .mask import Mask
+from .linalg import LambdaPaths, Woodbury, SelectSolver, MaskedSolver, PLDOperator
+from .pool import ChunkPool
+from .search import Search, PeriodicSearch
 from .transit import TransitModel
-from scipy.linalg import block_diag
+from .pack import Exists, Open, Rename
 import os, sys
 import numpy as np
 import george
@@ -24,7 +29,6 @@ import matplotlib.pyplot as pl
 import matplotlib.image as mpimg
 from matplotlib.ticker import MaxNLocator, FuncFormatter
 from scipy.ndimage import zoom
-from itertools import combinations_with_replacement as multichoose
 import traceback
 import logging
 log = logging.getLogger(__name__)
@@ -182,15 +186,125 @@ class Basecamp(object):
     
     raise NotImplementedError("Can't set this property.")
   
+  @property
+  def masks(self):
+    '''
+    The :py:class:`everest.mask.Mask` instance holding the masked cadences
+    for each of the mask categories.
+    
+    '''
+    
+    try:
+      self._masks
+    except AttributeError:
+      self._masks = Mask()
+    # The light curve size, used to resolve negative indices
+    time = getattr(self, 'time', None)
+    self._masks.size = len(time) if time is not None else None
+    return self._masks
+  
+  @masks.setter
+  def masks(self, value):
+    '''
+    
+    '''
+    
+    raise NotImplementedError("Can't set this property.")
+  
+  @property
+  def nanmask(self):
+    '''
+    The indices of the :py:obj:`NaN` cadences.
+    
+    '''
+    
+    return self.masks['nanmask']
+  
+  @nanmask.setter
+  def nanmask(self, value):
+    '''
+    
+    '''
+    
+    self.masks['nanmask'] = value
+  
+  @property
+  def badmask(self):
+    '''
+    The indices of the bad (flagged) cadences.
+    
+    '''
+    
+    return self.masks['badmask']
+  
+  @badmask.setter
+  def badmask(self, value):
+    '''
+    
+    '''
+    
+    self.masks['badmask'] = value
+  
+  @property
+  def outmask(self):
+    '''
+    The indices of the outliers.
+    
+    '''
+    
+    return self.masks['outmask']
+  
+  @outmask.setter
+  def outmask(self, value):
+    '''
+    
+    '''
+    
+    self.masks['outmask'] = value
+  
+  @property
+  def transitmask(self):
+    '''
+    The indices of the masked transit cadences.
+    
+    '''
+    
+    return self.masks['transitmask']
+  
+  @transitmask.setter
+  def transitmask(self, value):
+    '''
+    
+    '''
+    
+    self.masks['transitmask'] = value
+  
+  @property
+  def recmask(self):
+    '''
+    The indices of the cadences masked when the model was recursively computed (see :py:class:`everest.detrender.iPLD`).
+    
+    '''
+    
+    return self.masks['recmask']
+  
+  @recmask.setter
+  def recmask(self, value):
+    '''
+    
+    '''
+    
+    self.masks['recmask'] = value
+  
   @property
   def mask(self):
     '''
-    The array of indices to be masked. This is the union of the sets of outliers, bad (flagged)
+    The sorted array of indices to be masked. This is the union of the sets of outliers, bad (flagged)
     cadences, transit cadences, and :py:obj:`NaN` cadences.
     
     '''
     
-    return np.array(list(set(np.concatenate([self.outmask, self.badmask, self.transitmask, self.nanmask]))), dtype = int)
+    return self.masks.indices(len(self.time))
   
   @mask.setter
   def mask(self, value):
@@ -250,6 +364,50 @@ class Basecamp(object):
       self._transit_model = val
       self.transit_depth = None
   
+  @property
+  def lambda_paths(self):
+    '''
+    An optional :py:class:`everest.linalg.LambdaPaths` cache. If set, :py:meth:`compute`
+    re-uses the generalized eigendecomposition of each chunk whenever only one
+    *PLD* order's :py:obj:`lambda` changes between calls, so that each subsequent
+    call costs :math:`\mathcal{O}(N^2)`. Default :py:obj:`None`
+    
+    '''
+    
+    try:
+      self._lambda_paths
+    except AttributeError:
+      self._lambda_paths = None
+    return self._lambda_paths
+  
+  @lambda_paths.setter
+  def lambda_paths(self, value):
+    '''
+    
+    '''
+    
+    if value is True:
+      value = LambdaPaths()
+    elif value is False:
+      value = None
+    self._lambda_paths = value
+    
+  @property
+  def design(self):
+    '''
+    The :py:class:`everest.design.DesignMatrices` cache used by :py:meth:`X`,
+    with a memory budget of :py:attr:`design_memory` GB. It is
+    cleared automatically whenever :py:attr:`fpix`, :py:attr:`norm` or
+    :py:attr:`X1N` are replaced.
+    
+    '''
+    
+    try:
+      self._design
+    except AttributeError:
+      self._design = DesignMatrices(getattr(self, 'design_memory', 0.5))
+    return self._design
+    
   def get_norm(self):
     '''
     Computes the PLD normalization. In the base class, this is just
@@ -265,17 +423,204 @@ class Basecamp(object):
     The columns are the *PLD* vectors for the target at the
     corresponding order, computed as the product of the fractional pixel
     flux of all sets of :py:obj:`n` pixels, where :py:obj:`n` is the *PLD*
-    order.
+    order. The matrices are cached (see :py:attr:`design`), so the returned
+    array must not be modified in place.
     
     '''
 
-    X1 = self.fpix[j] / self.norm[j].reshape(-1, 1)
-    X = np.product(list(multichoose(X1.T, i + 1)), axis = 1).T
+    return self.design(self.fpix, self.norm, i, j, self.X1N)
+  
+  def get_gram(self, m, c = None, order = None):
+    '''
+    Returns a list of the *PLD* Gram matrices :py:obj:`X(n,c) . X(n,m).T` for
+    each order :py:obj:`n` up to :py:obj:`order`. These are computed implicitly
+    from the first order fractional pixel fluxes (see :py:mod:`gram.py`), so
+    the high order design matrices are never built.
+    
+    :param array_like m: The indices corresponding to the columns of the Gram matrices
+    :param array_like c: The indices corresponding to the rows of the Gram matrices. \
+                         Default :py:obj:`None`, in which case `c = m`
+    :param int order: The number of *PLD* orders to compute. Default :py:attr:`pld_order`
+    
+    '''
+    
+    if c is None:
+      c = m
+    if order is None:
+      order = self.pld_order
+    X1M = self.fpix[m] / self.norm[m].reshape(-1, 1)
+    X1C = self.fpix[c] / self.norm[c].reshape(-1, 1)
     if self.X1N is not None:
-      return np.hstack([X, self.X1N[j] ** (i + 1)])
+      return Gram(X1C, X1M, order, self.X1N[c], self.X1N[m])
     else:
-      return X
+      return Gram(X1C, X1M, order)
      
+  def get_regressors(self, b, c):
+    '''
+    Returns the *PLD* design matrix for chunk :py:obj:`b` at the indices :py:obj:`c`,
+    including all orders up to the current one, and the corresponding array of
+    prior variances :py:obj:`lambda` for each of its columns.
+    
+    '''
+    
+    orders = [n for n in range(self.pld_order) if (self.lam_idx >= n) and (self.lam[b][n] is not None)]
+    if len(orders) == 0:
+      return np.zeros((len(c), 0)), np.zeros(0)
+    X = [self.X(n, c) for n in orders]
+    lam = np.concatenate([self.lam[b][n] * np.ones(x.shape[1]) for n, x in zip(orders, X)])
+    return np.hstack(X), lam
+  
+  def get_operator(self, b, m, XM, T = None):
+    '''
+    Returns the :py:class:`everest.linalg.PLDOperator` for chunk :py:obj:`b` with
+    (masked) indices :py:obj:`m` and design matrix :py:obj:`XM` (see :py:meth:`get_regressors`),
+    plus the optional regressors :py:obj:`T`. The first order regressors, if any,
+    are included in the preconditioner.
+    
+    '''
+    
+    Kdot, Kinv = GetCovarianceOperator(self.kernel, self.kernel_params, self.time[m], self.fraw_err[m])
+    if (self.lam_idx >= 0) and (self.lam[b][0] is not None):
+      nprec = self.fpix.shape[1] + (self.X1N.shape[1] if self.X1N is not None else 0)
+    else:
+      nprec = 0
+    return PLDOperator(Kdot, Kinv, XM, T = T, tol = getattr(self, 'pcg_tol', 1e-10), 
+                       maxiter = getattr(self, 'pcg_maxiter', None), nprec = nprec)
+  
+  def get_num_regressors(self, b):
+    '''
+    Returns the number of *PLD* regressors in chunk :py:obj:`b` at the current order.
+    
+    '''
+    
+    norders = len([n for n in range(min(self.lam_idx + 1, self.pld_order)) if self.lam[b][n] is not None])
+    nreg = NumRegressors(self.fpix.shape[1], norders) if norders else 0
+    if self.X1N is not None:
+      nreg += norders * self.X1N.shape[1]
+    return nreg
+    
+  def get_solver(self, b, m):
+    '''
+    Returns the linear solver for chunk :py:obj:`b` with (masked) indices :py:obj:`m`:
+    either `cadence`, which solves the :math:`N \\times N` system in the space of
+    the cadences, or `regressor`, which solves for the weights in the space of the
+    *PLD* regressors (see :py:func:`everest.linalg.Woodbury`). Unless the :py:attr:`solver`
+    attribute is set to one of these, the cheaper of the two is selected based on the
+    number of regressors and the number of cadences. The `pcg` solver, which never forms
+    any dense matrices (see :py:class:`everest.linalg.PLDOperator`), is only used if
+    explicitly requested.
+    
+    '''
+    
+    nreg = self.get_num_regressors(b)
+    solver = getattr(self, 'solver', 'auto')
+    if solver == 'auto':
+      solver = SelectSolver(nreg, len(m), self.kernel)
+    log.info("Chunk %d/%d: %d regressors, %d cadences. Using the %s solver." % 
+             (b + 1, len(self.breakpoints), nreg, len(m), solver))
+    return solver
+  
+  def chunk_nbytes(self, b, copies = 1):
+    '''
+    Returns a rough estimate of the memory in bytes needed to solve
+    chunk :py:obj:`b`, i.e., the size of the (dense) chunk matrices
+    for each of the current *PLD* orders and the covariance, times
+    :py:obj:`copies`. For the `pcg` solver, this is instead the size of the
+    chunk design matrix plus a few vectors.
+    
+    '''
+    
+    n = len(self.get_chunk(b))
+    if getattr(self, 'solver', 'auto') == 'pcg':
+      return copies * 8 * n * (self.get_num_regressors(b) + 16)
+    return copies * 8 * n ** 2 * (min(self.lam_idx + 1, self.pld_order) + 3)
+  
+  def map_chunks(self, function, copies = 1):
+    '''
+    Returns the list :py:obj:`[function(b) for b in range(len(self.breakpoints))]`,
+    evaluating the (independent) chunks concurrently on a :py:class:`everest.pool.ChunkPool`
+    as set by the :py:attr:`chunk_pool`, :py:attr:`chunk_workers` and :py:attr:`chunk_memory`
+    attributes. The results are always in chunk order.
+    
+    :param callable function: A function of the chunk index
+    :param int copies: The approximate number of dense chunk matrices held \
+           by :py:obj:`function` at any one time, used to enforce the memory budget \
+           (see :py:meth:`chunk_nbytes`). Default `1`
+    
+    '''
+    
+    pool = ChunkPool(getattr(self, 'chunk_pool', 'serial'), 
+                     workers = getattr(self, 'chunk_workers', None), 
+                     memory = getattr(self, 'chunk_memory', None))
+    chunks = range(len(self.breakpoints))
+    return pool.map(function, chunks, nbytes = [self.chunk_nbytes(b, copies) for b in chunks])
+  
+  def compute_chunk(self, b):
+    '''
+    Returns the model for chunk :py:obj:`b` (including the padding on
+    either side) for the current value of lambda.
+    
+    '''
+    
+    # Masks for current chunk
+    m = self.get_masked_chunk(b)
+    c = self.get_chunk(b)
+    
+    # Get median
+    med = np.nanmedian(self.fraw[m])
+    
+    # Normalize the flux
+    f = self.fraw[m] - med
+    
+    # Solve in the space of the regressors?
+    solver = self.get_solver(b, m)
+    if solver == 'regressor':
+      XC, lam = self.get_regressors(b, c)
+      Kinv = GetCovarianceSolver(self.kernel, self.kernel_params, self.time[m], self.fraw_err[m])
+      w = Woodbury(Kinv, XC[np.searchsorted(c, m)], lam, f)
+      return np.dot(XC, w)
+    
+    # Solve iteratively, without forming any dense matrices?
+    elif solver == 'pcg':
+      XC, lam = self.get_regressors(b, c)
+      op = self.get_operator(b, m, XC[np.searchsorted(c, m)])
+      return np.dot(XC, op.weights(op.solve(f, lam), lam))
+    
+    # This block of the masked covariance matrix
+    mK = GetCovariance(self.kernel, self.kernel_params, self.time[m], self.fraw_err[m])
+    
+    # Can we re-use the lambda path for this chunk?
+    if self.lambda_paths is not None:
+      lam = [l if self.lam_idx >= n else None for n, l in enumerate(self.lam[b])]
+      # The paths depend on the normalization and the neighbor regressors
+      # too, which change between calls to `compute()` in iPLD
+      X1N = self.X1N[c].tobytes() if self.X1N is not None else None
+      token = (hash(m.tobytes()), tuple(self.kernel_params), 
+               hash(np.asarray(self.norm)[c].tobytes()), hash(X1N))
+      model = self.lambda_paths(b, lam, lambda: self.path_precompute(m, c, mK, f), token = token)
+      if model is not None:
+        return model
+          
+    # The X^2 matrices
+    B = np.zeros((len(c), len(m)))
+    G = self.get_gram(m, c, order = min(self.lam_idx + 1, self.pld_order))
+    
+    # Loop over all orders
+    for n in range(self.pld_order):
+
+      # Only compute up to the current PLD order
+      if (self.lam_idx >= n) and (self.lam[b][n] is not None):
+        B += self.lam[b][n] * G[n]
+    del G
+    
+    # The masked chunk is a subset of the chunk, so `A` is just a
+    # subset of the rows of `B`
+    A = B[np.searchsorted(c, m)]
+      
+    # Compute the model
+    W = np.linalg.solve(mK + A, f)
+    return np.dot(B, W)
+    
   def compute(self):
     '''
     Compute the model for the current value of lambda.
@@ -288,45 +633,18 @@ class Basecamp(object):
 
     log.info('Computing the model...')
     
-    # Loop over all chunks
-    model = [None for b in self.breakpoints]
-    for b, brkpt in enumerate(self.breakpoints):
+    # Solve all chunks
+    self.join_chunks(self.map_chunks(self.compute_chunk))
+  
+  def join_chunks(self, model):
+    '''
+    Stitches together the (padded) models for each of the chunks into the
+    light curve-wide :py:attr:`model`, subtracts its median, and updates the CDPP.
+    
+    :param list model: The models for each of the chunks, as returned by :py:meth:`compute_chunk`
+    
+    '''
     
-      # Masks for current chunk
-      m = self.get_masked_chunk(b)
-      c = self.get_chunk(b)
-      
-      # This block of the masked covariance matrix
-      mK = GetCovariance(self.kernel, self.kernel_params, self.time[m], self.fraw_err[m])
-      
-      # Get median
-      med = np.nanmedian(self.fraw[m])
-      
-      # Normalize the flux
-      f = self.fraw[m] - med
-            
-      # The X^2 matrices
-      A = np.zeros((len(m), len(m)))
-      B = np.zeros((len(c), len(m)))
-      
-      # Loop over all orders
-      for n in range(self.pld_order):
-
-        # Only compute up to the current PLD order
-        if (self.lam_idx >= n) and (self.lam[b][n] is not None):
-          XM = self.X(n,m)
-          XC = self.X(n,c)
-          A += self.lam[b][n] * np.dot(XM, XM.T)
-          B += self.lam[b][n] * np.dot(XC, XM.T)
-          del XM, XC
-        
-      # Compute the model
-      W = np.linalg.solve(mK + A, f)
-      model[b] = np.dot(B, W)
-
-    # Free up some memory
-    del A, B, W
-      
     # Join the chunks after applying the correct offset
     if len(model) > 1:
 
@@ -334,17 +652,18 @@ class Basecamp(object):
       self.model = model[0][:-self.bpad]
   
       # Center chunks
+      masked = self.masks.masked(len(self.time))
       for m in model[1:-1]:
         # Join the chunks at the first non-outlier cadence
         i = 1
-        while len(self.model) - i in self.mask:
+        while masked[len(self.model) - i]:
           i += 1
         offset = self.model[-i] - m[self.bpad - i]
         self.model = np.concatenate([self.model, m[self.bpad:-self.bpad] + offset])
   
       # Last chunk
       i = 1
-      while len(self.model) - i in self.mask:
+      while masked[len(self.model) - i]:
         i += 1
       offset = self.model[-i] - model[-1][self.bpad - i]
       self.model = np.concatenate([self.model, model[-1][self.bpad:] + offset])      
@@ -361,17 +680,134 @@ class Basecamp(object):
     self.cdpp = self.get_cdpp()
     self._weights = None
     
+  def masked_chunk_solver(self, b, fixed):
+    '''
+    Returns the tuple `(c, u, B, solver)` used by :py:meth:`compute_masked` to
+    re-compute the model for chunk :py:obj:`b` as the outlier mask changes, where `c`
+    are the chunk indices, `u` are the indices of all cadences in the chunk that are
+    not in :py:obj:`fixed`, `B` is the matrix :py:obj:`X(c) . X(u).T` weighted by
+    :py:obj:`lambda`, and `solver` is a :py:class:`everest.linalg.MaskedSolver` for
+    the system on `u`. Returns :py:obj:`None` if the chunk is solved in regressor space
+    or iteratively, which is cheap enough to do from scratch.
+    
+    :param array_like fixed: The indices that remain masked throughout
+    
+    '''
+    
+    c = self.get_chunk(b)
+    u = np.setdiff1d(c, fixed)
+    if self.get_solver(b, u) in ['regressor', 'pcg']:
+      return None
+    B = np.zeros((len(c), len(u)))
+    G = self.get_gram(u, c, order = min(self.lam_idx + 1, self.pld_order))
+    for n in range(self.pld_order):
+      if (self.lam_idx >= n) and (self.lam[b][n] is not None):
+        B += self.lam[b][n] * G[n]
+    del G
+    mK = GetCovariance(self.kernel, self.kernel_params, self.time[u], self.fraw_err[u])
+    mK += B[np.searchsorted(c, u)]
+    return c, u, B, MaskedSolver(mK)
+  
+  def compute_masked(self, solvers):
+    '''
+    Computes the model for the current value of lambda and the current
+    outlier mask, re-using the factorizations in :py:obj:`solvers`
+    (see :py:meth:`masked_chunk_solver`). This is equivalent to, but much
+    faster than, calling :py:meth:`compute` after a small change to the mask.
+    
+    :param list solvers: The masked chunk solvers for each chunk
+    
+    '''
+    
+    def model(b):
+      if solvers[b] is None:
+        return self.compute_chunk(b)
+      c, u, B, solver = solvers[b]
+      m = self.get_masked_chunk(b)
+      med = np.nanmedian(self.fraw[m])
+      r = np.searchsorted(u, np.setdiff1d(u, m))
+      return np.dot(B, solver.solve(self.fraw[u] - med, r))
+    
+    self.join_chunks(self.map_chunks(model))
+  
+  def path_precompute(self, m, c, mK, f):
+    '''
+    Returns the tuple `(A, B, K, f)` needed to initialize a
+    :py:class:`everest.linalg.LambdaPath` for the chunk with masked
+    indices :py:obj:`m` and unmasked indices :py:obj:`c`.
+    
+    '''
+    
+    B = self.get_gram(m, c, order = min(self.lam_idx + 1, self.pld_order))
+    i = np.searchsorted(c, m)
+    A = [G[i] for G in B]
+    return A, B, mK, f
+  
+  def joint_chunk(self, b, med):
+    '''
+    Applies the inverse of the *PLD* + GP covariance matrix of (unpadded) chunk
+    :py:obj:`b` to the flux and to the transit regressors for :py:meth:`compute_joint`.
+    Returns the tuple `(Z, T, P, L)`, where `Z` is the solution for the flux (first
+    column) and for each of the transit regressors, `T` are the transit regressors
+    scaled by the square root of their prior variance, and `P` and `L` are needed
+    to compute the *PLD* model from the solution vector: `P` is the matrix
+    :py:obj:`B` if `L` is :py:obj:`None`, or the design matrix if `L` is the array
+    of regressor prior variances.
+    
+    :param float med: The median of the flux over the full light curve
+    
+    '''
+    
+    # Masks for current chunk
+    m = self.get_masked_chunk(b, pad = False)
+    c = self.get_chunk(b, pad = False)
+    
+    # The normalized, masked flux
+    f = self.fraw[m] - med
+    
+    # The transit regressors, scaled by the square root of their prior variance,
+    # after subtracting off the mean total transit model
+    if self.transit_model is not None:
+      f -= med * np.sum([tm.depth * tm(self.time[m]) for tm in self.transit_model], axis = 0)
+      T = np.hstack([med * np.sqrt(tm.var_depth) * tm(self.time[m]).reshape(-1,1) for tm in self.transit_model])
+    else:
+      T = np.zeros((len(m), 0))
+    Y = np.hstack([f.reshape(-1,1), T])
+    
+    # Apply the inverse of this chunk's PLD + GP covariance matrix to the flux
+    # and to the transit regressors
+    solver = self.get_solver(b, m)
+    if solver == 'regressor':
+      XC, lam = self.get_regressors(b, c)
+      XM = XC[np.searchsorted(c, m)]
+      Kinv = GetCovarianceSolver(self.kernel, self.kernel_params, self.time[m], self.fraw_err[m])
+      return Kinv(Y - np.dot(XM, Woodbury(Kinv, XM, lam, Y))), T, XC, lam
+    elif solver == 'pcg':
+      XC, lam = self.get_regressors(b, c)
+      op = self.get_operator(b, m, XC[np.searchsorted(c, m)])
+      return op.solve(Y, lam), T, XC, lam
+    else:
+      B = np.zeros((len(c), len(m)))
+      G = self.get_gram(m, c, order = min(self.lam_idx + 1, self.pld_order))
+      for n in range(self.pld_order):
+        if (self.lam_idx >= n) and (self.lam[b][n] is not None):
+          B += self.lam[b][n] * G[n]
+      del G
+      mK = GetCovariance(self.kernel, self.kernel_params, self.time[m], self.fraw_err[m])
+      return np.linalg.solve(mK + B[np.searchsorted(c, m)], Y), T, B, None
+  
   def compute_joint(self):
     '''
     Compute the model in a single step, allowing for a light curve-wide
-    transit model. This is a bit more expensive to compute. 
+    transit model. The *PLD* system is solved independently in each
+    chunk, and the (few) transit regressors, which couple all the chunks,
+    are folded in via a low-rank Woodbury update, so this costs about
+    the same as :py:meth:`compute`.
     
     '''
     
     # Init
     log.info('Computing the joint model...')
-    A = [None for b in self.breakpoints]
-    B = [None for b in self.breakpoints]
     
     # We need to make sure that we're not masking the transits we are trying to fit!
     # NOTE: If there happens to be an index that *SHOULD* be masked during a transit
@@ -381,83 +817,46 @@ class Basecamp(object):
       outmask = np.array(self.outmask)
       transitmask = np.array(self.transitmask)
       transit_inds = np.where(np.sum([tm(self.time) for tm in self.transit_model], axis = 0) < 0)[0]
-      self.outmask = np.array([i for i in self.outmask if i not in transit_inds])
-      self.transitmask = np.array([i for i in self.transitmask if i not in transit_inds])
-      
-    # Loop over all chunks
-    for b, brkpt in enumerate(self.breakpoints):
+      self.outmask = np.setdiff1d(self.outmask, transit_inds)
+      self.transitmask = np.setdiff1d(self.transitmask, transit_inds)
     
-      # Masks for current chunk
-      m = self.get_masked_chunk(b, pad = False)
-      c = self.get_chunk(b, pad = False)
-      
-      # The X^2 matrices
-      A[b] = np.zeros((len(m), len(m)))
-      B[b] = np.zeros((len(c), len(m)))
-      
-      # Loop over all orders
-      for n in range(self.pld_order):
-
-        # Only compute up to the current PLD order
-        if (self.lam_idx >= n) and (self.lam[b][n] is not None):
-          XM = self.X(n,m)
-          XC = self.X(n,c)
-          A[b] += self.lam[b][n] * np.dot(XM, XM.T)
-          B[b] += self.lam[b][n] * np.dot(XC, XM.T)
-          del XM, XC
-    
-    # Merge chunks. BIGA and BIGB are sparse, but unfortunately
-    # scipy.sparse doesn't handle sparse matrix inversion all that
-    # well when the *result* is not itself sparse. So we're sticking
-    # with regular np.linalg.
-    BIGA = block_diag(*A)
-    del A
-    BIGB = block_diag(*B)
-    del B
-    
-    # Compute the full covariance matrix
-    mK = GetCovariance(self.kernel, self.kernel_params, self.apply_mask(self.time), self.apply_mask(self.fraw_err))
-    
-    # The normalized, masked flux array
-    f = self.apply_mask(self.fraw)
-    med = np.nanmedian(f)
-    f -= med
+    # The global median
+    med = np.nanmedian(self.apply_mask(self.fraw))
+    
+    # Solve all chunks
+    Z, T, P, L = zip(*self.map_chunks(lambda b: self.joint_chunk(b, med)))
+    
+    # The solution vector for the full light curve
+    W = np.concatenate([z[:,0] for z in Z])
     
     # Are we computing a joint transit model?
     if self.transit_model is not None:
       
-      # Get the unmasked indices
-      m = self.apply_mask()
-
-      # Subtract off the mean total transit model
-      mean_transit_model = med * np.sum([tm.depth * tm(self.time[m]) for tm in self.transit_model], axis = 0)
-      f -= mean_transit_model
-    
-      # Now add each transit model to the matrix of regressors
-      for tm in self.transit_model:
-        XM = tm(self.time[m]).reshape(-1,1)
-        XC = tm(self.time).reshape(-1,1)
-        BIGA += med ** 2 * tm.var_depth * np.dot(XM, XM.T)
-        BIGB += med ** 2 * tm.var_depth * np.dot(XC, XM.T)
-        del XM, XC
-    
-      # Dot the inverse of the covariance matrix
-      W = np.linalg.solve(mK + BIGA, f)
-      self.model = np.dot(BIGB, W)
-
+      # The transit regressors couple all the chunks through
+      # a small (number of transits squared) Schur complement
+      T = np.vstack(T)
+      ZT = np.vstack([z[:,1:] for z in Z])
+      S = np.dot(T.T, ZT)
+      S[np.diag_indices_from(S)] += 1.
+      W -= np.dot(ZT, np.linalg.solve(S, np.dot(T.T, W)))
+      
       # Compute the transit weights and maximum likelihood transit model
-      w_trn = med ** 2 * np.concatenate([tm.var_depth * np.dot(tm(self.time[m]).reshape(1,-1), W) for tm in self.transit_model])
+      w_trn = np.array([med * np.sqrt(tm.var_depth) for tm in self.transit_model]) * np.dot(T.T, W)
       self.transit_depth = np.array([med * tm.depth + w_trn[i] for i, tm in enumerate(self.transit_model)]) / med
-
-      # Remove the transit prediction from the model
-      self.model -= np.dot(np.hstack([tm(self.time).reshape(-1,1) for tm in self.transit_model]), w_trn)
-      
-    else:
-      
-      # No transit model to worry about
-      W = np.linalg.solve(mK + BIGA, f)
-      self.model = np.dot(BIGB, W)
-
+    
+    # The PLD model, which excludes the transit prediction
+    model = [None for b in self.breakpoints]
+    i = np.cumsum([0] + [len(z) for z in Z])
+    for b, brkpt in enumerate(self.breakpoints):
+      Wb = W[i[b]:i[b + 1]]
+      if L[b] is None:
+        model[b] = np.dot(P[b], Wb)
+      else:
+        XM = P[b][np.searchsorted(self.get_chunk(b, pad = False), self.get_masked_chunk(b, pad = False))]
+        model[b] = np.dot(P[b], L[b] * np.dot(XM.T, Wb))
+    self.model = np.concatenate(model)
+    del Z, P
+    
     # Subtract the global median
     self.model -= np.nanmedian(self.model)
     
@@ -480,10 +879,22 @@ class Basecamp(object):
     '''
     
     if x is None:
-      return np.delete(np.arange(len(self.time)), self.mask)
+      return self.masks.unmasked(len(self.time))
     else:
-      return np.delete(x, self.mask, axis = 0)
+      return x[self.masks.unmasked(len(self.time))]
 
+  def _chunk_bounds(self, b, pad = True):
+    '''
+    Returns the indices `(lo, hi)` such that chunk :py:obj:`b` spans `lo < i <= hi`.
+    
+    '''
+    
+    hi = int(self.breakpoints[b]) + int(pad) * self.bpad
+    if b > 0:
+      return int(self.breakpoints[b - 1]) - int(pad) * self.bpad, hi
+    else:
+      return -1, hi
+  
   def get_chunk(self, b, x = None, pad = True):
     '''
     Returns the indices corresponding to a given light curve chunk.
@@ -493,11 +904,7 @@ class Basecamp(object):
 
     '''
 
-    M = np.arange(len(self.time))
-    if b > 0:
-      res = M[(M > self.breakpoints[b - 1] - int(pad) * self.bpad) & (M <= self.breakpoints[b] + int(pad) * self.bpad)]
-    else:
-      res = M[M <= self.breakpoints[b] + int(pad) * self.bpad]
+    res = self.masks.chunk(len(self.time), *self._chunk_bounds(b, pad), categories = ())
     if x is None:
       return res
     else:
@@ -511,11 +918,7 @@ class Basecamp(object):
     
     '''
     
-    M = self.apply_mask(np.arange(len(self.time)))
-    if b > 0:
-      res = M[(M > self.breakpoints[b - 1] - int(pad) * self.bpad) & (M <= self.breakpoints[b] + int(pad) * self.bpad)]
-    else:
-      res = M[M <= self.breakpoints[b] + int(pad) * self.bpad]
+    res = self.masks.chunk(len(self.time), *self._chunk_bounds(b, pad))
     if x is None:
       return res
     else:
@@ -531,32 +934,43 @@ class Basecamp(object):
     
     log.info("Computing PLD weights...")
     
-    # Loop over all chunks
-    weights = [None for i in range(len(self.breakpoints))]
-    for b, brkpt in enumerate(self.breakpoints):
-
+    # The median of the full light curve
+    med = np.nanmedian(self.fraw)
+    
+    def weights(b):
+    
       # Masks for current chunk
       m = self.get_masked_chunk(b)
-      c = self.get_chunk(b)
+      
+      # This chunk of the normalized flux
+      f = self.fraw[m] - med
+      
+      # Solve iteratively, without forming any dense matrices?
+      if self.get_solver(b, m) == 'pcg':
+        orders = [n for n, l in enumerate(self.lam[b]) if (l is not None) and (self.lam_idx >= n)]
+        X = [self.X(n, m) for n in orders]
+        lam = np.concatenate([self.lam[b][n] * np.ones(x.shape[1]) for n, x in zip(orders, X)])
+        W = self.get_operator(b, m, np.hstack(X)).solve(f, lam)
+        return [self.lam[b][n] * np.dot(x.T, W) for n, x in zip(orders, X)]
       
       # This block of the masked covariance matrix
       _mK = GetCovariance(self.kernel, self.kernel_params, self.time[m], self.fraw_err[m])
       
-      # This chunk of the normalized flux
-      f = self.fraw[m] - np.nanmedian(self.fraw)  
-      
       # Loop over all orders
       _A = [None for i in range(self.pld_order)]
+      G = self.get_gram(m, order = min(self.lam_idx + 1, self.pld_order))
       for n in range(self.pld_order):
         if self.lam_idx >= n:
-          X = self.X(n,m)
-          _A[n] = np.dot(X, X.T)
-          del X
+          _A[n] = G[n]
+      del G
           
       # Compute the weights
       A = np.sum([l * a for l, a in zip(self.lam[b], _A) if l is not None], axis = 0)
       W = np.linalg.solve(_mK + A, f)
-      weights[b] = [l * np.dot(self.X(n,m).T, W) for n, l in enumerate(self.lam[b]) if l is not None]
+      return [l * np.dot(self.X(n,m).T, W) for n, l in enumerate(self.lam[b]) if l is not None]
+    
+    # Loop over all chunks
+    weights = self.map_chunks(weights)
     
     self._weights = weights
   
@@ -586,9 +1000,14 @@ class Basecamp(object):
     the time series. Also plots a high resolution image of the target, if available.
     
     '''
-    
+
+    # Headless runs (see :py:class:`everest.dvs.HeadlessDVS`) have nothing
+    # to record here: the images are part of the saved model
+    if axes[0] is None:
+      return
+
     log.info('Plotting the aperture...')
-        
+
     # Get colormap
     plasma = pl.get_cmap('plasma')
     plasma.set_bad(alpha = 0)
@@ -646,24 +1065,34 @@ class Basecamp(object):
   
   def search(self, pos_tol = 2.5, neg_tol = 50., clobber = False, name = 'search', **kwargs):
     '''
+    Runs the single transit search (see :py:func:`everest.search.Search`) and
+    saves the results to a text file and the delta chi-squared plot to a `pdf`.
+    
+    :returns: The arrays of times, depths, depth variances and delta chi-squared values
     
     '''
     
     log.info("Searching for transits...")
-    fname = os.path.join(self.dir, self.name + '_%s.npz' % name)
+    fname = os.path.join(self.dir, self.name + '_%s.txt' % name)
     pname = os.path.join(self.dir, self.name + '_%s.pdf' % name)
     
+    # Older versions saved the text file with an `.npz` extension
+    legacy = os.path.join(self.dir, self.name + '_%s.npz' % name)
+    if not Exists(fname) and Exists(legacy) and not clobber:
+      Rename(legacy, fname)
+    
     # Compute
-    if not os.path.exists(fname) or clobber:
+    if not Exists(fname) or clobber:
       time, depth, vardepth, delchisq = Search(self, pos_tol = pos_tol, neg_tol = neg_tol, **kwargs)
       data = np.vstack([time, depth, vardepth, delchisq]).T
       header = "TIME, DEPTH, VARDEPTH, DELTACHISQ"
       np.savetxt(fname, data, fmt = str('%.10e'), header = header)
     else:
-      time, depth, vardepth, delchisq = np.loadtxt(fname, unpack = True, skiprows = 1)
+      with Open(fname) as f:
+        time, depth, vardepth, delchisq = np.loadtxt(f, unpack = True, skiprows = 1)
     
     # Plot
-    if not os.path.exists(pname) or clobber:
+    if not Exists(pname) or clobber:
       fig, ax = pl.subplots(1, figsize = (10, 4))
       ax.plot(time, delchisq, lw = 1)
       ax.set_ylabel(r'$\Delta \chi^2$', fontsize = 18)
@@ -672,4 +1101,47 @@ class Basecamp(object):
       fig.savefig(pname, bbox_inches = 'tight')
       pl.close()
     
-    return time, depth, vardepth, delchisq
\ No newline at end of file
+    return time, depth, vardepth, delchisq
+  
+  def periodic_search(self, clobber = False, name = 'search', search_kwargs = {}, **kwargs):
+    '''
+    Stacks the single transit depths from :py:meth:`search` over a grid of periods
+    and epochs (see :py:func:`everest.search.PeriodicSearch`) and saves the
+    periodogram to a text file and a `pdf` plot.
+    
+    :param bool clobber: Overwrite existing results? Default :py:obj:`False`
+    :param str name: The name of the search. Default `search`
+    :param dict search_kwargs: Keyword arguments passed to :py:meth:`search`. Default `{}`
+    
+    :returns: The arrays of periods, and the epochs, depths, depth variances and delta \
+              chi-squared values at each period
+    
+    '''
+    
+    time, depth, vardepth, _ = self.search(clobber = clobber, name = name, **search_kwargs)
+    log.info("Running the periodic search...")
+    fname = os.path.join(self.dir, self.name + '_%s_periodic.txt' % name)
+    pname = os.path.join(self.dir, self.name + '_%s_periodic.pdf' % name)
+    
+    # Compute
+    if not Exists(fname) or clobber:
+      periods, epoch, depth, vardepth, delchisq = PeriodicSearch(time, depth, vardepth, **kwargs)
+      data = np.vstack([periods, epoch, depth, vardepth, delchisq]).T
+      header = "PERIOD, EPOCH, DEPTH, VARDEPTH, DELTACHISQ"
+      np.savetxt(fname, data, fmt = str('%.10e'), header = header)
+    else:
+      with Open(fname) as f:
+        periods, epoch, depth, vardepth, delchisq = np.loadtxt(f, unpack = True, skiprows = 1)
+    
+    # Plot
+    if not Exists(pname) or clobber:
+      fig, ax = pl.subplots(1, figsize = (10, 4))
+      ax.plot(periods, delchisq, lw = 1)
+      ax.set_xscale('log')
+      ax.set_ylabel(r'$\Delta \chi^2$', fontsize = 18)
+      ax.set_xlabel('Period (days)', fontsize = 18)
+      ax.set_xlim(periods[0], periods[-1])
+      fig.savefig(pname, bbox_inches = 'tight')
+      pl.close()
+    
+    return periods, epoch, depth, vardepth, delchisq
\ No newline at end of file
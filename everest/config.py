@@ -50,6 +50,15 @@ else:
   #: The MAST url where the light curves are published
   MAST_ROOT = 'https://archive.stsci.edu/missions/hlsp/everest/v2/'
 
+#: The MAST `EPIC` catalog search url
+MAST_EPIC_URL = os.environ.get('EVEREST2_MAST_EPIC_URL', 'http://archive.stsci.edu/k2/epic/search.php')
+#: The Digitized Sky Survey cutout url
+DSS_URL = os.environ.get('EVEREST2_DSS_URL', 'https://archive.stsci.edu/cgi-bin/dss_search')
+#: The timeout in seconds for web requests
+EVEREST_TIMEOUT = float(os.environ.get('EVEREST2_TIMEOUT', 60.))
+#: The number of times failed web requests are retried
+EVEREST_RETRIES = int(os.environ.get('EVEREST2_RETRIES', 3))
+
 #: Everest quality bit: masked because a Kepler flag was raised
 QUALITY_BAD = 23
 #: Everest quality bit: masked because data was NaN
@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+:py:mod:`design.py` - PLD design matrices
+-----------------------------------------
+
+A cache for the *PLD* design matrices :math:`\mathbf{X}_n`. The columns of the
+order :math:`n + 1` matrix are the products of the columns of the order :math:`n`
+matrix with each of the first order fractional pixel fluxes whose index is not
+smaller than that of the last pixel in the product, so each order is built
+incrementally from the previous one instead of from scratch. Matrices are stored
+per order and per set of cadence indices, and the least recently used ones are
+discarded once the cache exceeds its memory budget.
+
+'''
+
+from __future__ import division, print_function, absolute_import, unicode_literals
+import numpy as np
+from collections import OrderedDict
+import threading
+import logging
+log = logging.getLogger(__name__)
+
+__all__ = ['DesignMatrices']
+
+def _key(j):
+  '''
+  Returns a hashable key for the index set :py:obj:`j`.
+
+  '''
+
+  if isinstance(j, slice):
+    return ('slice', j.start, j.stop, j.step)
+  j = np.asarray(j)
+  return (j.dtype.str, j.shape, j.tobytes())
+
+class DesignMatrices(object):
+  '''
+  A least recently used cache of the *PLD* design matrices. The cache is
+  tied to the arrays of pixel fluxes, normalization and neighbor regressors
+  it is called with, and is cleared automatically whenever any of them
+  is replaced by a different array. Arrays modified in place are not
+  detected, so call :py:meth:`clear` after doing that.
+
+  :param float memory: The memory budget in GB. Default `0.5`
+
+  '''
+
+  def __init__(self, memory = 0.5):
+    '''
+
+    '''
+
+    self.memory = memory
+    self._lock = threading.RLock()
+    self.clear()
+
+  def clear(self):
+    '''
+    Clears the cache.
+
+    '''
+
+    with self._lock:
+      self._cache = OrderedDict()
+      self._nbytes = 0
+      self._arrays = None
+
+  @property
+  def nbytes(self):
+    '''
+    The number of bytes currently stored in the cache.
+
+    '''
+
+    return self._nbytes
+
+  def _store(self, key, value):
+    '''
+    Adds an entry to the cache, evicting the least recently used ones to
+    stay within the memory budget.
+
+    '''
+
+    nbytes = value[0].nbytes + value[1].nbytes
+    budget = self.memory * 1024 ** 3
+    if nbytes > budget:
+      return
+    with self._lock:
+      if key in self._cache:
+        return
+      while self._nbytes + nbytes > budget:
+        _, old = self._cache.popitem(last = False)
+        self._nbytes -= old[0].nbytes + old[1].nbytes
+      self._cache[key] = value
+      self._nbytes += nbytes
+
+  def _get(self, fpix, norm, i, j, key):
+    '''
+    Returns the tuple `(X, last)`, where `X` is the pixel part of the order :py:obj:`i`
+    design matrix at the indices :py:obj:`j` and `last` is the index of the last
+    pixel in the product for each of its columns.
+
+    '''
+
+    # Cache hit?
+    with self._lock:
+      value = self._cache.pop((i, key), None)
+      if value is not None:
+        self._cache[(i, key)] = value
+        return value
+
+    # Build it from the previous order
+    if i == 0:
+      X = fpix[j] / norm[j].reshape(-1, 1)
+      last = np.arange(X.shape[1])
+    else:
+      X1, _ = self._get(fpix, norm, 0, j, key)
+      Xp, lastp = self._get(fpix, norm, i - 1, j, key)
+      npix = X1.shape[1]
+      cols = np.repeat(np.arange(Xp.shape[1]), npix - lastp)
+      last = np.concatenate([np.arange(l, npix) for l in lastp])
+      X = Xp[:, cols] * X1[:, last]
+    X.flags.writeable = False
+    self._store((i, key), (X, last))
+    return X, last
+
+  def __call__(self, fpix, norm, i, j = slice(None, None, None), X1N = None):
+    '''
+    Returns the design matrix at *PLD* order :py:obj:`i + 1` and indices :py:obj:`j`,
+    identical to the explicit product over all multisets of :py:obj:`i + 1` pixels
+    (in lexicographic order), followed by the neighbor regressors :py:obj:`X1N`
+    raised to the power :py:obj:`i + 1`. The returned array must not be modified.
+
+    :param ndarray fpix: The pixel fluxes (*N*, *npix*)
+    :param ndarray norm: The normalization (*N*)
+    :param int i: The order index, i.e., the *PLD* order minus one
+    :param j: The cadence indices. Default all cadences
+    :param ndarray X1N: The first order neighbor regressors. Default :py:obj:`None`
+
+    '''
+
+    # Invalidate if any of the arrays changed
+    arrays = (fpix, norm, X1N)
+    with self._lock:
+      if (self._arrays is None) or any([a is not b for a, b in zip(arrays, self._arrays)]):
+        self.clear()
+        self._arrays = arrays
+
+    X, _ = self._get(fpix, norm, i, j, _key(j))
+    if X1N is not None:
+      return np.hstack([X, X1N[j] ** (i + 1)])
+    else:
+      return X
@@ -15,11 +15,15 @@ from __future__ import division, print_function, absolute_import, unicode_litera
 from . import missions
 from .basecamp import Basecamp
 from .config import EVEREST_DAT
+from .store import ModelExists, SaveModel, LoadModel, DiscardModel
+from .mask import Mask, CATEGORIES
 from .utils import InitLog, Formatter, AP_SATURATED_PIXEL, AP_COLLAPSED_PIXEL
 from .math import Chunks, Scatter, SavGol, Interpolate
 from .fits import MakeFITS
 from .gp import GetCovariance, GetKernelParams, GP
-from .dvs import DVS, CBV
+from .linalg import LambdaPath, LambdaPaths
+from .dvs import DVS, HeadlessDVS, CBV
+from .pack import Exists, Open, Remove
 import os, sys
 import numpy as np
 import george
@@ -29,6 +33,7 @@ from matplotlib.ticker import MaxNLocator
 from matplotlib.backends.backend_pdf import PdfPages
 from PyPDF2 import PdfFileReader, PdfFileWriter
 import traceback
+from multiprocessing.pool import ThreadPool
 import logging
 log = logging.getLogger(__name__)
 
@@ -71,6 +76,8 @@ class Detrender(Basecamp):
   :param int cbv_niter: The number of :py:obj:`SysRem` iterations to perform when computing CBVs. Default 50
   :param int cbv_win: The filter window size (in cadences) for smoothing the CBVs. Default 999
   :param int cbv_order: The filter order for smoothing CBVs. Default 3
+  :param str cbv_method: The CBV extraction method, `sysrem` or `svd` \
+                     (see :py:func:`everest.missions.k2.sysrem.GetCBVs`). Default `sysrem`
   :param int cdivs: The number of light curve subdivisions when cross-validating. During each iteration, \
                     one of these subdivisions will be masked and used as the validation set. Default 3
   :param str cv_min: The quantity to be minimized during cross-validation. Default `MAD` (median absolute 
@@ -87,6 +94,10 @@ class Detrender(Basecamp):
                                    and timescale in days). Default :py:obj:`None` (determined from the data)
   :param bool get_hires: Download a high resolution image of the target? Default :py:obj:`True`
   :param bool get_nearby: Retrieve the location of nearby sources? Default :py:obj:`True`
+  :param bool headless: Skip the plotting? If :py:obj:`True`, the run does not draw the DVS. It only \
+                        records the data shown on it (the light curve model after each *PLD* order \
+                        and the cross-validation curves) in the saved model, and the DVS is rendered \
+                        later by :py:meth:`plot_dvs`. Default :py:obj:`False`
   :param array_like lambda_arr: The array of :math:`\Lambda` values to iterate over during the \
                                 cross-validation step. :math:`\Lambda` is the regularization parameter,
                                 or the standard deviation of \
@@ -95,10 +106,11 @@ class Detrender(Basecamp):
   :param float leps: The fractional tolerance when optimizing :math:`\Lambda`. The chosen value of \
                      :math:`\Lambda` will be within this amount of the minimum of the CDPP curve. \
                      Default 0.05
-  :param int max_pixels: The maximum number of pixels. Very large apertures are likely to cause memory \
-                         errors, particularly for high order PLD. If the chosen aperture exceeds this many \
+  :param int max_pixels: The maximum number of pixels. If the chosen aperture exceeds this many \
                          pixels, a different aperture is chosen from the dataset. If no apertures with fewer \
-                         than this many pixels are available, an error is thrown. Default 75
+                         than this many pixels are available, an error is thrown. Since the *PLD* Gram matrices \
+                         are computed implicitly, the memory footprint no longer grows with the number of \
+                         pixels, so this may be set to :py:obj:`None` to disable the cap. Default 75
   :param bool optimize_gp: Perform the GP optimization steps? Default :py:obj:`True`
   :param float osigma: The outlier standard deviation threshold. Default 5
   :param int oiter: The maximum number of steps taken during iterative sigma clipping. Default 10
@@ -109,13 +121,32 @@ class Detrender(Basecamp):
                   bias the cross-validation scheme to lower values of lambda, leading to severe underfitting. \
                   This parameter should be a tuple or a list of tuples in the form (`t0`, `period`, `duration`) \
                   for each of the planets to be masked (all values in days).
-  :param int pld_order: The pixel level decorrelation order. Default `3`. Higher orders may cause memory errors
+  :param int pld_order: The pixel level decorrelation order. Default `3`
   :param str saturated_aperture_name: If the target is found to be saturated, de-trending is performed \
                                       on this aperture instead. Defaults to the mission default
   :param float saturation_tolerance: The tolerance when determining whether or not to collapse a column \
                                      in the aperture. The column collapsing is implemented in the individual \
                                      mission modules. Default -0.1, i.e., if a target is 10% shy of the \
                                      nominal saturation level, it is considered to be saturated.
+  :param str solver: The linear solver used to compute the model in each light curve chunk. \
+                     `cadence` solves the :math:`N \\times N` system in the space of the cadences, and \
+                     `regressor` solves for the *PLD* weights in the space of the regressors, and \
+                     `pcg` solves the system iteratively without forming any dense matrices, in memory \
+                     linear in the number of cadences (see :py:class:`everest.linalg.PLDOperator`). \
+                     The latter requires the `Basic` kernel and is meant for very long chunks, such as \
+                     full campaigns of short cadence data with `breakpoints = False`. \
+                     Default `auto`, which selects the cheaper of `cadence` and `regressor` for each chunk
+  :param float pcg_tol: The relative tolerance of the `pcg` solver. Default `1e-10`
+  :param int pcg_maxiter: The maximum number of iterations of the `pcg` solver. Default :py:obj:`None` \
+                          (ten times the number of regressors, plus 100)
+  :param str chunk_pool: The pool used to solve the light curve chunks concurrently: `thread`, `process` \
+                         or `serial` (see :py:class:`everest.pool.ChunkPool`). Default `serial`, since batch \
+                         runs already start one process per core; set this to `thread` for single targets
+  :param int chunk_workers: The maximum number of chunks solved at once. Default :py:obj:`None` (the number of CPUs)
+  :param float chunk_memory: The memory budget in GB for the chunks being solved at once. \
+                             Default :py:obj:`None` (half of the available memory)
+  :param float design_memory: The memory budget in GB for the cache of *PLD* design matrices \
+                              (see :py:class:`everest.design.DesignMatrices`). Default `0.5`
   :param transit_model: An instance or list of instances of :py:class:`everest.transit.TransitModel`. If specified, \
                         :py:obj:`everest` will include these in the regression when calculating the PLD coefficients. \
                         The final instrumental light curve model will **not** include the transit fits -- they are used \
@@ -154,12 +185,10 @@ class Detrender(Basecamp):
       kernel_params = kwargs.get('kernel_params', None)
       if kernel_params is None:
         log.info("Loading long cadence model...")
-        kwcpy = dict(kwargs)
-        kwcpy.pop('cadence', None)
-        kwcpy.pop('clobber', None)
-        lc = self.__class__(ID, is_parent = True, **kwcpy)
-        kernel_params = np.array(lc.kernel_params)
-        del lc
+        name = self.__class__.__name__
+        if not ModelExists(self.dir, name):
+          raise Exception('Unable to load `%s` model for target %d.' % (name, self.ID))
+        kernel_params = np.array(LoadModel(self.dir, name)['kernel_params'][()])
       kwargs.update({'kernel_params': kernel_params, 'optimize_gp': False})
       
     # Read general model kwargs
@@ -176,6 +205,17 @@ class Detrender(Basecamp):
     self.kernel_params = kwargs.get('kernel_params', None)  
     self.kernel = kwargs.get('kernel', 'Basic')  
     assert self.kernel in ['Basic', 'QuasiPeriodic'], "Kwarg `kernel` must be one of `Basic` or `QuasiPeriodic`."
+    self.solver = kwargs.get('solver', 'auto')
+    assert self.solver in ['auto', 'cadence', 'regressor', 'pcg'], "Kwarg `solver` must be one of `auto`, `cadence`, `regressor` or `pcg`."
+    if self.solver == 'pcg':
+      assert self.kernel == 'Basic', "The `pcg` solver requires the `Basic` kernel."
+    self.pcg_tol = kwargs.get('pcg_tol', 1e-10)
+    self.pcg_maxiter = kwargs.get('pcg_maxiter', None)
+    self.chunk_pool = kwargs.get('chunk_pool', 'serial')
+    assert self.chunk_pool in ['thread', 'process', 'serial'], "Kwarg `chunk_pool` must be one of `thread`, `process` or `serial`."
+    self.chunk_workers = kwargs.get('chunk_workers', None)
+    self.chunk_memory = kwargs.get('chunk_memory', None)
+    self.design_memory = kwargs.get('design_memory', 0.5)
     self.clobber_tpf = kwargs.get('clobber_tpf', False)
     self.bpad = kwargs.get('bpad', 100)
     self.aperture_name = kwargs.get('aperture', None)
@@ -185,6 +225,7 @@ class Detrender(Basecamp):
     self.gp_factor = kwargs.get('gp_factor', 100.)
     self.get_hires = kwargs.get('get_hires', True)
     self.get_nearby = kwargs.get('get_nearby', True)
+    self.headless = kwargs.get('headless', False)
     self.planets = kwargs.get('planets', [])
     if type(self.planets) is tuple and len(self.planets) == 3 and not hasattr(self.planets[0], '__len__'):
       self.planets = [self.planets]
@@ -206,6 +247,7 @@ class Detrender(Basecamp):
     self.cbv_niter = kwargs.get('cbv_niter', 50)
     self.cbv_win = kwargs.get('cbv_win', 999)
     self.cbv_order = kwargs.get('cbv_order', 3)
+    self.cbv_method = kwargs.get('cbv_method', 'sysrem')
 
     # Get the pld order
     pld_order = kwargs.get('pld_order', 3)
@@ -231,10 +273,15 @@ class Detrender(Basecamp):
     self.cdppg = np.nan
     self.neighbors = []
     self.loaded = False
+    self._lazy = {}
     self._weights = None
     
     # Initialize plotting
-    self.dvs = DVS(len(self.breakpoints), pld_order = self.pld_order)
+    self._reset_dvs()
+    if self.headless:
+      self.dvs = HeadlessDVS()
+    else:
+      self.dvs = DVS(len(self.breakpoints), pld_order = self.pld_order)
     
     # Check for saved model
     if self.load_model():
@@ -246,6 +293,17 @@ class Detrender(Basecamp):
     # Run
     self.run()
     
+  def _reset_dvs(self):
+    '''
+    Clears the data recorded for the DVS in headless runs.
+    
+    '''
+    
+    self.dvs_model = []
+    self.dvs_lc = []
+    self.dvs_cv = []
+    self.dvs_gp = None
+    
   @property
   def name(self):
     '''
@@ -296,14 +354,13 @@ class Detrender(Basecamp):
     # Pre-compute the matrices
     A = [None for i in range(self.pld_order)]
     B = [None for i in range(self.pld_order)] 
+    G = self.get_gram(m2, m1, order = min(self.lam_idx + 1, self.pld_order))
     for n in range(self.pld_order):
       # Only compute up to the current PLD order
       if self.lam_idx >= n:
-        X2 = self.X(n,m2)
-        X1 = self.X(n,m1)
-        A[n] = np.dot(X2, X2.T)
-        B[n] = np.dot(X1, X2.T)
-        del X1, X2
+        B[n] = G[n]
+        A[n] = M(G[n])
+    del G
     
     if self.transit_model is None:
       C = 0
@@ -344,10 +401,19 @@ class Detrender(Basecamp):
             
     log.info("Clipping outliers...")
     log.info('Iter %d/%d: %d outliers' % (0, self.oiter, len(self.outmask)))
-    M = lambda x: np.delete(x, np.concatenate([self.nanmask, self.badmask, self.transitmask]), axis = 0)
-    t = M(self.time)
+    categories = ('nanmask', 'badmask', 'transitmask')
+    fixed = self.masks.indices(len(self.time), categories)
+    M = lambda x: x[self.masks.unmasked(len(self.time), categories)]
     outmask = [np.array([-1]), np.array(self.outmask)]
     
+    # Factorize each chunk once, including all cadences that may become
+    # outliers; each iteration then only needs to account for the change in
+    # the outlier mask
+    if self.transit_model is None:
+      solvers = self.map_chunks(lambda b: self.masked_chunk_solver(b, fixed))
+    else:
+      solvers = None
+    
     # Loop as long as the last two outlier arrays aren't equal
     while not np.array_equal(outmask[-2], outmask[-1]):
 
@@ -362,7 +428,10 @@ class Detrender(Basecamp):
         break
       
       # Compute the model to get the flux
-      self.compute()
+      if solvers is None:
+        self.compute()
+      else:
+        self.compute_masked(solvers)
     
       # Get the outliers
       f = SavGol(M(self.flux))
@@ -371,7 +440,7 @@ class Detrender(Basecamp):
       inds = np.where((f > med + self.osigma * MAD) | (f < med - self.osigma * MAD))[0]
       
       # Project onto unmasked time array
-      inds = np.array([np.argmax(self.time == t[i]) for i in inds])
+      inds = self.masks.project(inds, len(self.time), categories)
       self.outmask = np.array(inds, dtype = int)
       
       # Add them to the running list
@@ -379,6 +448,8 @@ class Detrender(Basecamp):
       
       # Log
       log.info('Iter %d/%d: %d outliers' % (len(outmask) - 2, self.oiter, len(self.outmask)))
+    
+    del solvers
 
   def optimize_lambda(self, validation):
     '''
@@ -423,82 +494,160 @@ class Detrender(Basecamp):
     elif self.cv_min == 'tv':
       # We're going to minimize the total variation instead
       return 1.e6 * np.sum(np.abs(np.diff(y[mask]))) / len(mask) / y0
+  
+  def cv_path(self, b, A, B, C, mK, f, m1, m2):
+    '''
+    Returns a :py:class:`everest.linalg.LambdaPath` instance for chunk :py:obj:`b`
+    (cross-validation step only), which computes the same model as :py:meth:`cv_compute`
+    as a function of the :py:obj:`lambda` of the current *PLD* order, holding
+    all other orders fixed.
+    
+    '''
+    
+    return LambdaPath(self.lam[b], self.lam_idx, A, B, mK + C, f)
+  
+  def cv_operator(self, mask, b):
+    '''
+    Returns a function of the :py:obj:`lambda` of the current *PLD* order that computes
+    the same model as :py:meth:`cv_path` for chunk :py:obj:`b` (cross-validation step only),
+    but with the iterative `pcg` solver (see :py:class:`everest.linalg.PLDOperator`), so that
+    no dense matrices are formed. Each solve is started from the solution for the previous
+    value of :py:obj:`lambda`, which is close when :py:attr:`lambda_arr` is traversed in order.
+    
+    '''
+    
+    # Get current chunk and mask the validation set
+    m1 = self.get_masked_chunk(b)
+    med = np.nanmedian(self.fraw[m1])
+    m2 = np.delete(m1, mask)
+    f = self.fraw[m2] - med
+    
+    # The design matrix for all orders up to the current one
+    orders = [n for n in range(self.lam_idx) if self.lam[b][n] is not None] + [self.lam_idx]
+    X = [self.X(n, m1) for n in orders]
+    X1 = np.hstack(X)
+    
+    # The transit regressors, scaled by the square root of their prior variance
+    if self.transit_model is None:
+      T = None
+    else:
+      f -= med * np.sum([tm.depth * tm(self.time[m2]) for tm in self.transit_model], axis = 0)
+      T = np.hstack([np.sqrt(tm.var_depth) * tm(self.time[m2]).reshape(-1,1) for tm in self.transit_model])
+    op = self.get_operator(b, m2, np.delete(X1, mask, axis = 0), T = T)
+    
+    state = dict(W = None)
+    def model(lam):
+      l = np.concatenate([(lam if n == self.lam_idx else self.lam[b][n]) * np.ones(x.shape[1]) 
+                          for n, x in zip(orders, X)])
+      state['W'] = op.solve(f, l, x0 = state['W'])
+      return np.dot(X1, op.weights(state['W'], l))
+    
+    return model
+      
+  def cv_chunk(self, b):
+    '''
+    Computes the scatter in the training and validation sets of chunk :py:obj:`b`
+    for each value of :py:obj:`lambda` in :py:attr:`lambda_arr`. Returns the
+    tuple `(training, validation)` of arrays of shape `(len(lambda_arr), cdivs)`,
+    or :py:obj:`None` if there is not enough data in the chunk.
+    
+    '''
+    
+    log.info("Cross-validating chunk %d/%d..." % (b + 1, len(self.breakpoints)))      
+      
+    # Mask for current chunk 
+    m = self.get_masked_chunk(b)
+    
+    # Check that we have enough data
+    if len(m) < 3 * self.cdivs:
+      log.info("Insufficient data to run cross-validation on this chunk.")
+      return None
+      
+    # Mask transits and outliers
+    time = self.time[m]
+    flux = self.fraw[m]
+    ferr = self.fraw_err[m]
+    med = np.nanmedian(flux)
       
+    # The precision in the validation set
+    validation = [[] for k, _ in enumerate(self.lambda_arr)]
+  
+    # The precision in the training set
+    training = [[] for k, _ in enumerate(self.lambda_arr)]
+  
+    # Setup the GP
+    gp = GP(self.kernel, self.kernel_params, white = False)
+    gp.compute(time, ferr)
+  
+    # The masks
+    masks = list(Chunks(np.arange(0, len(time)), len(time) // self.cdivs))
+    
+    # Pre-compute (training set). This is the same for all masks,
+    # and each value of lambda costs only O(N^2) along the path.
+    if self.solver == 'pcg':
+      path_t = self.cv_operator([], b)
+    else:
+      path_t = self.cv_path(b, *self.cv_precompute([], b))
+    
+    # Loop over the different masks
+    for i, mask in enumerate(masks):
+    
+      log.info("Chunk %d/%d, section %d/%d..." % (b + 1, len(self.breakpoints), i + 1, len(masks)))
+
+      # Pre-compute (validation set)
+      if self.solver == 'pcg':
+        path_v = self.cv_operator(mask, b)
+      else:
+        path_v = self.cv_path(b, *self.cv_precompute(mask, b))
+  
+      # Iterate over lambda
+      for k, lam in enumerate(self.lambda_arr):
+
+        # Training set
+        model = path_t(lam)
+        model -= np.nanmedian(model)
+        training[k].append(self.fobj(flux - model, med, time, gp, mask))
+        
+        # Validation set
+        model = path_v(lam)
+        model -= np.nanmedian(model)
+        validation[k].append(self.fobj(flux - model, med, time, gp, mask))
+      
+      del path_v
+    del path_t
+    
+    return np.array(training), np.array(validation)
+  
   def cross_validate(self, ax, info = ''):
     '''
-    Cross-validate to find the optimal value of :py:obj:`lambda`.
+    Cross-validate to find the optimal value of :py:obj:`lambda`. The
+    chunks are cross-validated concurrently (see :py:meth:`map_chunks`).
     
     :param ax: The current :py:obj:`matplotlib.pyplot` axis instance to plot the \
-               cross-validation results.
+               cross-validation results (see :py:meth:`plot_cv`).
     :param str info: The label to show in the bottom right-hand corner of the plot. Default `''`
     
     '''
     
+    # Cross-validate all chunks
+    results = self.map_chunks(self.cv_chunk, copies = 2 * self.pld_order + 2)
+    cv = dict(info = info, lam = [], chunks = [], cdpp_arr = None, cdppv_arr = None)
+    
     # Loop over all chunks
-    ax = np.atleast_1d(ax)
     for b, brkpt in enumerate(self.breakpoints):
     
-      log.info("Cross-validating chunk %d/%d..." % (b + 1, len(self.breakpoints)))      
-      med_training = np.zeros_like(self.lambda_arr)
-      med_validation = np.zeros_like(self.lambda_arr)
-        
-      # Mask for current chunk 
-      m = self.get_masked_chunk(b)
-      
       # Check that we have enough data
-      if len(m) < 3 * self.cdivs:
+      if results[b] is None:
         self.cdppv_arr[b] = np.nan
         self.lam[b][self.lam_idx] = 0.
-        log.info("Insufficient data to run cross-validation on this chunk.")
+        cv['lam'].append(0.)
+        cv['chunks'].append(None)
         continue
-        
-      # Mask transits and outliers
-      time = self.time[m]
-      flux = self.fraw[m]
-      ferr = self.fraw_err[m]
-      med = np.nanmedian(flux)
-        
-      # The precision in the validation set
-      validation = [[] for k, _ in enumerate(self.lambda_arr)]
-    
-      # The precision in the training set
-      training = [[] for k, _ in enumerate(self.lambda_arr)]
-    
-      # Setup the GP
-      gp = GP(self.kernel, self.kernel_params, white = False)
-      gp.compute(time, ferr)
-    
-      # The masks
-      masks = list(Chunks(np.arange(0, len(time)), len(time) // self.cdivs))
-    
-      # Loop over the different masks
-      for i, mask in enumerate(masks):
-      
-        log.info("Section %d/%d..." % (i + 1, len(masks)))
-      
-        # Pre-compute (training set)
-        pre_t = self.cv_precompute([], b)
-
-        # Pre-compute (validation set)
-        pre_v = self.cv_precompute(mask, b)
-    
-        # Iterate over lambda
-        for k, lam in enumerate(self.lambda_arr):
-      
-          # Update the lambda matrix
-          self.lam[b][self.lam_idx] = lam
-
-          # Training set
-          model = self.cv_compute(b, *pre_t)
-          training[k].append(self.fobj(flux - model, med, time, gp, mask))
-          
-          # Validation set
-          model = self.cv_compute(b, *pre_v)
-          validation[k].append(self.fobj(flux - model, med, time, gp, mask))
+      training, validation = results[b]
+      med_training = np.zeros_like(self.lambda_arr)
+      med_validation = np.zeros_like(self.lambda_arr)
       
       # Finalize
-      training = np.array(training)
-      validation = np.array(validation)
       for k, _ in enumerate(self.lambda_arr):
 
         # Take the mean
@@ -513,50 +662,83 @@ class Detrender(Basecamp):
       self.lam[b][self.lam_idx] = self.lambda_arr[i]
       log.info("Found optimum solution at log(lambda) = %.1f." % np.log10(self.lam[b][self.lam_idx]))
       
-      # Plotting: There's not enough space in the DVS to show the cross-val results
-      # for more than three light curve segments.
+      # Keep the curves we're going to plot. There's not enough space in the DVS
+      # to show the cross-val results for more than three light curve segments.
+      cv['lam'].append(self.lam[b][self.lam_idx])
       if len(self.breakpoints) <= 3:
-      
-        # Plotting hack: first x tick will be -infty
-        lambda_arr = np.array(self.lambda_arr)
-        lambda_arr[0] = 10 ** (np.log10(lambda_arr[1]) - 3)
-    
-        # Plot cross-val
-        for n in range(len(masks)):
-          ax[b].plot(np.log10(lambda_arr), validation[:,n], 'r-', alpha = 0.3)
-          
-        ax[b].plot(np.log10(lambda_arr), med_training, 'b-', lw = 1., alpha = 1)
-        ax[b].plot(np.log10(lambda_arr), med_validation, 'r-', lw = 1., alpha = 1)            
-        ax[b].axvline(np.log10(self.lam[b][self.lam_idx]), color = 'k', ls = '--', lw = 0.75, alpha = 0.75)
-        ax[b].axhline(v_best, color = 'k', ls = '--', lw = 0.75, alpha = 0.75)
-        ax[b].set_ylabel(r'Scatter (ppm)', fontsize = 5)
-        hi = np.max(validation[0])
-        lo = np.min(training)
-        rng = (hi - lo)
-        ax[b].set_ylim(lo - 0.15 * rng, hi + 0.15 * rng)
-        if rng > 2:
-          ax[b].get_yaxis().set_major_formatter(Formatter.CDPP)
-          ax[b].get_yaxis().set_major_locator(MaxNLocator(4, integer = True))
-        elif rng > 0.2:
-          ax[b].get_yaxis().set_major_formatter(Formatter.CDPP1F)
-          ax[b].get_yaxis().set_major_locator(MaxNLocator(4))
-        else:
-          ax[b].get_yaxis().set_major_formatter(Formatter.CDPP2F)
-          ax[b].get_yaxis().set_major_locator(MaxNLocator(4))
-          
-        # Fix the x ticks
-        xticks = [np.log10(lambda_arr[0])] + list(np.linspace(np.log10(lambda_arr[1]), np.log10(lambda_arr[-1]), 6))
-        ax[b].set_xticks(xticks)
-        ax[b].set_xticklabels(['' for x in xticks])
-        pad = 0.01 * (np.log10(lambda_arr[-1]) - np.log10(lambda_arr[0]))
-        ax[b].set_xlim(np.log10(lambda_arr[0]) - pad, np.log10(lambda_arr[-1]) + pad)
-        ax[b].annotate('%s.%d' % (info, b), xy = (0.02, 0.025), xycoords = 'axes fraction', 
-                       ha = 'left', va = 'bottom', fontsize = 7, alpha = 0.25, 
-                       fontweight = 'bold')
+        cv['chunks'].append(dict(validation = validation, med_training = med_training, 
+                                 med_validation = med_validation, v_best = v_best,
+                                 lo = np.min(training)))
+      else:
+        cv['chunks'].append(None)
     
     # Finally, compute the model
     self.compute()
     
+    # Plot
+    if len(self.breakpoints) > 3:
+      cv['cdpp_arr'] = self.get_cdpp_arr()
+      cv['cdppv_arr'] = self.cdppv_arr * cv['cdpp_arr']
+    self.plot_cv(ax, cv)
+  
+  def plot_cv(self, ax, cv):
+    '''
+    Plots the cross-validation results. If :py:obj:`ax` is :py:obj:`None` (in
+    headless runs), the results are saved for :py:meth:`plot_dvs` instead.
+    
+    :param ax: The current :py:obj:`matplotlib.pyplot` axis instance
+    :param dict cv: The cross-validation curves computed by :py:meth:`cross_validate`
+    
+    '''
+    
+    if ax is None:
+      self.dvs_cv.append(cv)
+      return
+    ax = np.atleast_1d(ax)
+    
+    # Plotting hack: first x tick will be -infty
+    lambda_arr = np.array(self.lambda_arr)
+    lambda_arr[0] = 10 ** (np.log10(lambda_arr[1]) - 3)
+    xticks = [np.log10(lambda_arr[0])] + list(np.linspace(np.log10(lambda_arr[1]), np.log10(lambda_arr[-1]), 6))
+    
+    for b, chunk in enumerate(cv['chunks']):
+      
+      if chunk is None:
+        continue
+      
+      # Plot cross-val
+      validation = chunk['validation']
+      for n in range(validation.shape[1]):
+        ax[b].plot(np.log10(lambda_arr), validation[:,n], 'r-', alpha = 0.3)
+        
+      ax[b].plot(np.log10(lambda_arr), chunk['med_training'], 'b-', lw = 1., alpha = 1)
+      ax[b].plot(np.log10(lambda_arr), chunk['med_validation'], 'r-', lw = 1., alpha = 1)            
+      ax[b].axvline(np.log10(cv['lam'][b]), color = 'k', ls = '--', lw = 0.75, alpha = 0.75)
+      ax[b].axhline(chunk['v_best'], color = 'k', ls = '--', lw = 0.75, alpha = 0.75)
+      ax[b].set_ylabel(r'Scatter (ppm)', fontsize = 5)
+      hi = np.max(validation[0])
+      lo = chunk['lo']
+      rng = (hi - lo)
+      ax[b].set_ylim(lo - 0.15 * rng, hi + 0.15 * rng)
+      if rng > 2:
+        ax[b].get_yaxis().set_major_formatter(Formatter.CDPP)
+        ax[b].get_yaxis().set_major_locator(MaxNLocator(4, integer = True))
+      elif rng > 0.2:
+        ax[b].get_yaxis().set_major_formatter(Formatter.CDPP1F)
+        ax[b].get_yaxis().set_major_locator(MaxNLocator(4))
+      else:
+        ax[b].get_yaxis().set_major_formatter(Formatter.CDPP2F)
+        ax[b].get_yaxis().set_major_locator(MaxNLocator(4))
+        
+      # Fix the x ticks
+      ax[b].set_xticks(xticks)
+      ax[b].set_xticklabels(['' for x in xticks])
+      pad = 0.01 * (np.log10(lambda_arr[-1]) - np.log10(lambda_arr[0]))
+      ax[b].set_xlim(np.log10(lambda_arr[0]) - pad, np.log10(lambda_arr[-1]) + pad)
+      ax[b].annotate('%s.%d' % (cv['info'], b), xy = (0.02, 0.025), xycoords = 'axes fraction', 
+                     ha = 'left', va = 'bottom', fontsize = 7, alpha = 0.25, 
+                     fontweight = 'bold')
+    
     # Tidy up
     if len(ax) == 2:
       ax[0].xaxis.set_ticks_position('top')
@@ -576,20 +758,18 @@ class Detrender(Basecamp):
         
       # We're just going to plot lambda as a function of chunk number
       bs = np.arange(len(self.breakpoints))
-      ax[0].plot(bs + 1, [np.log10(self.lam[b][self.lam_idx]) for b in bs], 'r.')
-      ax[0].plot(bs + 1, [np.log10(self.lam[b][self.lam_idx]) for b in bs], 'r-', alpha = 0.25)
+      ax[0].plot(bs + 1, [np.log10(cv['lam'][b]) for b in bs], 'r.')
+      ax[0].plot(bs + 1, [np.log10(cv['lam'][b]) for b in bs], 'r-', alpha = 0.25)
       ax[0].set_ylabel(r'$\log\Lambda$', fontsize = 5)
       ax[0].margins(0.1, 0.1)
       ax[0].set_xticks(np.arange(1, len(self.breakpoints) + 1))
       ax[0].set_xticklabels([])
       
       # Now plot the CDPP and approximate validation CDPP
-      cdpp_arr = self.get_cdpp_arr()
-      cdppv_arr = self.cdppv_arr * cdpp_arr
-      ax[1].plot(bs + 1, cdpp_arr, 'b.')
-      ax[1].plot(bs + 1, cdpp_arr, 'b-', alpha = 0.25)
-      ax[1].plot(bs + 1, cdppv_arr, 'r.')
-      ax[1].plot(bs + 1, cdppv_arr, 'r-', alpha = 0.25)
+      ax[1].plot(bs + 1, cv['cdpp_arr'], 'b.')
+      ax[1].plot(bs + 1, cv['cdpp_arr'], 'b-', alpha = 0.25)
+      ax[1].plot(bs + 1, cv['cdppv_arr'], 'r.')
+      ax[1].plot(bs + 1, cv['cdppv_arr'], 'r-', alpha = 0.25)
       ax[1].margins(0.1, 0.1)
       ax[1].set_ylabel(r'Scatter (ppm)', fontsize = 5)
       ax[1].set_xlabel(r'Chunk', fontsize = 5)
@@ -634,13 +814,21 @@ class Detrender(Basecamp):
     Plots the current light curve. This is called at several stages to plot the
     de-trending progress as a function of the different *PLD* orders.
     
-    :param ax: The current :py:obj:`matplotlib.pyplot` axis instance
+    :param ax: The current :py:obj:`matplotlib.pyplot` axis instance. If :py:obj:`None` \
+               (in headless runs), the current model is saved for :py:meth:`plot_dvs` instead
     :param str info_left: Information to display at the left of the plot. Default `''`
     :param str info_right: Information to display at the right of the plot. Default `''`
     :param str color: The color of the data points. Default `'b'`
     
     '''
 
+    if ax is None:
+      self.dvs_model.append(np.array(self.model))
+      self.dvs_lc.append(dict(outmask = np.array(self.outmask), cdpp_arr = np.array(self.cdpp_arr), 
+                              cdpp = self.cdpp, ylim = self.get_ylim(), info_left = info_left, 
+                              info_right = info_right, color = color))
+      return
+    
     # Plot
     if (self.cadence == 'lc') or (len(self.time) < 4000):
       ax.plot(self.apply_mask(self.time), self.apply_mask(self.flux), ls = 'none', marker = '.', color = color, markersize = 2, alpha = 0.5)
@@ -652,7 +840,7 @@ class Detrender(Basecamp):
     ylim = self.get_ylim()
     
     # Plot the outliers, but not the NaNs
-    badmask = [i for i in self.badmask if i not in self.nanmask]
+    badmask = np.setdiff1d(self.badmask, self.nanmask)
     O1 = lambda x: x[self.outmask]
     O2 = lambda x: x[badmask]
     if self.cadence == 'lc':
@@ -722,10 +910,36 @@ class Detrender(Basecamp):
   
   def plot_final(self, ax):
     '''
-    Plots the final de-trended light curve.
+    Plots the final de-trended light curve and computes the CDPP of the
+    GP-detrended flux. If :py:obj:`ax` is :py:obj:`None` (in headless runs),
+    the GP prediction is saved for :py:meth:`plot_dvs` instead.
     
     '''
- 
+    
+    # The GP (long cadence only)
+    if self.cadence == 'lc':
+      med = np.nanmedian(self.apply_mask(self.flux))
+      if self.dvs_gp is not None:
+        y = self.dvs_gp
+      else:
+        gp = GP(self.kernel, self.kernel_params, white = False)
+        gp.compute(self.apply_mask(self.time), self.apply_mask(self.fraw_err))
+        y, _ = gp.predict(self.apply_mask(self.flux) - med, self.time)
+        y += med
+      
+      # Compute the CDPP of the GP-detrended flux
+      self.cdppg = self._mission.CDPP(self.apply_mask(self.flux - y + med), cadence = self.cadence)
+    
+    else:
+      
+      # We're not going to calculate this
+      self.cdppg = 0.
+    
+    if ax is None:
+      if self.cadence == 'lc':
+        self.dvs_gp = y
+      return
+    
     # Plot the light curve
     bnmask = np.array(list(set(np.concatenate([self.badmask, self.nanmask]))), dtype = int)
     M = lambda x: np.delete(x, bnmask)
@@ -741,21 +955,8 @@ class Detrender(Basecamp):
     
     # Plot the GP (long cadence only)
     if self.cadence == 'lc':
-      gp = GP(self.kernel, self.kernel_params, white = False)
-      gp.compute(self.apply_mask(self.time), self.apply_mask(self.fraw_err))
-      med = np.nanmedian(self.apply_mask(self.flux))
-      y, _ = gp.predict(self.apply_mask(self.flux) - med, self.time)
-      y += med
       ax.plot(M(self.time), M(y), 'r-', lw = 0.5, alpha = 0.5)
       
-      # Compute the CDPP of the GP-detrended flux
-      self.cdppg = self._mission.CDPP(self.apply_mask(self.flux - y + med), cadence = self.cadence)
-    
-    else:
-      
-      # We're not going to calculate this
-      self.cdppg = 0.
-      
     # Appearance
     ax.annotate('Final', xy = (0.98, 0.025), xycoords = 'axes fraction', 
                 ha = 'right', va = 'bottom', fontsize = 10, alpha = 0.5, 
@@ -823,6 +1024,8 @@ class Detrender(Basecamp):
     '''
     
     axl, axc, axr = dvs.title()
+    if axc is None:
+      return
     axc.annotate("%s %d" % (self._mission.IDSTRING, self.ID),
                  xy = (0.5, 0.5), xycoords = 'axes fraction', 
                  ha = 'center', va = 'center', fontsize = 18)
@@ -906,9 +1109,23 @@ class Detrender(Basecamp):
       
       self.loaded = True
   
+  def __getattr__(self, key):
+    '''
+    Loads the large arrays of a saved model when they are first accessed.
+    
+    '''
+    
+    lazy = self.__dict__.get('_lazy', None)
+    if lazy is not None and key in lazy:
+      value = lazy.pop(key).load(key, mmap_mode = 'c')
+      setattr(self, key, value)
+      return value
+    raise AttributeError(key)
+    
   def load_model(self, name = None):
     '''
-    Loads a saved version of the model.
+    Loads a saved version of the model. The large arrays are read lazily, as 
+    copy-on-write memory maps (see :py:mod:`everest.store`).
     
     '''
     
@@ -917,15 +1134,21 @@ class Detrender(Basecamp):
     
     if name is None:
       name = self.name    
-    file = os.path.join(self.dir, '%s.npz' % name)
-    if os.path.exists(file):
+    if ModelExists(self.dir, name):
       if not self.is_parent: 
-        log.info("Loading '%s.npz'..." % name)
+        log.info("Loading '%s'..." % name)
       try:
-        data = np.load(file)
+        data = LoadModel(self.dir, name)
         for key in data.keys():
+          if (key in data.arrays) and not hasattr(type(self), key):
+            self.__dict__.pop(key, None)
+            self._lazy[key] = data
+            continue
           try:
-            setattr(self, key, data[key][()])
+            if key in data.arrays:
+              setattr(self, key, data.load(key, mmap_mode = 'c'))
+            else:
+              setattr(self, key, data[key][()])
           except NotImplementedError:
             pass
             
@@ -948,12 +1171,12 @@ class Detrender(Basecamp):
         
         return True
       except:
-        log.warn("Error loading '%s.npz'." % name)
+        log.warn("Error loading '%s'." % name)
         exctype, value, tb = sys.exc_info()
         for line in traceback.format_exception_only(exctype, value):
           l = line.replace('\n', '')
           log.warn(l)
-        os.rename(file, file + '.bad')
+        DiscardModel(self.dir, name)
     
     if self.is_parent:
       raise Exception('Unable to load `%s` model for target %d.' % (self.name, self.ID))
@@ -962,30 +1185,53 @@ class Detrender(Basecamp):
 
   def save_model(self):
     '''
-    Saves all of the de-trending information to disk in an `npz` file
-    and saves the DVS as a `pdf`.
+    Saves all of the de-trending information to disk (see :py:mod:`everest.store`)
+    and saves the DVS as a `pdf`, unless this is a headless run.
     
     '''
     
+    # Map the arrays we haven't accessed yet, since the files are about to be replaced
+    for key in list(self._lazy.keys()):
+      getattr(self, key)
+    
     # Save the data
-    log.info("Saving data to '%s.npz'..." % self.name)
+    log.info("Saving data to '%s'..." % self.name)
     d = dict(self.__dict__)
+    d.pop('_lazy', None)
     d.pop('_weights', None)
+    d.pop('_lambda_paths', None)
+    d.pop('_design', None)
+    d.pop('_masks', None)
+    d.update(self.masks.__getstate__())
     d.pop('_A', None)
     d.pop('_B', None)
     d.pop('_f', None)
     d.pop('_mK', None)
     d.pop('K', None)
     d.pop('dvs', None)
+    d.pop('headless', None)
+    d['dvs_model'] = np.array(self.dvs_model)
     d.pop('clobber', None)
     d.pop('clobber_tpf', None)
     d.pop('_mission', None)
     d.pop('debug', None)
     d.pop('transit_model', None)
     d.pop('_transit_model', None)
-    np.savez(os.path.join(self.dir, self.name + '.npz'), **d)
+    SaveModel(self.dir, self.name, d)
+    self._mission.IndexModel(self)
+    
+    # Save the DVS, or discard the one from a previous run
+    if not self.headless:
+      self.save_dvs()
+    elif Exists(os.path.join(self.dir, self.name + '.pdf')):
+      Remove(os.path.join(self.dir, self.name + '.pdf'))
+  
+  def save_dvs(self):
+    '''
+    Saves the DVS as a `pdf`.
+    
+    '''
     
-    # Save the DVS
     pdf = PdfPages(os.path.join(self.dir, self.name + '.pdf'))
     pdf.savefig(self.dvs.fig)
     pl.close(self.dvs.fig)
@@ -993,6 +1239,49 @@ class Detrender(Basecamp):
     d['Title'] = 'EVEREST: %s de-trending of %s %d' % (self.name, self._mission.IDSTRING, self.ID)
     d['Author'] = 'Rodrigo Luger'
     pdf.close()
+  
+  def plot_dvs(self, clobber = False):
+    '''
+    Renders the DVS of a model saved by a headless run from the data the run
+    recorded, and saves it as a `pdf`. Each light curve and cross-validation
+    plot is redrawn from the model state at the time it was recorded.
+    
+    :param bool clobber: Overwrite an existing `pdf`? Default :py:obj:`False`
+    
+    '''
+    
+    if (not clobber) and Exists(os.path.join(self.dir, self.name + '.pdf')):
+      return
+    if not len(self.dvs_lc):
+      raise Exception('No DVS data saved for `%s` model of target %d.' % (self.name, self.ID))
+    log.info("Rendering the DVS for '%s'..." % self.name)
+    if self.dvs.fig is not None:
+      pl.close(self.dvs.fig)
+    self.dvs = DVS(len(self.breakpoints), pld_order = self.pld_order)
+    self.plot_aperture([self.dvs.top_right() for i in range(4)])
+    
+    # Replay the light curves and the cross-validation steps
+    model, outmask = self.model, np.array(self.outmask)
+    cdpp_arr, cdpp = self.cdpp_arr, self.cdpp
+    try:
+      for n, lc in enumerate(self.dvs_lc):
+        self.model = self.dvs_model[n]
+        self.outmask = lc['outmask']
+        self.cdpp_arr = lc['cdpp_arr']
+        self.cdpp = lc['cdpp']
+        self.plot_lc(self.dvs.left(), info_left = lc['info_left'], 
+                     info_right = lc['info_right'], color = lc['color'])
+        if n < len(self.dvs_cv):
+          self.plot_cv(self.dvs.right(), self.dvs_cv[n])
+    finally:
+      self.model = model
+      self.outmask = outmask
+      self.cdpp_arr = cdpp_arr
+      self.cdpp = cdpp
+    
+    self.plot_final(self.dvs.top_left())
+    self.plot_info(self.dvs)
+    self.save_dvs()
     
   def exception_handler(self, pdb):
     '''
@@ -1129,6 +1418,10 @@ class Detrender(Basecamp):
         
       # Get the CBVs
       self._mission.GetTargetCBVs(self)
+      
+      # Render the DVS of a headless run
+      if len(self.dvs_lc):
+        self.plot_dvs()
   
       # Plot the final corrected light curve
       cbv = CBV()
@@ -1147,18 +1440,20 @@ class Detrender(Basecamp):
       pdf.close()
     
       # Now merge the two PDFs
-      assert os.path.exists(os.path.join(self.dir, self.name + '.pdf')), "Unable to locate %s.pdf." % self.name
+      assert Exists(os.path.join(self.dir, self.name + '.pdf')), "Unable to locate %s.pdf." % self.name
       output = PdfFileWriter()
       pdfOne = PdfFileReader(os.path.join(self.dir, 'cbv.pdf'))
-      pdfTwo = PdfFileReader(os.path.join(self.dir, self.name + '.pdf'))
-      # Add the CBV page
-      output.addPage(pdfOne.getPage(0))
-      # Add the original DVS page
-      output.addPage(pdfTwo.getPage(pdfTwo.numPages - 1))
-      # Write the final PDF
-      outputStream = open(os.path.join(self.dir, self._mission.DVSFile(self.ID, self.season, self.cadence)), "wb")
-      output.write(outputStream)
-      outputStream.close()
+      # The DVS may be in the season pack
+      with Open(os.path.join(self.dir, self.name + '.pdf')) as dvs:
+        pdfTwo = PdfFileReader(dvs)
+        # Add the CBV page
+        output.addPage(pdfOne.getPage(0))
+        # Add the original DVS page
+        output.addPage(pdfTwo.getPage(pdfTwo.numPages - 1))
+        # Write the final PDF
+        outputStream = open(os.path.join(self.dir, self._mission.DVSFile(self.ID, self.season, self.cadence)), "wb")
+        output.write(outputStream)
+        outputStream.close()
       os.remove(os.path.join(self.dir, 'cbv.pdf'))
       
       # Make the FITS file
@@ -1248,6 +1543,9 @@ class nPLD(Detrender):
                               *improves* the performance, since many of these outliers are associated \
                               with events such as thruster firings and are present in all light curves, \
                               and therefore *help* in the de-trending. Default `None`
+    :param int neighbor_workers: The number of threads used to load the neighbors that are not \
+                              in the mission's shared neighbor basis. Set to `1` to load them \
+                              one at a time. Default `4`
     
     ..note :: Optionally, the :py:obj:`neighbors` may be specified directly as a list of target IDs to use. \
               In this case, users may also provide a list of :py:class:`everest.utils.DataContainer` instances \
@@ -1275,45 +1573,99 @@ class nPLD(Detrender):
       elif num_neighbors > 0:
         log.warn("No neighbors found! Running standard PLD...")
     
-    for n, neighbor in enumerate(self.neighbors):
-      log.info("Loading data for neighboring target %d..." % neighbor)
-      if neighbors_data is not None:
-        data = neighbors_data[n]
-        data.mask = np.array(list(set(np.concatenate([data.badmask, data.nanmask]))), dtype = int)
-        data.fraw = np.sum(data.fpix, axis = 1)
-      elif self.parent_model is not None and self.cadence == 'lc':
-        # We load the `parent` model. The advantage here is that outliers have
-        # properly been identified and masked. I haven't tested this on short
-        # cadence data, so I'm going to just forbid it...
-        data = eval(self.parent_model)(neighbor, mission = self.mission, is_parent = True)
-      else:
-        # We load the data straight from the TPF. Much quicker, since no model must
-        # be run in advance. Downside is we don't know where the outliers are. But based
-        # on tests with K2 data, the de-trending is actually *better* if the outliers are
-        # included! These are mostly thruster fire events and other artifacts common to
-        # all the stars, so it makes sense that we might want to keep them in the design
-        # matrix.
-        data = self._mission.GetData(neighbor, season = self.season, clobber = self.clobber_tpf, 
+    # Get the regressors of the neighbors in the mission's shared basis, if any.
+    # These are computed exactly as in :py:meth:`_neighbor_regressors` when we 
+    # load the data from the TPF
+    if (neighbors_data is None) and not self.clobber_tpf and \
+       (self.parent_model is None or self.cadence != 'lc'):
+      basis = self._mission.GetNeighborRegressors(self.ID, self.neighbors, season = self.season,
                              cadence = self.cadence,
                              aperture_name = self.aperture_name, 
                              saturated_aperture_name = self.saturated_aperture_name, 
                              max_pixels = self.max_pixels,
-                             saturation_tolerance = self.saturation_tolerance,
-                             get_hires = False, get_nearby = False)
-        if data is None:
-          raise Exception("Unable to retrieve data for neighboring target.")
-        data.mask = np.array(list(set(np.concatenate([data.badmask, data.nanmask]))), dtype = int)
-        data.fraw = np.sum(data.fpix, axis = 1)
-      
-      # Compute the linear PLD vectors and interpolate over outliers, NaNs and bad timestamps
-      X1 = data.fpix / data.fraw.reshape(-1, 1)
-      X1 = Interpolate(data.time, data.mask, X1)
-      if self.X1N is None:
-        self.X1N = np.array(X1)
-      else:
-        self.X1N = np.hstack([self.X1N, X1])
-      del X1
-      del data
+                             saturation_tolerance = self.saturation_tolerance)
+    else:
+      basis = [None for neighbor in self.neighbors]
+    
+    # Load the neighbors and compute their regressors on a thread pool, 
+    # then copy them into a single array
+    workers = kwargs.get('neighbor_workers', 4)
+    jobs = [(n, neighbor, neighbors_data) for n, neighbor in enumerate(self.neighbors) 
+            if basis[n] is None]
+    if (workers > 1) and (len(jobs) > 1):
+      pool = ThreadPool(min(workers, len(jobs)))
+      try:
+        blocks = pool.map(self._neighbor_regressors, jobs)
+      finally:
+        pool.terminate()
+    else:
+      blocks = [self._neighbor_regressors(job) for job in jobs]
+    for (n, neighbor, _), X1 in zip(jobs, blocks):
+      basis[n] = X1
+    del blocks
+    if len(basis):
+      self.X1N = np.empty((basis[0].shape[0], sum([X1.shape[1] for X1 in basis])))
+      i = 0
+      for n, X1 in enumerate(basis):
+        self.X1N[:, i:i + X1.shape[1]] = X1
+        i += X1.shape[1]
+        basis[n] = None
+  
+  def _neighbor_regressors(self, job):
+    '''
+    Returns the first order *PLD* regressors of a neighboring star, interpolated over 
+    outliers, NaNs and bad timestamps. :py:obj:`job` is the tuple `(n, neighbor, neighbors_data)`.
+    
+    '''
+    
+    n, neighbor, neighbors_data = job
+    log.info("Loading data for neighboring target %d..." % neighbor)
+    if neighbors_data is not None:
+      data = neighbors_data[n]
+      time = data.time
+      fpix = data.fpix
+      mask = np.array(list(set(np.concatenate([data.badmask, data.nanmask]))), dtype = int)
+      fraw = np.sum(fpix, axis = 1)
+    elif self.parent_model is not None and self.cadence == 'lc':
+      # We load the `parent` model. The advantage here is that outliers have
+      # properly been identified and masked. I haven't tested this on short
+      # cadence data, so I'm going to just forbid it... We only read the
+      # arrays we need from the saved model.
+      path = self._mission.TargetDirectory(neighbor, self.season)
+      if not ModelExists(path, self.parent_model):
+        raise Exception('Unable to load `%s` model for target %d.' % (self.parent_model, neighbor))
+      data = LoadModel(path, self.parent_model)
+      time = data['time']
+      fpix = data['fpix']
+      fraw = data['fraw']
+      masks = Mask(len(time))
+      for category in CATEGORIES:
+        if category in data:
+          masks[category] = data[category]
+      mask = masks.indices(len(time))
+    else:
+      # We load the data straight from the TPF. Much quicker, since no model must
+      # be run in advance. Downside is we don't know where the outliers are. But based
+      # on tests with K2 data, the de-trending is actually *better* if the outliers are
+      # included! These are mostly thruster fire events and other artifacts common to
+      # all the stars, so it makes sense that we might want to keep them in the design
+      # matrix.
+      data = self._mission.GetData(neighbor, season = self.season, clobber = self.clobber_tpf, 
+                           cadence = self.cadence,
+                           aperture_name = self.aperture_name, 
+                           saturated_aperture_name = self.saturated_aperture_name, 
+                           max_pixels = self.max_pixels,
+                           saturation_tolerance = self.saturation_tolerance,
+                           get_hires = False, get_nearby = False)
+      if data is None:
+        raise Exception("Unable to retrieve data for neighboring target.")
+      time = data.time
+      fpix = data.fpix
+      mask = np.array(list(set(np.concatenate([data.badmask, data.nanmask]))), dtype = int)
+      fraw = np.sum(fpix, axis = 1)
+    
+    # Compute the linear PLD vectors and interpolate over outliers, NaNs and bad timestamps
+    return Interpolate(time, mask, fpix / fraw.reshape(-1, 1))
 
 class iPLD(Detrender):
   '''
@@ -1355,6 +1707,7 @@ class iPLD(Detrender):
     self.cdppv = np.nan
     self.cdppg = np.nan
     self.model = np.zeros_like(self.time)
+    self._reset_dvs()
     self.loaded = True
     
 class pPLD(Detrender):
@@ -1382,6 +1735,9 @@ class pPLD(Detrender):
       raise Exception("Can't find `nPLD` model for target.")
     self.clobber = clobber
     
+    # Don't inherit the DVS data of a headless `nPLD` run
+    self._reset_dvs()
+    
     # Powell iterations
     self.piter = kwargs.get('piter', 3)
     self.pmaxf = kwargs.get('pmaxf', 300)
@@ -1399,9 +1755,8 @@ class pPLD(Detrender):
       self.plot_aperture([self.dvs.top_right() for i in range(4)])  
       self.plot_lc(self.dvs.left(), info_right = 'nPLD', color = 'k')
     
-      # Cross-validate
+      # Cross-validate (this also computes the new model)
       self.cross_validate(self.dvs.right())
-      self.compute()
       self.cdpp_arr = self.get_cdpp_arr()
       self.cdpp = self.get_cdpp()
             
@@ -1417,92 +1772,144 @@ class pPLD(Detrender):
     
       self.exception_handler(self.debug)
      
-  def cross_validate(self, ax):
+  def chunk_cdpp(self, b):
     '''
-    Performs the cross-validation step.
+    Returns the CDPP of chunk :py:obj:`b` de-trended with its own model
+    (see :py:meth:`compute_chunk`) for the current value of :py:obj:`lambda`.
     
     '''
-
-    # The CDPP to beat
-    cdpp_opt = self.get_cdpp_arr()
-
-    # Loop over all chunks
-    for b, brkpt in enumerate(self.breakpoints):
     
-      log.info("Cross-validating chunk %d/%d..." % (b + 1, len(self.breakpoints))) 
-        
-      # Mask for current chunk 
-      m = self.get_masked_chunk(b)
-        
-      # Mask transits and outliers
-      time = self.time[m]
-      flux = self.fraw[m]
-      ferr = self.fraw_err[m]
-      med = np.nanmedian(self.fraw)
-    
-      # Setup the GP
-      gp = GP(self.kernel, self.kernel_params, white = False)
-      gp.compute(time, ferr)
-    
-      # The masks
-      masks = list(Chunks(np.arange(0, len(time)), len(time) // self.cdivs))
+    c = self.get_chunk(b)
+    m = self.get_masked_chunk(b)
+    model = self.compute_chunk(b)
+    model -= np.nanmedian(model)
+    return self._mission.CDPP((self.fraw[c] - model)[np.searchsorted(c, m)], cadence = self.cadence)
+  
+  def powell_chunk(self, b, perturbations):
+    '''
+    Optimizes :py:obj:`lambda` for chunk :py:obj:`b` with Powell's method and
+    returns the best :py:obj:`log(lambda)`.
+    
+    :param ndarray perturbations: The fractional perturbations to the initial \
+           guess for each of the :py:attr:`piter` iterations, shape `(piter, pld_order)`
+    
+    '''
+    
+    log.info("Cross-validating chunk %d/%d..." % (b + 1, len(self.breakpoints))) 
+    
+    # The CDPP to beat
+    cdpp_opt = self.chunk_cdpp(b)
       
-      # The pre-computed matrices
-      pre_v = [self.cv_precompute(mask, b) for mask in masks]
+    # Mask for current chunk 
+    m = self.get_masked_chunk(b)
       
-      # Initialize with the nPLD solution
-      log_lam_opt = np.log10(self.lam[b])
-      scatter_opt = self.validation_scatter(log_lam_opt, b, masks, pre_v, gp, flux, time, med)
-      log.info("Iter 0/%d: " % (self.piter) +
-               "logL = (%s), s = %.3f" % (", ".join(["%.3f" % l for l in log_lam_opt]), scatter_opt))
-           
-      # Do `piter` iterations
-      for p in range(self.piter):
+    # Mask transits and outliers
+    time = self.time[m]
+    flux = self.fraw[m]
+    ferr = self.fraw_err[m]
+    med = np.nanmedian(self.fraw)
+  
+    # Setup the GP
+    gp = GP(self.kernel, self.kernel_params, white = False)
+    gp.compute(time, ferr)
+  
+    # The masks
+    masks = list(Chunks(np.arange(0, len(time)), len(time) // self.cdivs))
+    
+    # The pre-computed matrices
+    pre_v = [self.cv_precompute(mask, b) for mask in masks]
+    
+    # The lambda paths. Powell's method performs line searches along
+    # each of the coordinates first, so these are re-used often.
+    paths = LambdaPaths()
+    
+    # Initialize with the nPLD solution
+    log_lam_opt = np.log10(self.lam[b])
+    scatter_opt = self.validation_scatter(log_lam_opt, b, masks, pre_v, gp, flux, time, med, paths)
+    log.info("Iter 0/%d: " % (self.piter) +
+             "logL = (%s), s = %.3f" % (", ".join(["%.3f" % l for l in log_lam_opt]), scatter_opt))
+         
+    # Do `piter` iterations
+    for p in range(self.piter):
+    
+      # Perturb the initial condition a bit
+      log_lam = np.array(np.log10(self.lam[b])) * (1 + self.ppert * perturbations[p])
+      scatter = self.validation_scatter(log_lam, b, masks, pre_v, gp, flux, time, med, paths)
+      log.info("Initializing at: " +
+               "logL = (%s), s = %.3f" % (", ".join(["%.3f" % l for l in log_lam]), scatter))
       
-        # Perturb the initial condition a bit
-        log_lam = np.array(np.log10(self.lam[b])) * (1 + self.ppert * np.random.randn(len(self.lam[b])))
-        scatter = self.validation_scatter(log_lam, b, masks, pre_v, gp, flux, time, med)
-        log.info("Initializing at: " +
-                 "logL = (%s), s = %.3f" % (", ".join(["%.3f" % l for l in log_lam]), scatter))
-        
-        # Call the minimizer
-        log_lam, scatter, _, _, _, _ = \
-          fmin_powell(self.validation_scatter, log_lam, 
-          args = (b, masks, pre_v, gp, flux, time, med),
-          maxfun = self.pmaxf, disp = False,
-          full_output = True)
-        
-        # Did it improve the CDPP?
-        tmp = np.array(self.lam[b])
-        self.lam[b] = 10 ** log_lam
-        self.compute()
-        cdpp = self.get_cdpp_arr()[b]
-        self.lam[b] = tmp
-        if cdpp < cdpp_opt[b]:
-          cdpp_opt[b] = cdpp
-          log_lam_opt = log_lam
-        
-        # Log it
-        log.info("Iter %d/%d: " % (p + 1, self.piter) +
-                 "logL = (%s), s = %.3f" % (", ".join(["%.3f" % l for l in log_lam]), scatter))
-                  
-      # The best solution
-      log.info("Found minimum: logL = (%s), s = %.3f" % (", ".join(["%.3f" % l for l in log_lam_opt]), scatter_opt))
-      self.lam[b] = 10 ** log_lam_opt
+      # Call the minimizer
+      log_lam, scatter, _, _, _, _ = \
+        fmin_powell(self.validation_scatter, log_lam, 
+        args = (b, masks, pre_v, gp, flux, time, med, paths),
+        maxfun = self.pmaxf, disp = False,
+        full_output = True)
+      
+      # Did it improve the CDPP?
+      tmp = np.array(self.lam[b])
+      self.lam[b] = 10 ** log_lam
+      cdpp = self.chunk_cdpp(b)
+      self.lam[b] = tmp
+      if cdpp < cdpp_opt:
+        cdpp_opt = cdpp
+        log_lam_opt = log_lam
+      
+      # Log it
+      log.info("Iter %d/%d: " % (p + 1, self.piter) +
+               "logL = (%s), s = %.3f" % (", ".join(["%.3f" % l for l in log_lam]), scatter))
+                
+    # The best solution
+    log.info("Found minimum: logL = (%s), s = %.3f" % (", ".join(["%.3f" % l for l in log_lam_opt]), scatter_opt))
+    self.lam[b] = 10 ** log_lam_opt
+    return log_lam_opt
+     
+  def cross_validate(self, ax):
+    '''
+    Performs the cross-validation step. The chunks are optimized
+    concurrently (see :py:meth:`map_chunks`).
+    
+    '''
+    
+    # Draw the random perturbations up front, in chunk order, so
+    # that the result does not depend on the order of execution
+    perturbations = [np.random.randn(self.piter, len(self.lam[b])) for b, _ in enumerate(self.breakpoints)]
+    
+    # Optimize all chunks
+    log_lam = self.map_chunks(lambda b: self.powell_chunk(b, perturbations[b]), 
+                              copies = 2 * (self.cdivs + 1) * self.pld_order)
+    for b, brkpt in enumerate(self.breakpoints):
+      self.lam[b] = 10 ** log_lam[b]
+    self.compute()
+    
+    # Plot
+    self.plot_cv(ax, dict(lam = [np.array(self.lam[b]) for b, _ in enumerate(self.breakpoints)],
+                          cdpp_arr = self.get_cdpp_arr()))
+  
+  def plot_cv(self, ax, cv):
+    '''
+    Plots the optimized values of :py:obj:`lambda` and the CDPP as a function
+    of chunk number. If :py:obj:`ax` is :py:obj:`None` (in headless runs), 
+    they are saved for :py:meth:`plot_dvs` instead.
+    
+    '''
+    
+    if ax is None:
+      self.dvs_cv.append(cv)
+      return
     
     # We're just going to plot lambda as a function of chunk number
     bs = np.arange(len(self.breakpoints))
     color = ['k', 'b', 'r', 'g', 'y']
     for n in range(self.pld_order):
-      ax[0].plot(bs + 1, [np.log10(self.lam[b][n]) for b in bs], '.', color = color[n])
-      ax[0].plot(bs + 1, [np.log10(self.lam[b][n]) for b in bs], '-', color = color[n], alpha = 0.25)
+      ax[0].plot(bs + 1, [np.log10(cv['lam'][b][n]) for b in bs], '.', color = color[n])
+      ax[0].plot(bs + 1, [np.log10(cv['lam'][b][n]) for b in bs], '-', color = color[n], alpha = 0.25)
     ax[0].set_ylabel(r'$\log\Lambda$', fontsize = 5)
     ax[0].margins(0.1, 0.1)
     ax[0].set_xticks(np.arange(1, len(self.breakpoints) + 1))
     ax[0].set_xticklabels([])
     
     # Now plot the CDPP
-    cdpp_arr = self.get_cdpp_arr()
+    cdpp_arr = cv['cdpp_arr']
     ax[1].plot(bs + 1, cdpp_arr, 'b.')
     ax[1].plot(bs + 1, cdpp_arr, 'b-', alpha = 0.25)
     ax[1].margins(0.1, 0.1)
@@ -1510,10 +1917,14 @@ class pPLD(Detrender):
     ax[1].set_xlabel(r'Chunk', fontsize = 5)
     ax[1].set_xticks(np.arange(1, len(self.breakpoints) + 1))
     
-  def validation_scatter(self, log_lam, b, masks, pre_v, gp, flux, time, med):
+  def validation_scatter(self, log_lam, b, masks, pre_v, gp, flux, time, med, paths = None):
     '''
     Computes the scatter in the validation set.
     
+    :param paths: An optional :py:class:`everest.linalg.LambdaPaths` cache. If provided, \
+                  the model is computed along a lambda path whenever only one of the \
+                  orders changed since the previous call. Default :py:obj:`None`
+    
     '''
     
     # Update the lambda matrix
@@ -1522,7 +1933,14 @@ class pPLD(Detrender):
     # Validation set scatter
     scatter = [None for i in range(len(masks))]
     for i in range(len(masks)):
-      model = self.cv_compute(b, *pre_v[i])
+      model = None
+      if paths is not None:
+        A, B, C, mK, f, _, _ = pre_v[i]
+        model = paths(i, self.lam[b], lambda: (A, B, mK + C, f))
+      if model is None:
+        model = self.cv_compute(b, *pre_v[i])
+      else:
+        model -= np.nanmedian(model)
       try:
         gpm, _ = gp.predict(flux - model - med, time[masks[i]])
       except ValueError:
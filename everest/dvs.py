@@ -163,6 +163,59 @@ class DVS(object):
     self.rcount += 1
     return res
 
+class HeadlessDVS(object):
+  '''
+  A stand-in for :py:class:`DVS` in headless runs. There is no figure, and
+  all of the axis instances are :py:obj:`None`, which tells the plotting methods
+  of :py:class:`everest.detrender.Detrender` to record the data they would have
+  plotted instead (see :py:meth:`everest.detrender.Detrender.plot_dvs`).
+
+  '''
+
+  fig = None
+
+  def title(self):
+    '''
+
+    '''
+
+    return None, None, None
+
+  def footer(self):
+    '''
+
+    '''
+
+    return None, None, None
+
+  def top_right(self):
+    '''
+
+    '''
+
+    return None
+
+  def top_left(self):
+    '''
+
+    '''
+
+    return None
+
+  def left(self):
+    '''
+
+    '''
+
+    return None
+
+  def right(self):
+    '''
+
+    '''
+
+    return None
+
 class CBV(object):
   '''
   
@@ -80,6 +80,7 @@ def LightcurveHDU(model):
   cards.append(('CBVNITER', model.cbv_niter, 'Number of CBV SysRem iterations'))
   cards.append(('CBVWIN', model.cbv_win, 'Window size for smoothing CBVs'))
   cards.append(('CBVORD', model.cbv_order, 'Order when smoothing CBVs'))
+  cards.append(('CBVMETH', model.cbv_method, 'CBV extraction method'))
   cards.append(('CDIVS', model.cdivs, 'Cross-validation subdivisions'))
   cards.append(('CDPP', model.cdpp, 'Average de-trended CDPP'))
   cards.append(('CDPPR', model.cdppr, 'Raw CDPP'))
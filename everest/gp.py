@@ -10,7 +10,9 @@ Routines for optimizing the GP hyperparameters for a given light curve.
 
 from __future__ import division, print_function, absolute_import, unicode_literals
 from .math import Chunks
+from .semisep import Matern32GP
 from scipy.optimize import fmin_l_bfgs_b
+from scipy.linalg import cho_factor, cho_solve
 from scipy.signal import savgol_filter
 import numpy as np
 np.random.seed(48151623)
@@ -19,13 +21,29 @@ from george.kernels import WhiteKernel, Matern32Kernel, ExpSine2Kernel
 import logging
 log = logging.getLogger(__name__)
 
-def GP(kernel, kernel_params, white = False):
+def GP(kernel, kernel_params, white = False, backend = None):
   '''
+  Returns a GP instance for the given kernel.
+  
+  :param str kernel: The kernel name, `Basic` (Matern-3/2) or `QuasiPeriodic`
+  :param array_like kernel_params: The kernel parameters
+  :param bool white: Include the white noise term? Default :py:obj:`False`
+  :param str backend: The GP backend. For the `Basic` kernel, the default is `semisep`, \
+                      the linear-time solver in :py:mod:`semisep.py`; set this to `george` \
+                      to use the dense :py:obj:`george` solver instead. The `QuasiPeriodic` \
+                      kernel is always computed with :py:obj:`george`. Default :py:obj:`None`
   
   '''
   
+  if backend is None:
+    backend = 'semisep'
+  if backend not in ['semisep', 'george']:
+    raise ValueError('Invalid value for `backend`.')
+  
   if kernel == 'Basic':
     w, a, t = kernel_params
+    if backend == 'semisep':
+      return Matern32GP(a, t, white = w if white else None)
     if white:
       return george.GP(WhiteKernel(w ** 2) + a ** 2 * Matern32Kernel(t ** 2))
     else:
@@ -59,6 +77,46 @@ def GetCovariance(kernel, kernel_params, time, errors):
   K += GP(kernel, kernel_params, white = False).get_matrix(time)
   return K
 
+def GetCovarianceSolver(kernel, kernel_params, time, errors):
+  '''
+  Returns a function that applies the inverse of the covariance matrix
+  returned by :py:func:`GetCovariance` to a vector or to the columns of a
+  matrix. For the `Basic` kernel, this uses the linear-time solver in
+  :py:mod:`semisep.py`; otherwise, the covariance is Cholesky-factorized once.
+  
+  :param array_like kernel_params: A list of kernel parameters
+  :param array_like time: The time array (*N*)
+  :param array_like errors: The data error array (*N*)
+  
+  '''
+  
+  if kernel == 'Basic':
+    gp = GP(kernel, kernel_params, white = False)
+    gp.compute(time, errors)
+    return gp.apply_inverse
+  else:
+    cf = cho_factor(GetCovariance(kernel, kernel_params, time, errors))
+    return lambda y: cho_solve(cf, y)
+
+def GetCovarianceOperator(kernel, kernel_params, time, errors):
+  '''
+  Returns the tuple of functions `(Kdot, Kinv)`, which apply the covariance
+  matrix returned by :py:func:`GetCovariance` and its inverse to a vector,
+  without ever forming the matrix. Only the `Basic` kernel, which is
+  semiseparable (see :py:mod:`semisep.py`), is supported.
+  
+  :param array_like kernel_params: A list of kernel parameters
+  :param array_like time: The time array (*N*)
+  :param array_like errors: The data error array (*N*)
+  
+  '''
+  
+  if kernel != 'Basic':
+    raise ValueError('The covariance operator is only available for the `Basic` kernel.')
+  gp = GP(kernel, kernel_params, white = False)
+  gp.compute(time, errors)
+  return gp.dot, gp.apply_inverse
+
 def GetKernelParams(time, flux, errors, kernel = 'Basic', mask = [], giter = 3, gmaxf = 200, guess = None):
   '''
   Optimizes the GP by training it on the current de-trended light curve.
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+:py:mod:`gram.py` - PLD Gram matrices
+-------------------------------------
+
+Routines for computing the *PLD* Gram matrices :math:`\mathbf{X}_n \mathbf{X}_n^\\top`
+directly from the first order fractional pixel fluxes, without ever
+building the (very wide) high order design matrices :math:`\mathbf{X}_n`.
+
+The columns of the order :math:`n` design matrix are the products of the
+fractional fluxes of all multisets of :math:`n` pixels, so each element of
+the Gram matrix is
+
+.. math::
+
+    \\left(\mathbf{X}_n \mathbf{X}_n^\\top\\right)_{ab} =
+    \sum_{i_1 \leq \cdots \leq i_n} \prod_{k=1}^n x_{a,i_k} x_{b,i_k} =
+    h_n(\mathbf{x}_a \circ \mathbf{x}_b),
+
+the complete homogeneous symmetric polynomial of degree :math:`n` in the
+elementwise products :math:`\mathbf{x}_a \circ \mathbf{x}_b`. These are computed
+from the power sums :math:`p_k = (\mathbf{X}_1^k)(\mathbf{X}_1^k)^\\top` via
+the Newton identities
+
+.. math::
+
+    n h_n = \sum_{k=1}^n p_k h_{n-k},
+
+at a cost of :math:`\mathcal{O}(N^2 n_\mathrm{pix})` per order.
+
+'''
+
+from __future__ import division, print_function, absolute_import, unicode_literals
+import numpy as np
+import logging
+log = logging.getLogger(__name__)
+
+__all__ = ['PowerSums', 'Gram']
+
+def PowerSums(X1a, X1b = None, order = 1):
+  '''
+  Returns the list of power sum matrices :math:`p_k = (\mathbf{X}_a^k)(\mathbf{X}_b^k)^\\top`
+  for :math:`k = 1, 2, ...,` :py:obj:`order`.
+
+  :param ndarray X1a: The first order fractional fluxes at the first set of cadences, shape `(Na, npix)`
+  :param ndarray X1b: The first order fractional fluxes at the second set of cadences, shape `(Nb, npix)`. \
+         Default :py:obj:`None`, in which case `X1b = X1a`
+  :param int order: The maximum power. Default `1`
+
+  '''
+
+  if X1b is None:
+    X1b = X1a
+  p = [None for k in range(order)]
+  Xa = np.ones_like(X1a)
+  Xb = np.ones_like(X1b)
+  for k in range(order):
+    Xa *= X1a
+    Xb *= X1b
+    p[k] = np.dot(Xa, Xb.T)
+  return p
+
+def Gram(X1a, X1b = None, order = 1, X1Na = None, X1Nb = None):
+  '''
+  Returns a list of the *PLD* Gram matrices :math:`\mathbf{X}_n(a)\mathbf{X}_n(b)^\\top`
+  for all orders up to and including :py:obj:`order`. Element `n` of the list
+  corresponds to :py:obj:`Basecamp.X(n)`, i.e., to *PLD* order `n + 1`. This is
+  numerically equivalent to dotting the explicit design matrices, but requires only
+  :math:`\mathcal{O}(N_a N_b)` memory.
+
+  :param ndarray X1a: The first order fractional fluxes at the first set of cadences, shape `(Na, npix)`
+  :param ndarray X1b: The first order fractional fluxes at the second set of cadences, shape `(Nb, npix)`. \
+         Default :py:obj:`None`, in which case `X1b = X1a`
+  :param int order: The maximum *PLD* order. Default `1`
+  :param ndarray X1Na: The first order neighbor regressors at the first set of cadences. Default :py:obj:`None`
+  :param ndarray X1Nb: The first order neighbor regressors at the second set of cadences. Default :py:obj:`None`
+
+  '''
+
+  if X1b is None:
+    X1b = X1a
+    X1Nb = X1Na
+
+  # The power sums and the complete homogeneous polynomials
+  p = PowerSums(X1a, X1b, order)
+  h = [np.ones((X1a.shape[0], X1b.shape[0]))]
+  for n in range(1, order + 1):
+    hn = np.zeros_like(h[0])
+    for k in range(1, n + 1):
+      hn += p[k - 1] * h[n - k]
+    h.append(hn / n)
+  del p
+  G = h[1:]
+
+  # The neighbor regressors enter as simple powers
+  if X1Na is not None:
+    for n in range(order):
+      G[n] += np.dot(X1Na ** (n + 1), (X1Nb ** (n + 1)).T)
+
+  return G
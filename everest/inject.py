@@ -102,6 +102,7 @@ def Inject(ID, inj_model = 'nPLD', t0 = None, per = None, dur = 0.1, depth = 0.0
       for i in range(self.fpix.shape[1]):
         self.fpix[:,i] *= transit_model 
       self.fraw = np.sum(self.fpix, axis = 1)
+      self.design.clear()
       if self.inject['mask']:
         self.transitmask = np.array(list(set(np.concatenate([self.transitmask, np.where(transit_model < 1.)[0]]))), dtype = int)
 
@@ -121,6 +122,7 @@ def Inject(ID, inj_model = 'nPLD', t0 = None, per = None, dur = 0.1, depth = 0.0
       kwargs.update({'clobber': False})
       control = eval(self.parent_class)(self.ID, is_parent = True, **kwargs)
       control.fraw *= transit_model 
+      control.design.clear()
       
       # Get params
       log.info("Recovering transit depth...")
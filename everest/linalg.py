@@ -0,0 +1,471 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+:py:mod:`linalg.py` - Linear algebra
+------------------------------------
+
+Specialized linear solvers for the *PLD* regression problem.
+
+The :py:class:`LambdaPath` class solves the system
+:math:`(\mathbf{S} + \lambda \mathbf{A}) \mathbf{w} = \mathbf{f}` for many values of
+the regularization parameter :math:`\lambda` of a single *PLD* order at once. A single
+generalized eigendecomposition :math:`\mathbf{A} \mathbf{V} = \mathbf{S} \mathbf{V} \mathbf{D}`,
+with :math:`\mathbf{V}^\\top \mathbf{S} \mathbf{V} = \mathbf{I}`, gives
+
+.. math::
+
+    (\mathbf{S} + \lambda \mathbf{A})^{-1} = \mathbf{V} (\mathbf{I} + \lambda \mathbf{D})^{-1} \mathbf{V}^\\top,
+
+so that after the :math:`\mathcal{O}(N^3)` decomposition each value of :math:`\lambda`
+costs only :math:`\mathcal{O}(N^2)`.
+
+When the number of regressors :math:`p` is small compared to the number of cadences,
+:py:func:`Woodbury` instead solves for the regressor weights in the :math:`p`-dimensional
+regressor space, and :py:func:`SelectSolver` decides which of the two is cheaper.
+
+Finally, :py:class:`MaskedSolver` solves the system restricted to a subset of the
+cadences from a single factorization of the full system, so that masking or
+unmasking :math:`k` cadences (as during outlier clipping) costs only
+:math:`\mathcal{O}(k N^2)`.
+
+When both the number of cadences and the number of regressors are large, as for
+a full campaign of short cadence data, :py:class:`PLDOperator` never forms either
+the :math:`N \times N` matrices or the :math:`p \times p` normal matrix. It applies
+:math:`\mathbf{K} + \mathbf{X} \mathbf{\Lambda} \mathbf{X}^\top` to vectors, with the
+semiseparable covariance applied in :math:`\mathcal{O}(N)` (see :py:mod:`semisep.py`)
+and the low rank term in :math:`\mathcal{O}(N p)`, and solves the system by preconditioned
+conjugate gradients (:py:func:`PCG`), preconditioned by the exact inverse of :math:`\mathbf{K}`
+plus the first order regressors. Everything is done in :math:`\mathcal{O}(N p)` memory.
+
+'''
+
+from __future__ import division, print_function, absolute_import, unicode_literals
+import numpy as np
+from scipy.linalg import eigh, cho_factor, cho_solve
+import logging
+log = logging.getLogger(__name__)
+
+__all__ = ['LambdaPath', 'LambdaPaths', 'Woodbury', 'SelectSolver', 'MaskedSolver',
+           'PCG', 'PLDOperator']
+
+class LambdaPath(object):
+  '''
+  Computes the *PLD* model :math:`\mathbf{B} (\mathbf{K} + \mathbf{A})^{-1} \mathbf{f}`,
+  where :math:`\mathbf{A} = \sum_n \lambda_n \mathbf{A}_n` and
+  :math:`\mathbf{B} = \sum_n \lambda_n \mathbf{B}_n`, as a function of the regularization
+  parameter of order :py:obj:`n`, holding all other orders fixed.
+
+  :param list lam: The current values of :py:obj:`lambda` for each order. Orders \
+         set to :py:obj:`None` are ignored
+  :param int n: The index of the order whose :py:obj:`lambda` is varied
+  :param list A: The Gram matrices :py:obj:`X(n,m) . X(n,m).T` for each order
+  :param list B: The Gram matrices :py:obj:`X(n,c) . X(n,m).T` for each order
+  :param ndarray K: The (masked) covariance matrix, plus any other fixed terms
+  :param ndarray f: The (masked) flux
+
+  '''
+
+  def __init__(self, lam, n, A, B, K, f):
+    '''
+
+    '''
+
+    self.lam = list(lam)
+    self.n = n
+
+    # The fixed part of the system
+    S = np.array(K, dtype = float)
+    self.B0 = np.zeros_like(B[n])
+    for k, l in enumerate(lam):
+      if (k != n) and (l is not None) and (A[k] is not None):
+        S += l * A[k]
+        self.B0 += l * B[k]
+    self.Bn = B[n]
+
+    # The generalized eigendecomposition. The matrix `A[n]` is positive
+    # semi-definite, so eigenvalues at the roundoff level belong to its
+    # null space and are set to zero.
+    self.d, self.V = eigh(A[n], S)
+    dmax = max(np.max(self.d), 0.)
+    self.d[self.d < len(self.d) * np.finfo(float).eps * dmax] = 0.
+    self.g = np.dot(self.V.T, f)
+
+  def matches(self, lam):
+    '''
+    Returns :py:obj:`True` if the :py:obj:`lambda` values in :py:obj:`lam` lie
+    on this path, i.e., if they differ from the fixed values only in order :py:attr:`n`.
+
+    '''
+
+    if len(lam) != len(self.lam):
+      return False
+    for k, l in enumerate(lam):
+      if (k != self.n) and (l != self.lam[k]):
+        return False
+    return (lam[self.n] is not None)
+
+  def solve(self, lam):
+    '''
+    Returns the solution :math:`\mathbf{w}` to :math:`(\mathbf{S} + \lambda \mathbf{A}_n) \mathbf{w} = \mathbf{f}`.
+
+    :param float lam: The value of :py:obj:`lambda` for order :py:attr:`n`
+
+    '''
+
+    return np.dot(self.V, self.g / (1. + lam * self.d))
+
+  def __call__(self, lam):
+    '''
+    Returns the *PLD* model for the value :py:obj:`lam` of :py:obj:`lambda` for order :py:attr:`n`.
+
+    '''
+
+    w = self.solve(lam)
+    return np.dot(self.B0, w) + lam * np.dot(self.Bn, w)
+
+class LambdaPaths(object):
+  '''
+  A cache of :py:class:`LambdaPath` instances for repeated model evaluations
+  in which only one *PLD* order's :py:obj:`lambda` changes at a time, as
+  in line searches or interactive tuning of :py:obj:`lambda`. One path is stored
+  per hashable :py:obj:`key` (typically the light curve chunk and/or the validation
+  fold). A new path is built whenever the values of :py:obj:`lambda` for a given key
+  differ from those of the previous call in exactly one order.
+
+  '''
+
+  def __init__(self):
+    '''
+
+    '''
+
+    self._paths = {}
+    self._last = {}
+
+  def clear(self):
+    '''
+    Clears the cache.
+
+    '''
+
+    self._paths = {}
+    self._last = {}
+
+  def __call__(self, key, lam, precompute, token = None):
+    '''
+    Returns the *PLD* model for the values :py:obj:`lam` of :py:obj:`lambda`, or
+    :py:obj:`None` if no path is available, in which case the caller should
+    solve the system directly.
+
+    :param key: A hashable key identifying the system
+    :param list lam: The values of :py:obj:`lambda` for each order
+    :param callable precompute: A function returning the tuple `(A, B, K, f)` \
+           (see :py:class:`LambdaPath`), called only if a new path must be built
+    :param token: Any other quantity that determines the matrices, such as a hash \
+           of the mask. Paths stored with a different token are discarded. Default :py:obj:`None`
+
+    '''
+
+    lam = list(lam)
+    last = self._last.get(key, (None, None))
+    self._last[key] = (token, lam)
+
+    # Is there already a path through these values of lambda?
+    path = self._paths.get(key, (None, None))
+    if path[0] != token:
+      self._paths.pop(key, None)
+    elif (path[1] is not None) and path[1].matches(lam):
+      return path[1](lam[path[1].n])
+
+    # Did exactly one order change since the last call?
+    if (last[0] != token) or (last[1] is None) or (len(last[1]) != len(lam)):
+      return None
+    diff = [k for k, l in enumerate(lam) if l != last[1][k]]
+    if (len(diff) != 1) or (lam[diff[0]] is None) or (last[1][diff[0]] is None):
+      return None
+
+    # Build a new path along this order
+    log.info('Computing the lambda path for order %d...' % (diff[0] + 1))
+    A, B, K, f = precompute()
+    path = LambdaPath(lam, diff[0], A, B, K, f)
+    self._paths[key] = (token, path)
+    return path(lam[path.n])
+
+def Woodbury(Kinv, X, lam, f):
+  '''
+  Returns the maximum a posteriori regressor weights
+
+  .. math::
+
+      \mathbf{w} = \mathbf{\Lambda} \mathbf{X}^\\top (\mathbf{K} + \mathbf{X} \mathbf{\Lambda} \mathbf{X}^\\top)^{-1} \mathbf{f}
+                   = (\mathbf{\Lambda}^{-1} + \mathbf{X}^\\top \mathbf{K}^{-1} \mathbf{X})^{-1} \mathbf{X}^\\top \mathbf{K}^{-1} \mathbf{f},
+
+  computed in the space of the regressors. The *PLD* model is then simply
+  :math:`\mathbf{X}\mathbf{w}`. Regressors with zero prior variance are given zero weight.
+
+  :param callable Kinv: A function that applies :math:`\mathbf{K}^{-1}` to the columns of a matrix \
+         (see :py:func:`everest.gp.GetCovarianceSolver`)
+  :param ndarray X: The design matrix (*N*, *p*)
+  :param array_like lam: The prior variance of each of the regressors (*p*), or a scalar
+  :param ndarray f: The data (*N*), or several data vectors (*N*, *k*), in which case \
+         the weights for each are returned as the columns of a (*p*, *k*) array
+
+  '''
+
+  lam = np.asarray(lam, dtype = float) * np.ones(X.shape[1])
+  w = np.zeros((X.shape[1],) + f.shape[1:])
+  i = np.where(lam > 0)[0]
+  if len(i) == 0:
+    return w
+
+  # Scaling by the square root of the prior keeps the system well conditioned
+  s = np.sqrt(lam[i])
+  Xs = X[:, i] * s
+  KXf = Kinv(np.hstack([Xs, f.reshape(len(f), -1)]))
+  M = np.dot(Xs.T, KXf[:, :len(i)])
+  M[np.diag_indices_from(M)] += 1.
+  wi = cho_solve(cho_factor(M), np.dot(Xs.T, KXf[:, len(i):]))
+  w[i] = (s.reshape(-1, 1) * wi).reshape((len(i),) + f.shape[1:])
+  return w
+
+def SelectSolver(nreg, ncad, kernel = 'Basic'):
+  '''
+  Returns the cheaper of the two strategies for solving the *PLD* problem with
+  :py:obj:`nreg` regressors and :py:obj:`ncad` cadences: `cadence`, the dense
+  :math:`N \\times N` solve, which costs :math:`\mathcal{O}(N^3)` regardless of
+  the number of regressors, or `regressor`, the :py:func:`Woodbury` solve, which
+  costs :math:`\mathcal{O}(N p^2)` plus a single factorization of the covariance.
+  The latter is linear in :math:`N` for the `Basic` kernel, and :math:`\mathcal{O}(N^3 / 3)`
+  otherwise.
+
+  :param int nreg: The number of regressors
+  :param int ncad: The number of cadences
+  :param str kernel: The GP kernel. Default `Basic`
+
+  '''
+
+  if kernel == 'Basic':
+    return 'regressor' if 2 * nreg <= ncad else 'cadence'
+  else:
+    return 'regressor' if 5 * nreg <= ncad else 'cadence'
+
+class MaskedSolver(object):
+  '''
+  Solves the linear system :math:`\mathbf{S}_{mm} \mathbf{x} = \mathbf{g}_m`, where
+  :math:`m` is the set of all indices *except* for a small set :math:`r` of masked ones,
+  given a single Cholesky factorization of the full matrix :math:`\mathbf{S}`. The
+  solution is :math:`\mathbf{y} = \mathbf{S}^{-1} (\mathbf{g} + \mathbf{E}_r \mathbf{z})`,
+  where :math:`\mathbf{E}_r` are the columns of the identity matrix corresponding to the
+  masked indices and :math:`\mathbf{z}` is chosen so that :math:`\mathbf{y}_r = 0`:
+  
+  .. math::
+  
+      \mathbf{z} = -\left[(\mathbf{S}^{-1})_{rr}\right]^{-1} (\mathbf{S}^{-1} \mathbf{g})_r.
+  
+  This is equivalent to a rank-:math:`k` downdate of the factorization. The columns
+  :math:`\mathbf{S}^{-1} \mathbf{E}_r` are cached, so masking or unmasking :math:`k`
+  indices costs :math:`\mathcal{O}(k N^2)` and each solve :math:`\mathcal{O}(N^2)`.
+  
+  :param ndarray S: The full symmetric positive definite matrix (*N*, *N*)
+  
+  '''
+  
+  def __init__(self, S):
+    '''
+    
+    '''
+    
+    self.N = S.shape[0]
+    self.cf = cho_factor(S)
+    self._cols = {}
+    
+  def _columns(self, r):
+    '''
+    Returns the columns of the inverse of :math:`\mathbf{S}` for the indices :py:obj:`r`,
+    computing and caching the ones we haven't seen.
+    
+    '''
+    
+    # Only keep the columns we still need
+    self._cols = dict([(i, self._cols[i]) for i in r if i in self._cols])
+    new = [i for i in r if i not in self._cols]
+    if len(new):
+      E = np.zeros((self.N, len(new)))
+      E[new, np.arange(len(new))] = 1.
+      Q = cho_solve(self.cf, E)
+      for k, i in enumerate(new):
+        self._cols[i] = Q[:, k]
+    return np.array([self._cols[i] for i in r]).T
+  
+  def solve(self, g, r = []):
+    '''
+    Returns the solution :math:`\mathbf{y}` (*N*), with :math:`\mathbf{y}_r = 0`.
+    
+    :param ndarray g: The right-hand side (*N*). The values at the masked indices are ignored
+    :param array_like r: The masked indices. Default `[]`
+    
+    '''
+    
+    r = [int(i) for i in r]
+    g = np.array(g, dtype = float)
+    g[r] = 0.
+    y = cho_solve(self.cf, g)
+    if len(r):
+      Q = self._columns(r)
+      z = np.linalg.solve(Q[r], -y[r])
+      y += np.dot(Q, z)
+      y[r] = 0.
+    return y
+
+def PCG(A, b, M = None, x0 = None, tol = 1e-10, maxiter = None):
+  '''
+  Solves the symmetric positive definite system :math:`\mathbf{A}\mathbf{x} = \mathbf{b}`
+  by preconditioned conjugate gradients. Returns the tuple `(x, niter)`; if the
+  iteration did not converge, `niter` is negative.
+
+  :param callable A: A function that applies :math:`\mathbf{A}` to a vector
+  :param ndarray b: The right-hand side (*N*)
+  :param callable M: A function that applies the inverse of the preconditioner \
+         to a vector. Default :py:obj:`None` (no preconditioner)
+  :param ndarray x0: The initial guess. Default :py:obj:`None` (zero)
+  :param float tol: The tolerance on the norm of the residual relative to that \
+         of :py:obj:`b`. Default `1e-10`
+  :param int maxiter: The maximum number of iterations. Default :py:obj:`None` (*N*)
+
+  '''
+
+  if M is None:
+    M = lambda r: r
+  if maxiter is None:
+    maxiter = len(b)
+  bnorm = np.sqrt(np.dot(b, b))
+  if bnorm == 0:
+    return np.zeros_like(b), 0
+  if x0 is None:
+    x = np.zeros_like(b)
+    r = np.array(b, dtype = float)
+  else:
+    x = np.array(x0, dtype = float)
+    r = b - A(x)
+  z = M(r)
+  p = np.array(z)
+  rz = np.dot(r, z)
+  for niter in range(maxiter + 1):
+    if np.sqrt(np.dot(r, r)) <= tol * bnorm:
+      return x, niter
+    if niter == maxiter:
+      break
+    Ap = A(p)
+    alpha = rz / np.dot(p, Ap)
+    x += alpha * p
+    r -= alpha * Ap
+    z = M(r)
+    rz, rz0 = np.dot(r, z), rz
+    p = z + (rz / rz0) * p
+  return x, -maxiter
+
+class PLDOperator(object):
+  '''
+  The *PLD* covariance :math:`\mathbf{S} = \mathbf{K} + \mathbf{X} \mathbf{\Lambda} \mathbf{X}^\top + \mathbf{T} \mathbf{T}^\top`
+  as a linear operator, where :math:`\mathbf{K}` is the GP covariance, :math:`\mathbf{X}` is the
+  design matrix, :math:`\mathbf{\Lambda}` is the diagonal matrix of regressor prior variances,
+  and :math:`\mathbf{T}` holds any other (fixed) regressors scaled by the square root of their
+  prior variance. The systems :math:`\mathbf{S} \mathbf{W} = \mathbf{f}` are solved by
+  :py:func:`PCG`. The preconditioner is the exact inverse of :math:`\mathbf{K}` plus the
+  first :py:obj:`nprec` columns of the low rank term, applied via the Woodbury identity;
+  these are typically the first order regressors, which dominate the model. The preconditioned
+  matrix is the identity plus a term of rank :math:`p - n_{prec}`, so in exact arithmetic the
+  iteration converges in at most :math:`p - n_{prec} + 1` steps.
+
+  :param callable Kdot: A function that applies :math:`\mathbf{K}` to a vector \
+         (see :py:func:`everest.gp.GetCovarianceOperator`)
+  :param callable Kinv: A function that applies :math:`\mathbf{K}^{-1}` to a vector
+  :param ndarray X: The design matrix (*N*, *p*)
+  :param ndarray T: The other regressors (*N*, *q*). Default :py:obj:`None`
+  :param float tol: The relative tolerance of the solves (see :py:func:`PCG`). Default `1e-10`
+  :param int maxiter: The maximum number of iterations per solve. Default :py:obj:`None` \
+         (`10 (p + q) + 100`)
+  :param int nprec: The number of leading columns of :py:obj:`X` to include in the \
+         preconditioner. Default `0`
+
+  '''
+
+  def __init__(self, Kdot, Kinv, X, T = None, tol = 1e-10, maxiter = None, nprec = 0):
+    '''
+
+    '''
+
+    self.Kdot = Kdot
+    self.Kinv = Kinv
+    self.X = X
+    self.T = T
+    self.tol = tol
+    if maxiter is None:
+      maxiter = 10 * (X.shape[1] + (T.shape[1] if T is not None else 0)) + 100
+    self.maxiter = maxiter
+    self.nprec = nprec
+    if nprec > 0:
+      self.Z = Kinv(X[:, :nprec])
+
+  def dot(self, v, lam):
+    '''
+    Returns :math:`\mathbf{S} \mathbf{v}` for the regressor prior variances :py:obj:`lam`.
+
+    '''
+
+    Sv = self.Kdot(v) + np.dot(self.X, lam * np.dot(self.X.T, v))
+    if self.T is not None:
+      Sv += np.dot(self.T, np.dot(self.T.T, v))
+    return Sv
+
+  def preconditioner(self, lam):
+    '''
+    Returns a function that applies the inverse of the preconditioner
+    :math:`\mathbf{K} + \mathbf{X}_p \mathbf{\Lambda}_p \mathbf{X}_p^\top` to a vector,
+    where :math:`\mathbf{X}_p` are the first :py:attr:`nprec` columns of the design matrix.
+
+    '''
+
+    if self.nprec == 0:
+      return self.Kinv
+    Xp = self.X[:, :self.nprec]
+    s = np.sqrt(lam[:self.nprec])
+    A = s[:, None] * np.dot(Xp.T, self.Z) * s[None, :]
+    A[np.diag_indices_from(A)] += 1.
+    cf = cho_factor(A)
+    def M(r):
+      Kr = self.Kinv(r)
+      return Kr - np.dot(self.Z, s * cho_solve(cf, s * np.dot(Xp.T, Kr)))
+    return M
+
+  def solve(self, f, lam, x0 = None):
+    '''
+    Returns the solution :math:`\mathbf{W}` to :math:`\mathbf{S} \mathbf{W} = \mathbf{f}` for the
+    regressor prior variances :py:obj:`lam`. If :py:obj:`f` is two-dimensional, the system
+    is solved for each of its columns.
+
+    :param ndarray x0: The initial guess, typically the solution for nearby values of \
+           :py:obj:`lam`. Default :py:obj:`None`
+
+    '''
+
+    lam = np.asarray(lam, dtype = float) * np.ones(self.X.shape[1])
+    if f.ndim > 1:
+      return np.array([self.solve(f[:, j], lam, x0[:, j] if x0 is not None else None) 
+                       for j in range(f.shape[1])]).T
+    W, niter = PCG(lambda v: self.dot(v, lam), f, M = self.preconditioner(lam), x0 = x0,
+                   tol = self.tol, maxiter = self.maxiter)
+    if niter < 0:
+      log.warn('The conjugate gradient solver did not converge after %d iterations.' % -niter)
+    return W
+
+  def weights(self, W, lam):
+    '''
+    Returns the maximum a posteriori regressor weights :math:`\mathbf{\Lambda} \mathbf{X}^\top \mathbf{W}`
+    given the solution :math:`\mathbf{W}` (see :py:meth:`solve`).
+
+    '''
+
+    lam = np.asarray(lam, dtype = float) * np.ones(self.X.shape[1])
+    return lam.reshape((-1,) + (1,) * (W.ndim - 1)) * np.dot(self.X.T, W)
+
@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+:py:mod:`mask.py` - Light curve masks
+-------------------------------------
+
+The cadence masks of a light curve. Each category of masked cadences
+(:py:obj:`nanmask`, :py:obj:`badmask`, :py:obj:`outmask`, :py:obj:`transitmask`
+and :py:obj:`recmask`) is stored as a boolean array, and the sorted index
+arrays derived from them (the union of several categories, its complement,
+and the masked or unmasked indices in each light curve chunk) are cached
+until one of the categories is changed.
+
+'''
+
+from __future__ import division, print_function, absolute_import, unicode_literals
+import numpy as np
+import logging
+log = logging.getLogger(__name__)
+
+__all__ = ['Mask']
+
+#: The mask categories
+CATEGORIES = ('nanmask', 'badmask', 'outmask', 'transitmask', 'recmask')
+
+#: The categories that make up :py:attr:`everest.basecamp.Basecamp.mask`
+MASKED = ('nanmask', 'badmask', 'outmask', 'transitmask')
+
+class Mask(object):
+  '''
+  The masked cadence indices of a light curve, one boolean array per category.
+  All arrays returned by this class are cached and are therefore read-only.
+
+  :param int size: The number of cadences in the light curve. If set, negative indices \
+         count from the end, as for :py:obj:`numpy` arrays; otherwise, they are rejected. \
+         Default :py:obj:`None`
+
+  '''
+
+  def __init__(self, size = None):
+    '''
+
+    '''
+
+    self.size = size
+    self._bits = dict([(c, np.zeros(0, dtype = bool)) for c in CATEGORIES])
+    self._inds = dict([(c, np.zeros(0, dtype = int)) for c in CATEGORIES])
+    self._cache = {}
+
+  def __getitem__(self, category):
+    '''
+    Returns the sorted array of indices in the mask :py:obj:`category`.
+
+    '''
+
+    return self._inds[category]
+
+  def __setitem__(self, category, inds):
+    '''
+    Sets the indices in the mask :py:obj:`category`.
+
+    '''
+
+    if category not in self._bits:
+      raise ValueError('Invalid mask category ``%s``.' % category)
+    if inds is None:
+      inds = []
+    inds = np.array(inds, dtype = int).reshape(-1)
+    if len(inds) and np.min(inds) < 0:
+      if self.size is None:
+        raise IndexError('Negative indices in mask ``%s`` require the light curve size.' % category)
+      if np.min(inds) < -self.size:
+        raise IndexError('Index out of bounds in mask ``%s`` of size %d.' % (category, self.size))
+      inds = np.where(inds < 0, inds + self.size, inds)
+    bits = np.zeros(np.max(inds) + 1 if len(inds) else 0, dtype = bool)
+    bits[inds] = True
+    self._bits[category] = bits
+    self._inds[category] = self._readonly(np.flatnonzero(bits))
+    self._cache = {}
+
+  def __getstate__(self):
+    '''
+
+    '''
+
+    state = dict([(c, self._inds[c]) for c in CATEGORIES])
+    state['size'] = self.size
+    return state
+
+  def __setstate__(self, state):
+    '''
+
+    '''
+
+    self.__init__(state.get('size', None))
+    for c in CATEGORIES:
+      self[c] = state[c]
+
+  @staticmethod
+  def _readonly(x):
+    '''
+
+    '''
+
+    x.flags.writeable = False
+    return x
+
+  def masked(self, N, categories = MASKED):
+    '''
+    Returns a boolean array of size :py:obj:`N` that is :py:obj:`True` for
+    the cadences in any of the mask :py:obj:`categories`.
+
+    '''
+
+    key = ('masked', N, tuple(categories))
+    if key not in self._cache:
+      bits = np.zeros(N, dtype = bool)
+      for c in categories:
+        n = min(N, len(self._bits[c]))
+        bits[:n] |= self._bits[c][:n]
+      self._cache[key] = self._readonly(bits)
+    return self._cache[key]
+
+  def indices(self, N, categories = MASKED):
+    '''
+    Returns the sorted indices of the cadences in any of the mask :py:obj:`categories`.
+
+    '''
+
+    key = ('indices', N, tuple(categories))
+    if key not in self._cache:
+      self._cache[key] = self._readonly(np.flatnonzero(self.masked(N, categories)))
+    return self._cache[key]
+
+  def unmasked(self, N, categories = MASKED):
+    '''
+    Returns the sorted indices of the cadences in none of the mask :py:obj:`categories`.
+
+    '''
+
+    key = ('unmasked', N, tuple(categories))
+    if key not in self._cache:
+      self._cache[key] = self._readonly(np.flatnonzero(~self.masked(N, categories)))
+    return self._cache[key]
+
+  def project(self, inds, N, categories = MASKED):
+    '''
+    Projects the indices :py:obj:`inds` of an array from which the cadences in
+    the mask :py:obj:`categories` were removed onto the full (unmasked) index space.
+
+    '''
+
+    return self.unmasked(N, categories)[np.array(inds, dtype = int)]
+
+  def chunk(self, N, lo, hi, categories = MASKED):
+    '''
+    Returns the sorted indices `i` with :py:obj:`lo` < `i` <= :py:obj:`hi` of
+    the cadences in none of the mask :py:obj:`categories`.
+
+    '''
+
+    key = ('chunk', N, lo, hi, tuple(categories))
+    if key not in self._cache:
+      inds = self.unmasked(N, categories)
+      self._cache[key] = inds[np.searchsorted(inds, lo, side = 'right'):np.searchsorted(inds, hi, side = 'right')]
+    return self._cache[key]
@@ -9,8 +9,11 @@
 from __future__ import division, print_function, absolute_import, unicode_literals
 from .k2 import *
 from .sysrem import GetCBVs
-from . import aux, pbs, pipelines, sysrem
-from .pbs import Download, Run, Status, Publish
+from . import aux, basis, batch, ingest, neighbors, pbs, pipelines, rawdata, sysrem
+from .basis import BuildNeighborBasis
+from .rawdata import MigrateRawData
+from .batch import SearchStore, BatchSearch
+from .pbs import Download, Run, Status, Publish, RenderDVS
 
 #: The string that identifies individual targets for this mission
 IDSTRING = 'EPIC'
@@ -11,7 +11,8 @@ generally called from the top level of the code.
 
 from __future__ import division, print_function, absolute_import, unicode_literals
 from .pipelines import Pipelines
-from ...config import EVEREST_SRC, EVEREST_DAT, EVEREST_DEV
+from ...config import EVEREST_SRC, EVEREST_DAT, EVEREST_DEV, MAST_EPIC_URL, DSS_URL, \
+                      EVEREST_TIMEOUT, EVEREST_RETRIES
 from ...utils import _float
 from ...math import Chunks
 try:
@@ -26,15 +27,19 @@ from scipy.interpolate import griddata
 import k2plr as kplr; kplr_client = kplr.API()
 import numpy as np
 from tempfile import NamedTemporaryFile
-import urllib
+from six.moves import urllib
+from six.moves.http_client import HTTPException
+import functools
+import time
+import io
 import re
 import os, subprocess
 import logging
 log = logging.getLogger(__name__)
 
-__all__ = ['Campaign', 'GetK2Stars', 'GetK2Campaign', 'Channel', 'RemoveBackground', 
+__all__ = ['K2Catalog', 'Catalog', 'Campaign', 'GetK2Stars', 'GetK2Campaign', 'Channel', 'RemoveBackground', 
            'GetNeighboringChannels', 'GetSources', 'GetHiResImage', 'GetCustomAperture',
-           'StatsPicker', 'SaturationFlux', 'Module', 'Channels']
+           'StatsPicker', 'SaturationFlux', 'Module', 'Channels', 'Fetch', 'Retry', 'ReadTPF']
 
 def _range10_90(x):
   '''
@@ -117,6 +122,177 @@ class StatsPicker(object):
         log.info('Plotting %s model for %d...' % (self.compare_to, self.epic[i]))
         self.show(self.epic[i], mission = 'k2', model = self.compare_to)
 
+class K2Catalog(object):
+  '''
+  A columnar index of all *K2* stars, compiled from the `.stars` tables in the
+  `everest/missions/k2/tables` directory into the binary file `stars.npz` the first
+  time it is needed (and whenever any of the tables changes). The file is saved in the
+  tables directory if it is writable, and in :py:obj:`EVEREST_DAT` otherwise. Each row
+  is a target in a given campaign; the columns are the arrays :py:attr:`epic`,
+  :py:attr:`campaign`, :py:attr:`kepmag`, :py:attr:`channel` and :py:attr:`sc` (`1` if
+  short cadence data is available, `0` if not, and `-1` if unknown). Use
+  :py:func:`Catalog` to get the shared instance.
+  
+  '''
+  
+  def __init__(self):
+    '''
+    
+    '''
+    
+    path = os.path.join(EVEREST_SRC, 'missions', 'k2', 'tables')
+    tables = [os.path.join(path, 'c%02d.stars' % campaign) for campaign in range(18)]
+    tables = [t for t in tables if os.path.exists(t)]
+    
+    # The index is keyed on the modification times of the tables. It is
+    # saved next to them if we can write there, and in the data directory
+    # otherwise (i.e., when `everest` is installed in a read-only location)
+    self.mtimes = np.array([os.path.getmtime(t) for t in tables], dtype = 'float64')
+    if os.access(path, os.W_OK):
+      self.file = os.path.join(path, 'stars.npz')
+    else:
+      self.file = os.path.join(EVEREST_DAT, 'k2', 'stars.npz')
+    data = None
+    if os.path.exists(self.file):
+      try:
+        data = np.load(self.file)
+        if ('mtimes' not in data.files) or not np.array_equal(data['mtimes'], self.mtimes):
+          data = None
+      except (IOError, OSError, ValueError):
+        data = None
+    if data is not None:
+      for key in ['epic', 'campaign', 'kepmag', 'channel', 'sc']:
+        setattr(self, key, data[key])
+    else:
+      self.build(tables)
+    self._rows = None
+  
+  def build(self, tables):
+    '''
+    Compiles the index from the `.stars` :py:obj:`tables`.
+    
+    '''
+    
+    log.info('Compiling the K2 star catalog...')
+    epic = []; campaign = []; kepmag = []; channel = []; sc = []
+    for table in tables:
+      c = int(os.path.basename(table)[1:3])
+      with open(table, 'r') as file:
+        lines = [l.split(',') for l in file.read().splitlines() if len(l)]
+      for l in lines:
+        epic.append(int(l[0]))
+        campaign.append(c)
+        if len(l) == 4:
+          kepmag.append(_float(l[1]))
+          channel.append(int(l[2]))
+          sc.append({'True': 1, 'False': 0}.get(l[3].strip(), -1))
+        else:
+          kepmag.append(np.nan)
+          channel.append(-1)
+          sc.append(-1)
+    self.epic = np.array(epic, dtype = 'int64')
+    self.campaign = np.array(campaign, dtype = 'int16')
+    self.kepmag = np.array(kepmag, dtype = 'float64')
+    self.channel = np.array(channel, dtype = 'int16')
+    self.sc = np.array(sc, dtype = 'int8')
+    
+    # Atomically save to disk. If this fails, we simply
+    # keep the index in memory
+    try:
+      if not os.path.exists(os.path.dirname(self.file)):
+        os.makedirs(os.path.dirname(self.file))
+      f = NamedTemporaryFile("wb", suffix = '.npz', dir = os.path.dirname(self.file), delete = False)
+      np.savez(f, epic = self.epic, campaign = self.campaign, kepmag = self.kepmag, 
+               channel = self.channel, sc = self.sc, mtimes = self.mtimes)
+      f.close()
+      os.rename(f.name, self.file)
+    except (IOError, OSError):
+      log.warn('Unable to save the K2 star catalog to disk.')
+  
+  @property
+  def rows(self):
+    '''
+    A :py:obj:`dict` mapping each EPIC number to its first row in the catalog.
+    
+    '''
+    
+    if self._rows is None:
+      n = len(self.epic)
+      self._rows = dict(zip(self.epic[::-1].tolist(), range(n - 1, -1, -1)))
+    return self._rows
+  
+  def __len__(self):
+    '''
+    
+    '''
+    
+    return len(self.epic)
+  
+  def __contains__(self, EPIC):
+    '''
+    
+    '''
+    
+    return EPIC in self.rows
+  
+  def lookup(self, EPIC):
+    '''
+    Returns the tuple `(campaign, kepmag, channel, sc)` for the first campaign in which
+    :py:obj:`EPIC` was observed, or :py:obj:`None` if the target is not in the catalog.
+    
+    '''
+    
+    i = self.rows.get(EPIC, None)
+    if i is None:
+      return None
+    return int(self.campaign[i]), float(self.kepmag[i]), int(self.channel[i]), int(self.sc[i])
+  
+  def select(self, campaign = None, channel = None, mag_range = None, sc = None):
+    '''
+    Returns the rows of the catalog matching all of the given criteria, in the
+    order in which they appear in the `.stars` tables.
+    
+    :param campaign: A campaign number or a list of campaign numbers. Default :py:obj:`None`
+    :param channel: A channel number or a list of channel numbers. Default :py:obj:`None`
+    :param tuple mag_range: (`low`, `high`) values for the Kepler magnitude (exclusive). Default :py:obj:`None`
+    :param bool sc: Select only targets with (:py:obj:`True`) or without (:py:obj:`False`) \
+                    short cadence data. Default :py:obj:`None`
+    
+    '''
+    
+    keep = np.ones(len(self.epic), dtype = bool)
+    if campaign is not None:
+      keep &= np.isin(self.campaign, np.atleast_1d(campaign).astype(int))
+    if channel is not None:
+      keep &= np.isin(self.channel, np.atleast_1d(channel).astype(int))
+    if mag_range is not None:
+      keep &= (self.kepmag > mag_range[0]) & (self.kepmag < mag_range[1])
+    if sc is not None:
+      keep &= (self.sc == 1) if sc else (self.sc != 1)
+    return np.flatnonzero(keep)
+  
+  def stars(self, rows):
+    '''
+    Returns the catalog :py:obj:`rows` in the format of :py:func:`GetK2Stars`.
+    
+    '''
+    
+    sc = {1: True, 0: False, -1: None}
+    return [[int(self.epic[i]), float(self.kepmag[i]), int(self.channel[i]), sc[int(self.sc[i])]] for i in rows]
+
+_catalog = None
+
+def Catalog():
+  '''
+  Returns the :py:class:`K2Catalog`, which is loaded (or compiled) on the first call.
+  
+  '''
+  
+  global _catalog
+  if _catalog is None:
+    _catalog = K2Catalog()
+  return _catalog
+
 def Campaign(EPIC, **kwargs):
   '''
   Returns the campaign number for a given EPIC target. If target is not found, returns :py:obj:`None`.
@@ -125,10 +301,10 @@ def Campaign(EPIC, **kwargs):
   
   '''
   
-  for campaign, stars in GetK2Stars().items():
-    if EPIC in [s[0] for s in stars]:
-      return campaign
-  return None
+  star = Catalog().lookup(EPIC)
+  if star is None:
+    return None
+  return star[0]
 
 def GetK2Stars(clobber = False):
   '''
@@ -141,10 +317,12 @@ def GetK2Stars(clobber = False):
             campaign. Each item in the :py:obj:`dict` is a list of the targets in the corresponding \
             campaign, and each item in that list is in turn a list of the following: **EPIC number** (:py:class:`int`), \
             **Kp magnitude** (:py:class:`float`), **CCD channel number** (:py:class:`int`), and **short cadence available** (:py:class:`bool`).
+            For lookups and selections, use the :py:class:`K2Catalog` returned by :py:func:`Catalog` instead.
   
   '''
   
   # Download
+  global _catalog
   if clobber:
     print("Downloading K2 star list...")
     stars = kplr_client.k2_star_info()
@@ -155,22 +333,12 @@ def GetK2Stars(clobber = False):
       with open(os.path.join(EVEREST_SRC, 'missions', 'k2', 'tables', 'c%02d.stars' % campaign), 'w') as f:
         for star in stars[campaign]:
           print(",".join([str(s) for s in star]), file = f)
+    _catalog = None
   
   # Return
-  res = {}
-  for campaign in range(18):
-    f = os.path.join(EVEREST_SRC, 'missions', 'k2', 'tables', 'c%02d.stars' % campaign)
-    if os.path.exists(f):
-      with open(f, 'r') as file:
-        lines = file.readlines() 
-        if len(lines[0].split(',')) == 4:
-          # EPIC number, Kp magnitude, channel number, short cadence available?
-          stars = [[int(l.split(',')[0]), _float(l.split(',')[1]), int(l.split(',')[2]), eval(l.split(',')[3])] for l in lines]
-        else:
-          stars = [[int(l), np.nan, -1, None] for l in lines]
-      res.update({campaign: stars})
-
-  return res
+  catalog = Catalog()
+  return dict([(int(campaign), catalog.stars(catalog.select(campaign = campaign))) 
+               for campaign in np.unique(catalog.campaign)])
 
 def GetK2Campaign(campaign, clobber = False, split = False, epics_only = False, cadence = 'lc'):
   '''
@@ -188,17 +356,17 @@ def GetK2Campaign(campaign, clobber = False, split = False, epics_only = False,
                           
   '''
   
-  all = GetK2Stars(clobber = clobber)
-  if int(campaign) in all.keys():
-    all = all[int(campaign)]
-  else:
+  if clobber:
+    GetK2Stars(clobber = True)
+  catalog = Catalog()
+  rows = catalog.select(campaign = int(campaign), sc = True if cadence == 'sc' else None)
+  if len(rows) == 0:
     return []
   
-  if cadence == 'sc':
-    all = [a for a in all if a[3]]
-  
   if epics_only:
-    all = [a[0] for a in all]
+    all = catalog.epic[rows].tolist()
+  else:
+    all = catalog.stars(rows)
   if type(campaign) is int or type(campaign) is np.int64:
     if not split:
       return all
@@ -234,10 +402,7 @@ def Channel(EPIC):
   
   '''
   
-  campaign = Campaign(EPIC)
-  stars = GetK2Stars()[campaign]
-  i = np.argmax([s[0] == EPIC for s in stars])
-  return stars[i][2]
+  return Catalog().lookup(EPIC)[2]
 
 def Module(EPIC):
   '''
@@ -280,10 +445,7 @@ def KepMag(EPIC):
   
   '''
   
-  campaign = Campaign(EPIC)
-  stars = GetK2Stars()[campaign]
-  i = np.argmax([s[0] == EPIC for s in stars])
-  return stars[i][1]
+  return Catalog().lookup(EPIC)[1]
   
 def RemoveBackground(EPIC):
   '''
@@ -306,7 +468,7 @@ def GetNeighboringChannels(channel):
   x = divmod(channel - 1, 4)[1]
   return channel + np.array(range(-x, -x + 4), dtype = int)
       
-def MASTRADec(ra, dec, darcsec, stars_only = False):
+def MASTRADec(ra, dec, darcsec, stars_only = False, timeout = None, retries = None):
   '''
   Detector location retrieval based upon RA and Dec.
   Adapted from `PyKE <http://keplergo.arc.nasa.gov/PyKE.shtml>`_.
@@ -321,7 +483,7 @@ def MASTRADec(ra, dec, darcsec, stars_only = False):
   dec2 = dec + darcsec
  
   # build mast query
-  url  = 'http://archive.stsci.edu/k2/epic/search.php?'
+  url  = MAST_EPIC_URL + '?'
   url += 'action=Search'
   url += '&k2_ra=' + str(ra1) + '..' + str(ra2)
   url += '&k2_dec=' + str(dec1) + '..' + str(dec2)
@@ -334,10 +496,10 @@ def MASTRADec(ra, dec, darcsec, stars_only = False):
 
   # retrieve results from MAST
   try:
-    lines = urllib.request.urlopen(url)
-  except:
+    lines = Fetch(url, timeout = timeout, retries = retries).splitlines()
+  except (IOError, OSError, HTTPException):
     log.warn('Unable to retrieve source data from MAST.')
-    lines = ''
+    lines = []
 
   # collate nearby sources
   epicid = []
@@ -398,7 +560,119 @@ def sex2dec(ra, dec):
 
   return outra, outdec
 
-def GetSources(ID, darcsec = None, stars_only = False):
+def Fetch(url, timeout = None, retries = None, backoff = 1.):
+  '''
+  Downloads and returns the contents of :py:obj:`url`. Requests that time out or fail
+  because of a connection or server error are retried after waiting :py:obj:`backoff`
+  seconds, doubling the wait after each attempt. Client errors (`4xx`) are raised immediately.
+  
+  :param str url: The url
+  :param float timeout: The timeout in seconds for each attempt. Default \
+         :py:obj:`everest.config.EVEREST_TIMEOUT`
+  :param int retries: The number of times to retry a failed request. Default \
+         :py:obj:`everest.config.EVEREST_RETRIES`
+  :param float backoff: The wait in seconds before the first retry. Default `1`
+  
+  '''
+  
+  if timeout is None:
+    timeout = EVEREST_TIMEOUT
+  if retries is None:
+    retries = EVEREST_RETRIES
+  for n in range(retries + 1):
+    try:
+      handler = urllib.request.urlopen(url, timeout = timeout)
+      try:
+        return handler.read()
+      finally:
+        handler.close()
+    except Exception as e:
+      if not _Transient(e):
+        raise
+      error = e
+    if n < retries:
+      log.warn('Request to %s failed (%s). Retrying...' % (url.split('?')[0], error))
+      time.sleep(backoff * 2 ** n)
+  raise error
+
+def _Transient(e):
+  '''
+  Returns :py:obj:`True` if the exception :py:obj:`e` raised by a request is worth
+  retrying: a timeout, a connection error, or a server error (`5xx`, `408` or `429`).
+  
+  '''
+  
+  # HTTP errors, including the `k2plr` API errors
+  code = getattr(e, 'code', None)
+  if isinstance(code, int):
+    return (code >= 500) or (code in [408, 429])
+  return isinstance(e, (IOError, OSError, HTTPException))
+
+def Retry(func, retries = None, backoff = 1.):
+  '''
+  Returns a version of :py:obj:`func` that is called again if it raises a transient
+  exception (as in :py:func:`Fetch`), up to :py:obj:`retries` times, waiting
+  :py:obj:`backoff` seconds before the first retry and doubling the wait after each
+  attempt. Other exceptions are raised immediately. Used for the :py:mod:`k2plr`
+  requests, which do not go through :py:func:`Fetch`.
+  
+  '''
+  
+  if retries is None:
+    retries = EVEREST_RETRIES
+  
+  @functools.wraps(func)
+  def wrapper(*args, **kwargs):
+    for n in range(retries + 1):
+      try:
+        return func(*args, **kwargs)
+      except KeyboardInterrupt:
+        raise
+      except Exception as e:
+        if (n == retries) or not _Transient(e):
+          raise
+        log.warn('Call to %s failed (%s). Retrying...' % (func.__name__, e))
+        time.sleep(backoff * 2 ** n)
+  
+  return wrapper
+
+def ReadTPF(f):
+  '''
+  Reads everything the pipeline needs from an open `K2` target pixel file :py:obj:`f`
+  in a single pass. Returns a :py:obj:`dict` with the raw `cadn`, `time`, `fpix`, 
+  `fpix_err`, `qual`, `pc1` and `pc2` arrays, the aperture extension `mask`, the
+  header `cards` of the three extensions, the aperture extension `header` (with the
+  pixel WCS), and the target coordinates `ra` and `dec` in degrees.
+  
+  '''
+  
+  qdata = f[1].data
+  return dict(cadn = np.array(qdata.field('CADENCENO'), dtype='int32'),
+              time = np.array(qdata.field('TIME'), dtype='float64'),
+              fpix = np.array(qdata.field('FLUX'), dtype='float64'),
+              fpix_err = np.array(qdata.field('FLUX_ERR'), dtype='float64'),
+              qual = np.array(qdata.field('QUALITY'), dtype=int),
+              pc1 = np.array(qdata.field('POS_CORR1'), dtype='float64'),
+              pc2 = np.array(qdata.field('POS_CORR2'), dtype='float64'),
+              mask = np.array(f[2].data),
+              cards = [f[0].header.cards, f[1].header.cards, f[2].header.cards],
+              header = f[2].header.copy(),
+              ra = f[0].header['RA_OBJ'],
+              dec = f[0].header['DEC_OBJ'])
+
+def _GetTPF(ID):
+  '''
+  Downloads (if necessary) and reads the long cadence target pixel file for target :py:obj:`ID`.
+  
+  '''
+  
+  client = kplr.API()
+  star = client.k2_star(ID)
+  tpf = star.get_target_pixel_files()[0]
+  with tpf.open() as f:
+    return ReadTPF(f)
+
+def GetSources(ID, darcsec = None, stars_only = False, tpf = None, timeout = None, retries = None):
   '''
   Grabs the EPIC coordinates from the TPF and searches MAST
   for other EPIC targets within the same aperture.
@@ -408,36 +682,40 @@ def GetSources(ID, darcsec = None, stars_only = False):
             Default is four times the largest dimension of the aperture.
   :param bool stars_only: If :py:obj:`True`, only returns objects explicitly designated \
                           as `"stars"` in MAST. Default :py:obj:`False`
+  :param dict tpf: The target pixel file read by :py:func:`ReadTPF`. Default :py:obj:`None` \
+                   (the file is downloaded and read)
+  :param float timeout: The request timeout in seconds (see :py:func:`Fetch`)
+  :param int retries: The number of times to retry a failed request (see :py:func:`Fetch`)
   :returns: A list of :py:class:`Source` instances containing \
             other :py:obj:`EPIC` targets within or close to this target's aperture
   '''
   
-  client = kplr.API()
-  star = client.k2_star(ID)
-  tpf = star.get_target_pixel_files()[0]
-  with tpf.open() as f:
-    crpix1 = f[2].header['CRPIX1']
-    crpix2 = f[2].header['CRPIX2']
-    crval1 = f[2].header['CRVAL1']  
-    crval2 = f[2].header['CRVAL2'] 
-    cdelt1 = f[2].header['CDELT1']   
-    cdelt2 = f[2].header['CDELT2']
-    pc1_1 = f[2].header['PC1_1']
-    pc1_2 = f[2].header['PC1_2']
-    pc2_1 = f[2].header['PC2_1']
-    pc2_2 = f[2].header['PC2_2']
-    pc = np.array([[pc1_1, pc1_2], [pc2_1, pc2_2]])
-    pc = np.linalg.inv(pc)
-    crpix1p = f[2].header['CRPIX1P']
-    crpix2p = f[2].header['CRPIX2P']
-    crval1p = f[2].header['CRVAL1P']  
-    crval2p = f[2].header['CRVAL2P'] 
-    cdelt1p = f[2].header['CDELT1P']   
-    cdelt2p = f[2].header['CDELT2P']
-    if darcsec is None:
-      darcsec = 4 * max(f[2].data.shape)
-
-  epicid, ra, dec, kepmag = MASTRADec(star.k2_ra, star.k2_dec, darcsec, stars_only)
+  if tpf is None:
+    tpf = _GetTPF(ID)
+  header = tpf['header']
+  crpix1 = header['CRPIX1']
+  crpix2 = header['CRPIX2']
+  crval1 = header['CRVAL1']  
+  crval2 = header['CRVAL2'] 
+  cdelt1 = header['CDELT1']   
+  cdelt2 = header['CDELT2']
+  pc1_1 = header['PC1_1']
+  pc1_2 = header['PC1_2']
+  pc2_1 = header['PC2_1']
+  pc2_2 = header['PC2_2']
+  pc = np.array([[pc1_1, pc1_2], [pc2_1, pc2_2]])
+  pc = np.linalg.inv(pc)
+  crpix1p = header['CRPIX1P']
+  crpix2p = header['CRPIX2P']
+  crval1p = header['CRVAL1P']  
+  crval2p = header['CRVAL2P'] 
+  cdelt1p = header['CDELT1P']   
+  cdelt2p = header['CDELT2P']
+  if darcsec is None:
+    darcsec = 4 * max(tpf['mask'].shape)
+
+  epicid, ra, dec, kepmag = MASTRADec(tpf['ra'], tpf['dec'], darcsec, stars_only, 
+                                      timeout = timeout, retries = retries)
   sources = []
   for i, epic in enumerate(epicid):
     dra = (ra[i] - crval1) * np.cos(np.radians(dec[i])) / cdelt1
@@ -449,23 +727,26 @@ def GetSources(ID, darcsec = None, stars_only = False):
     
   return sources
   
-def GetHiResImage(ID):
+def GetHiResImage(ID, tpf = None, timeout = None, retries = None):
   '''
   Queries the Palomar Observatory Sky Survey II catalog to
   obtain a higher resolution optical image of the star with EPIC number
   :py:obj:`ID`.
   
+  :param dict tpf: The target pixel file read by :py:func:`ReadTPF`. Default :py:obj:`None` \
+                   (the file is downloaded and read)
+  :param float timeout: The request timeout in seconds (see :py:func:`Fetch`)
+  :param int retries: The number of times to retry a failed request (see :py:func:`Fetch`)
+  
   '''
   
   # Get the TPF info
-  client = kplr.API()
-  star = client.k2_star(ID)
-  k2ra = star.k2_ra
-  k2dec = star.k2_dec
-  tpf = star.get_target_pixel_files()[0]
-  with tpf.open() as f:
-    k2wcs = WCS(f[2].header)
-    shape = np.array(f[1].data.field('FLUX'), dtype='float64')[0].shape
+  if tpf is None:
+    tpf = _GetTPF(ID)
+  k2ra = tpf['ra']
+  k2dec = tpf['dec']
+  k2wcs = WCS(tpf['header'])
+  shape = tpf['fpix'].shape[1:]
   
   # Get the POSS URL
   hou = int(k2ra * 24 / 360.)
@@ -477,39 +758,21 @@ def GetHiResImage(ID):
   min = int(60 * (np.abs(k2dec) - deg))
   sec = 3600 * (np.abs(k2dec) - deg - min / 60)
   dec = '%s%02d+%02d+%.1f' % (sgn, deg, min, sec)
-  url = 'https://archive.stsci.edu/cgi-bin/dss_search?v=poss2ukstu_red&r=%s&d=%s&e=J2000&h=3&w=3&f=fits&c=none&fov=NONE&v3=' % (ra, dec)
+  url = DSS_URL + '?v=poss2ukstu_red&r=%s&d=%s&e=J2000&h=3&w=3&f=fits&c=none&fov=NONE&v3=' % (ra, dec)
   
   # Query the server
-  r = urllib.request.Request(url)
-  handler = urllib.request.urlopen(r)
-  code = handler.getcode()
-  if int(code) != 200:
-    # Unavailable
-    return None
-  data = handler.read()
-  
-  # Atomically write to a temp file
-  f = NamedTemporaryFile("wb", delete=False)
-  f.write(data)
-  f.flush()
-  os.fsync(f.fileno())
-  f.close()
+  data = Fetch(url, timeout = timeout, retries = retries)
 
   # Now open the POSS fits file 
-  with pyfits.open(f.name) as ff:  
+  with pyfits.open(io.BytesIO(data)) as ff:  
     img = ff[0].data
+    pwcs = WCS(ff[0].header)
     
   # Map POSS pixels onto K2 pixels
-  xy = np.empty((img.shape[0] * img.shape[1], 2))
-  z = np.empty(img.shape[0] * img.shape[1])
-  pwcs = WCS(f.name)
-  k = 0
-  for i in range(img.shape[0]):
-    for j in range(img.shape[1]):
-      ra, dec = pwcs.all_pix2world(float(j), float(i), 0)
-      xy[k] = k2wcs.all_world2pix(ra, dec, 0)
-      z[k] = img[i, j]
-      k += 1
+  i, j = np.mgrid[:img.shape[0], :img.shape[1]]
+  ra, dec = pwcs.all_pix2world(j.ravel().astype(float), i.ravel().astype(float), 0)
+  xy = np.array(k2wcs.all_world2pix(ra, dec, 0)).T
+  z = np.array(img, dtype = 'float64').ravel()
   
   # Resample
   grid_x, grid_y = np.mgrid[-0.5:shape[1]-0.5:0.1, -0.5:shape[0]-0.5:0.1]
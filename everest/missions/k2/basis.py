@@ -0,0 +1,343 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+:py:mod:`basis.py` - Shared neighbor basis
+------------------------------------------
+
+A per-module store of the first order *PLD* regressors of the stars that may be
+used as neighbors by :py:class:`everest.detrender.nPLD`. These are the fractional
+pixel fluxes of each star, interpolated over its outliers, NaNs and bad timestamps.
+Most targets on a module share many of their neighbors, so the store is computed
+once per campaign (see :py:func:`BuildNeighborBasis`) instead of once per target.
+
+Each store is a single double precision `.npy` array in Fortran order, with one
+contiguous block of columns per star. A `JSON` sidecar records the settings the
+store was built with, the columns of each star, and the stars whose data could not
+be used. The array is memory-mapped, so all the processes on a node share a single
+copy in the page cache. Builds of the same store are serialized with a lock file.
+
+'''
+
+from __future__ import division, print_function, absolute_import, unicode_literals
+from ...config import EVEREST_DAT
+from ...math import Interpolate
+from .aux import Catalog, Channels
+from .neighbors import GetNeighborIndex
+from .rawdata import RawDataExists
+import os
+import json
+import glob
+import tempfile
+import numpy as np
+try:
+  import fcntl
+except ImportError:
+  fcntl = None
+import logging
+log = logging.getLogger(__name__)
+
+__all__ = ['BasisSettings', 'NeighborBasis', 'GetNeighborBasis', 'BuildNeighborBasis']
+
+def BasisSettings(cadence = 'lc', aperture_name = None, saturated_aperture_name = None,
+                  max_pixels = 75, saturation_tolerance = -0.1):
+  '''
+  Returns the :py:func:`everest.missions.k2.GetData` settings the regressors depend on,
+  with the default apertures filled in.
+
+  '''
+
+  return dict(cadence = cadence,
+              aperture_name = aperture_name or 'k2sff_15',
+              saturated_aperture_name = saturated_aperture_name or 'k2sff_19',
+              max_pixels = max_pixels,
+              saturation_tolerance = float(saturation_tolerance))
+
+class NeighborBasis(object):
+  '''
+  The neighbor basis store for a module. Use :py:func:`GetNeighborBasis` to get the
+  up-to-date shared instance.
+
+  :param int campaign: The `K2` campaign number
+  :param int module: The module number
+  :param str cadence: The light curve cadence. Default `lc`
+  :param str aperture_name: The name of the aperture. Default `k2sff_15`
+
+  '''
+
+  def __init__(self, campaign, module, cadence = 'lc', aperture_name = None):
+    '''
+
+    '''
+
+    self.campaign = int(campaign)
+    self.module = int(module)
+    self.dir = os.path.join(EVEREST_DAT, 'k2', 'c%02d' % self.campaign, 'basis')
+    self.name = '%s_%s_m%02d' % (cadence, aperture_name or 'k2sff_15', self.module)
+    self.file = os.path.join(self.dir, self.name + '.json')
+    self.settings = None
+    self.columns = {}
+    self.skipped = set()
+    self._x = None
+    self._mtime = None
+    self.refresh()
+
+  def __contains__(self, EPIC):
+    '''
+
+    '''
+
+    return EPIC in self.columns
+
+  def refresh(self):
+    '''
+    Reloads the store if it was rebuilt since the last call.
+
+    '''
+
+    for attempt in range(3):
+      try:
+        mtime = os.path.getmtime(self.file)
+        if mtime == self._mtime:
+          return
+        with open(self.file, 'r') as f:
+          record = json.load(f)
+        if record['file'] is not None:
+          x = np.load(os.path.join(self.dir, record['file']), mmap_mode = 'r')
+        else:
+          x = None
+      except (IOError, OSError):
+        # The store is missing or was rebuilt while we were reading it
+        continue
+      self.settings = record['settings']
+      self.columns = dict([(int(k), v) for k, v in record['columns'].items()])
+      self.skipped = set(record.get('skipped', []))
+      self._x = x
+      self._mtime = mtime
+      return
+    self.settings = None
+    self.columns = {}
+    self.skipped = set()
+    self._x = None
+    self._mtime = None
+
+  def covers(self, stars, settings):
+    '''
+    Returns :py:obj:`True` if the store was built with :py:obj:`settings` and each of
+    the :py:obj:`stars` is either in it or was skipped when it was built.
+
+    '''
+
+    return (self.settings == settings) and all([(star in self.columns) or (star in self.skipped) 
+                                                for star in stars])
+
+  def get(self, EPIC, settings):
+    '''
+    Returns a read-only view of the regressors of star :py:obj:`EPIC`, or :py:obj:`None`
+    if the star is not in the store or the store was built with different :py:obj:`settings`
+    (see :py:func:`BasisSettings`).
+
+    '''
+
+    if (EPIC not in self.columns) or (self.settings != settings):
+      return None
+    a, b = self.columns[EPIC]
+    return self._x[:, a:b]
+
+class _Lock(object):
+  '''
+  An exclusive lock on :py:obj:`path`, held while in a :py:obj:`with` block.
+  Without :py:mod:`fcntl`, this does nothing.
+
+  '''
+
+  def __init__(self, path):
+    '''
+
+    '''
+
+    self.path = path
+    self._file = None
+
+  def __enter__(self):
+    '''
+
+    '''
+
+    if fcntl is not None:
+      self._file = open(self.path, 'a')
+      fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+    return self
+
+  def __exit__(self, *args):
+    '''
+
+    '''
+
+    if self._file is not None:
+      fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+      self._file.close()
+      self._file = None
+
+_bases = {}
+
+def GetNeighborBasis(campaign, module, cadence = 'lc', aperture_name = None):
+  '''
+  Returns the :py:class:`NeighborBasis` for a module, reloaded if it was rebuilt
+  since the last call.
+
+  '''
+
+  key = (int(campaign), int(module), cadence, aperture_name or 'k2sff_15')
+  if key not in _bases:
+    _bases[key] = NeighborBasis(*key)
+  else:
+    _bases[key].refresh()
+  return _bases[key]
+
+def BuildNeighborBasis(campaign, module, cadence = 'lc', aperture_name = None,
+                       saturated_aperture_name = None, max_pixels = 75,
+                       saturation_tolerance = -0.1, mag_range = (10., 14.), clobber = False):
+  '''
+  Computes the neighbor basis store for a module from the raw data of the stars on
+  the module in the magnitude range :py:obj:`mag_range` whose apertures are not known
+  to be ineligible (see :py:class:`everest.missions.k2.neighbors.NeighborIndex`). The
+  default range includes the stars :py:func:`everest.missions.k2.GetNeighbors` falls
+  back to when there aren't enough neighbors in its default range. Stars whose raw
+  data has not been downloaded are skipped.
+
+  :param int campaign: The `K2` campaign number
+  :param int module: The module number
+  :param str cadence: The light curve cadence. Default `lc`
+  :param str aperture_name: The name of the aperture to use. Default `k2sff_15`
+  :param str saturated_aperture_name: The name of the aperture to use if the star is \
+         saturated. Default `k2sff_19`
+  :param int max_pixels: Maximum number of pixels in the TPF. Default 75
+  :param float saturation_tolerance: Target is considered saturated if flux is within \
+         this fraction of the pixel well depth. Default -0.1
+  :param tuple mag_range: (`low`, `high`) values for the Kepler magnitude. Default (10, 14)
+  :param bool clobber: Rebuild the store even if it is up to date? Default :py:obj:`False`
+
+  '''
+
+  from .k2 import TargetDirectory
+
+  campaign = int(campaign)
+  settings = BasisSettings(cadence, aperture_name, saturated_aperture_name,
+                           max_pixels, saturation_tolerance)
+  if settings['aperture_name'] == 'custom' or settings['saturated_aperture_name'] == 'custom':
+    raise ValueError('Custom apertures cannot be stored in the neighbor basis.')
+  mag_lo, mag_hi = mag_range
+  if cadence == 'sc':
+    # See the short cadence tweak in `GetNeighbors`
+    mag_lo = 7.
+
+  # The candidate stars
+  catalog = Catalog()
+  rows = catalog.select(campaign = campaign)
+  index = GetNeighborIndex(campaign)
+  stars = []
+  for star, kp, channel, sc in zip(catalog.epic[rows], catalog.kepmag[rows],
+                                   catalog.channel[rows], catalog.sc[rows]):
+    if (channel not in Channels(module)) or not (mag_lo < kp < mag_hi):
+      continue
+    if (cadence == 'sc') and (sc != 1):
+      continue
+    if index.eligible(star, settings['aperture_name']) is False:
+      continue
+    if not RawDataExists(TargetDirectory(star, campaign)):
+      continue
+    stars.append(int(star))
+
+  # Only one process builds a given store at a time; the others
+  # wait for it and then find the store up to date
+  basis = GetNeighborBasis(campaign, module, cadence, settings['aperture_name'])
+  try:
+    os.makedirs(basis.dir)
+  except OSError:
+    # Created by another process
+    pass
+  with _Lock(os.path.join(basis.dir, '.' + basis.name + '.lock')):
+    basis.refresh()
+    if (not clobber) and basis.covers(stars, settings):
+      return basis
+    return _ComputeNeighborBasis(basis, stars, settings)
+
+def _ComputeNeighborBasis(basis, stars, settings):
+  '''
+  Computes the regressors of :py:obj:`stars` and replaces the store of :py:obj:`basis`.
+  Must be called with the store's lock held.
+
+  '''
+
+  from .k2 import GetData
+
+  # Compute the regressors and write them to disk one star at a time
+  fd, raw = tempfile.mkstemp(dir = basis.dir, prefix = '.' + basis.name, suffix = '.tmp')
+  columns = {}
+  skipped = []
+  ncad = None
+  ncol = 0
+  try:
+    with os.fdopen(fd, 'wb') as f:
+      for star in stars:
+        log.info('Computing the neighbor basis for EPIC %d...' % star)
+        try:
+          data = GetData(star, season = basis.campaign, cadence = settings['cadence'],
+                         aperture_name = settings['aperture_name'],
+                         saturated_aperture_name = settings['saturated_aperture_name'],
+                         max_pixels = settings['max_pixels'], 
+                         saturation_tolerance = settings['saturation_tolerance'],
+                         get_hires = False, get_nearby = False)
+        except Exception:
+          # Some targets could be corrupted...
+          log.error('Unable to load the data for EPIC %d.' % star)
+          skipped.append(star)
+          continue
+        if data is None:
+          skipped.append(star)
+          continue
+        if ncad is None:
+          ncad = data.fpix.shape[0]
+        elif data.fpix.shape[0] != ncad:
+          log.warn('Skipping EPIC %d: wrong number of cadences.' % star)
+          skipped.append(star)
+          continue
+        mask = np.array(list(set(np.concatenate([data.badmask, data.nanmask]))), dtype = int)
+        fraw = np.sum(data.fpix, axis = 1)
+        X1 = Interpolate(data.time, mask, data.fpix / fraw.reshape(-1, 1))
+        # In Fortran order each column is contiguous
+        X1.T.tofile(f)
+        columns[star] = [ncol, ncol + X1.shape[1]]
+        ncol += X1.shape[1]
+
+    # Prepend the header
+    if ncad is not None:
+      fd, file = tempfile.mkstemp(dir = basis.dir, prefix = basis.name + '.', suffix = '.npy')
+      with os.fdopen(fd, 'wb') as f:
+        np.lib.format.write_array_header_1_0(f, {'descr': np.lib.format.dtype_to_descr(np.dtype('float64')),
+                                                 'fortran_order': True, 'shape': (ncad, ncol)})
+        with open(raw, 'rb') as r:
+          while True:
+            chunk = r.read(2 ** 24)
+            if not chunk:
+              break
+            f.write(chunk)
+      file = os.path.basename(file)
+    else:
+      file = None
+  finally:
+    os.remove(raw)
+
+  # Atomically replace the sidecar, then remove the old arrays. Processes that
+  # have them memory-mapped can keep reading them until they refresh.
+  fd, tmp = tempfile.mkstemp(dir = basis.dir, prefix = '.' + basis.name, suffix = '.tmp')
+  with os.fdopen(fd, 'w') as f:
+    json.dump({'settings': settings, 'file': file,
+               'columns': dict([(str(k), v) for k, v in columns.items()]),
+               'skipped': skipped}, f)
+  os.rename(tmp, basis.file)
+  for old in glob.glob(os.path.join(basis.dir, basis.name + '.*.npy')):
+    if os.path.basename(old) != file:
+      os.remove(old)
+  basis.refresh()
+  return basis
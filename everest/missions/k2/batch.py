@@ -0,0 +1,326 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+:py:mod:`batch.py` - Campaign transit search
+--------------------------------------------
+
+Runs the single transit search (:py:func:`everest.search.Search`) on all
+targets in a campaign and collects the results in a campaign-level
+:py:class:`SearchStore`. The delta chi-squared series of all targets are
+appended to a single binary file that is read back as a memory map, and
+a small index file records where each target's series lives, when and with
+which settings it was computed, and the strongest events found in it,
+ranked over the whole campaign.
+
+'''
+
+from __future__ import division, print_function, absolute_import, unicode_literals
+from .aux import GetK2Campaign
+from .k2 import TargetDirectory, FITSFile
+from ...config import EVEREST_DAT
+from ...utils import FunctionWrapper
+from ...search import Search
+from ...pool import Pool
+import os, sys
+import numpy as np
+import traceback
+import logging
+log = logging.getLogger(__name__)
+
+__all__ = ['SearchStore', 'BatchSearch']
+
+#: The columns of the delta chi-squared series
+COLUMNS = ('time', 'depth', 'vardepth', 'delchisq')
+
+def Events(time, depth, vardepth, delchisq, nevents = 5, window = 0.5):
+  '''
+  Returns the indices of the :py:obj:`nevents` highest delta chi-squared peaks
+  with a positive depth, at least :py:obj:`window` days apart.
+
+  '''
+
+  dchisq = np.where(depth > 0, delchisq, np.nan)
+  dchisq[np.isnan(dchisq)] = -np.inf
+  inds = []
+  for n in range(nevents):
+    i = np.argmax(dchisq)
+    if not np.isfinite(dchisq[i]):
+      break
+    inds.append(i)
+    dchisq[np.abs(time - time[i]) < window] = -np.inf
+  return np.array(inds, dtype = int)
+
+def _SearchTarget(EPIC, cadence = 'lc', **kwargs):
+  '''
+  Runs the transit search on a single target. Returns the tuple `(EPIC, mtime, data)`,
+  where `mtime` is the modification time of the FITS file the search was run on
+  and `data` is the (4, *N*) array of times, depths, depth variances and delta
+  chi-squared values, or :py:obj:`None` if the search failed.
+
+  '''
+
+  from ...user import Everest
+  try:
+    star = Everest(EPIC, mission = 'k2', cadence = cadence, quiet = True)
+    mtime = os.path.getmtime(star.fitsfile)
+    data = np.vstack(Search(star, **kwargs))
+  except KeyboardInterrupt:
+    sys.exit()
+  except:
+    log.error("Error searching EPIC %d." % EPIC)
+    exctype, value, tb = sys.exc_info()
+    for line in traceback.format_exception_only(exctype, value):
+      log.error(line.replace('\n', ''))
+    return None
+  return EPIC, mtime, data
+
+class SearchStore(object):
+  '''
+  The transit search results for all targets in a campaign. The series are
+  stored in ``search.dat`` (or ``search_sc.dat``) as contiguous blocks of
+  `float64` values, one block of shape (4, *N*) per target, and the index
+  in the accompanying ``.npz`` file. Re-searched targets are appended to the
+  data file; call :py:meth:`compact` to reclaim the space used by their
+  previous results.
+
+  :param int campaign: The `K2` campaign number
+  :param str cadence: Long (:py:obj:`lc`) or short (:py:obj:`sc`) cadence? Default :py:obj:`lc`
+
+  '''
+
+  def __init__(self, campaign, cadence = 'lc'):
+    '''
+
+    '''
+
+    self.campaign = int(campaign)
+    self.cadence = cadence
+    path = os.path.join(EVEREST_DAT, 'k2', 'c%02d' % self.campaign)
+    name = 'search' if cadence == 'lc' else 'search_%s' % cadence
+    self.datfile = os.path.join(path, name + '.dat')
+    self.idxfile = os.path.join(path, name + '.npz')
+    self.load()
+
+  def __repr__(self):
+    '''
+
+    '''
+
+    return "<everest.SearchStore(C%02d, %d targets)>" % (self.campaign, len(self.epic))
+
+  def __contains__(self, EPIC):
+    '''
+
+    '''
+
+    return EPIC in self._row
+
+  def load(self):
+    '''
+    Loads the index from disk.
+
+    '''
+
+    if os.path.exists(self.idxfile) and os.path.exists(self.datfile):
+      idx = np.load(self.idxfile)
+      self.epic = idx['epic']
+      self.offset = idx['offset']
+      self.size = idx['size']
+      self.mtime = idx['mtime']
+      self.settings = list(idx['settings'])
+      self.event_epic = idx['event_epic']
+      self.event_data = idx['event_data']
+    else:
+      self.epic = np.array([], dtype = int)
+      self.offset = np.array([], dtype = int)
+      self.size = np.array([], dtype = int)
+      self.mtime = np.array([], dtype = float)
+      self.settings = []
+      self.event_epic = np.array([], dtype = int)
+      self.event_data = np.zeros((4, 0))
+    self._row = dict([(e, i) for i, e in enumerate(self.epic)])
+    self._data = None
+
+  def save(self):
+    '''
+    Saves the index to disk, ranking the events by decreasing delta chi-squared.
+
+    '''
+
+    i = np.argsort(-self.event_data[3], kind = 'mergesort')
+    self.event_epic = self.event_epic[i]
+    self.event_data = self.event_data[:,i]
+    tmp = self.idxfile + '.tmp.npz'
+    np.savez(tmp, epic = self.epic, offset = self.offset, size = self.size,
+             mtime = self.mtime, settings = np.array(self.settings, dtype = str),
+             event_epic = self.event_epic, event_data = self.event_data)
+    os.rename(tmp, self.idxfile)
+
+  @property
+  def data(self):
+    '''
+    A read-only memory map of the data file.
+
+    '''
+
+    if self._data is None:
+      if os.path.exists(self.datfile) and os.path.getsize(self.datfile):
+        self._data = np.memmap(self.datfile, dtype = 'float64', mode = 'r')
+      else:
+        self._data = np.zeros(0)
+    return self._data
+
+  def current(self, EPIC, mtime, settings):
+    '''
+    Returns :py:obj:`True` if the results for :py:obj:`EPIC` were computed with
+    :py:obj:`settings` from a FITS file with modification time :py:obj:`mtime`.
+    A :py:obj:`mtime` of :py:obj:`None` (the FITS file is not on disk) matches
+    any previous run.
+
+    '''
+
+    i = self._row.get(EPIC, None)
+    if i is None or self.settings[i] != settings:
+      return False
+    return (mtime is None) or (self.mtime[i] == mtime)
+
+  def add(self, EPIC, mtime, settings, data, nevents = 5, window = 0.5):
+    '''
+    Appends the (4, *N*) array :py:obj:`data` of times, depths, depth variances
+    and delta chi-squared values for :py:obj:`EPIC` to the data file and updates
+    its entry in the index. Call :py:meth:`save` afterwards to write the index.
+
+    :param int nevents: The number of events to keep in the ranked index. Default `5`
+    :param float window: The minimum separation in days between events. Default `0.5`
+
+    '''
+
+    data = np.array(data, dtype = 'float64')
+    with open(self.datfile, 'ab') as f:
+      f.seek(0, os.SEEK_END)
+      offset = f.tell() // 8
+      f.write(data.tobytes())
+    self._data = None
+
+    # Update the target table
+    i = self._row.get(EPIC, None)
+    if i is None:
+      self._row[EPIC] = len(self.epic)
+      self.epic = np.append(self.epic, EPIC)
+      self.offset = np.append(self.offset, offset)
+      self.size = np.append(self.size, data.shape[1])
+      self.mtime = np.append(self.mtime, mtime)
+      self.settings.append(settings)
+    else:
+      self.offset[i] = offset
+      self.size[i] = data.shape[1]
+      self.mtime[i] = mtime
+      self.settings[i] = settings
+
+    # Update the events
+    keep = (self.event_epic != EPIC)
+    inds = Events(*data, nevents = nevents, window = window)
+    self.event_epic = np.append(self.event_epic[keep], EPIC * np.ones(len(inds), dtype = int))
+    self.event_data = np.hstack([self.event_data[:,keep], data[:,inds]])
+
+  def get(self, EPIC):
+    '''
+    Returns the arrays of times, depths, depth variances and delta chi-squared
+    values for :py:obj:`EPIC`. These are read-only views into the data file.
+
+    '''
+
+    i = self._row[EPIC]
+    n = self.size[i]
+    return tuple(self.data[self.offset[i]:self.offset[i] + 4 * n].reshape(4, n))
+
+  def events(self, nmax = None, min_delchisq = None, min_depth = None, EPIC = None):
+    '''
+    Returns the events in the index, ranked by decreasing delta chi-squared,
+    as a record array with fields `epic`, `time`, `depth`, `vardepth` and `delchisq`.
+
+    :param int nmax: The maximum number of events to return. Default all
+    :param float min_delchisq: The minimum delta chi-squared. Default :py:obj:`None`
+    :param float min_depth: The minimum depth. Default :py:obj:`None`
+    :param EPIC: A target or a list of targets to restrict the query to. Default :py:obj:`None`
+
+    '''
+
+    keep = np.ones(len(self.event_epic), dtype = bool)
+    if min_delchisq is not None:
+      keep &= self.event_data[3] >= min_delchisq
+    if min_depth is not None:
+      keep &= self.event_data[1] >= min_depth
+    if EPIC is not None:
+      keep &= np.isin(self.event_epic, np.atleast_1d(EPIC))
+    inds = np.flatnonzero(keep)[:nmax]
+    return np.rec.fromarrays([self.event_epic[inds]] + list(self.event_data[:,inds]),
+                             names = ('epic',) + COLUMNS)
+
+  def compact(self):
+    '''
+    Rewrites the data file, discarding the series of re-searched targets
+    that were superseded.
+
+    '''
+
+    tmp = self.datfile + '.tmp'
+    offset = 0
+    with open(tmp, 'wb') as f:
+      for i in range(len(self.epic)):
+        n = 4 * self.size[i]
+        f.write(np.array(self.data[self.offset[i]:self.offset[i] + n]).tobytes())
+        self.offset[i] = offset
+        offset += n
+    self._data = None
+    os.rename(tmp, self.datfile)
+    self.save()
+
+def BatchSearch(campaign, cadence = 'lc', clobber = False, nevents = 5, window = 0.5,
+                batch = 1000, pool = 'AnyPool', **kwargs):
+  '''
+  Runs :py:func:`everest.search.Search` on all targets in a campaign in parallel
+  and stores the results in the campaign's :py:class:`SearchStore`. Targets whose
+  results were computed with the same settings from the current FITS file are skipped.
+
+  :param campaign: The `K2` campaign number. If this is an :py:class:`int`, searches \
+                   all targets in that campaign. If a :py:class:`float` in the form \
+                   `X.Y`, searches the `Y^th` decile of campaign `X`.
+  :param str cadence: Long (:py:obj:`lc`) or short (:py:obj:`sc`) cadence? Default :py:obj:`lc`
+  :param bool clobber: Re-search all targets? Default :py:obj:`False`
+  :param int nevents: The number of events per target to keep in the ranked index. Default `5`
+  :param float window: The minimum separation in days between events. Default `0.5`
+  :param int batch: The number of targets searched between writes to the store. Default `1000`
+  :param str pool: The :py:func:`everest.pool.Pool` to use. Default `AnyPool`
+
+  Additional keyword arguments (:py:obj:`pos_tol`, :py:obj:`neg_tol` and the transit
+  shape parameters) are passed to :py:func:`everest.search.Search`.
+
+  :returns: The :py:class:`SearchStore` for the campaign
+
+  '''
+
+  # Figure out which targets need to be searched
+  store = SearchStore(campaign, cadence = cadence)
+  settings = repr(sorted(kwargs.items()))
+  stars = GetK2Campaign(campaign, epics_only = True, cadence = cadence)
+  todo = []
+  for EPIC in stars:
+    fitsfile = os.path.join(TargetDirectory(EPIC, int(campaign)), FITSFile(EPIC, int(campaign), cadence))
+    mtime = os.path.getmtime(fitsfile) if os.path.exists(fitsfile) else None
+    if clobber or not store.current(EPIC, mtime, settings):
+      todo.append(EPIC)
+  log.info("Searching %d of %d targets..." % (len(todo), len(stars)))
+
+  # Search, writing to the store after each batch so that
+  # an interrupted run can be resumed
+  m = FunctionWrapper(_SearchTarget, cadence = cadence, **kwargs)
+  with Pool(pool) as p:
+    for i in range(0, len(todo), batch):
+      for res in p.map(m, todo[i:i + batch]):
+        if res is not None:
+          store.add(*res[:2], settings = settings, data = res[2], nevents = nevents, window = window)
+      store.save()
+      log.info("Searched %d/%d targets." % (min(i + batch, len(todo)), len(todo)))
+
+  return store
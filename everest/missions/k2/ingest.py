@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+:py:mod:`ingest.py` - Raw data ingestion
+----------------------------------------
+
+Fetches everything :py:func:`everest.missions.k2.GetData` needs for a new
+target. The target pixel files and the K2SFF apertures are downloaded
+concurrently on a thread pool; the long cadence target pixel file is then
+read once (see :py:func:`everest.missions.k2.aux.ReadTPF`), and the
+high resolution image and the nearby sources are requested from DSS and MAST
+in parallel while the short cadence file is read. Requests to DSS and MAST time
+out and are retried (see :py:func:`everest.missions.k2.aux.Fetch`); the
+:py:mod:`k2plr` downloads are retried. The service urls are set in
+:py:mod:`everest.config`.
+
+'''
+
+from __future__ import division, print_function, absolute_import, unicode_literals
+from .aux import GetSources, GetHiResImage, Retry, ReadTPF
+try:
+  import pyfits
+except ImportError:
+  try:
+    import astropy.io.fits as pyfits
+  except ImportError:
+    raise Exception('Please install the `pyfits` package.')
+import k2plr as kplr; kplr_client = kplr.API()
+from k2plr.config import KPLR_ROOT
+from multiprocessing.pool import ThreadPool
+import os
+import logging
+log = logging.getLogger(__name__)
+
+__all__ = ['TPFFiles', 'Ingest']
+
+def TPFFiles(EPIC, campaign):
+  '''
+  Returns the paths to the long and short cadence target pixel files of a target.
+
+  '''
+
+  path = os.path.join(KPLR_ROOT, 'data', 'k2', 'target_pixel_files', str(EPIC))
+  return (os.path.join(path, 'ktwo%09d-c%02d_lpd-targ.fits.gz' % (EPIC, campaign)),
+          os.path.join(path, 'ktwo%09d-c%02d_spd-targ.fits.gz' % (EPIC, campaign)))
+
+def _GetK2SFFApertures(EPIC, delete_raw = False):
+  '''
+  Returns the K2SFF apertures of a target, or :py:obj:`None` if there is
+  no K2SFF light curve for it.
+
+  '''
+
+  try:
+    k2sff = kplr.K2SFF(EPIC)
+  except Exception as e:
+    # Most targets don't have K2SFF apertures; this is not worth retrying
+    if getattr(e, 'code', None) == 404:
+      return None
+    raise
+  apertures = k2sff.apertures
+  if delete_raw:
+    os.remove(k2sff._file)
+  return apertures
+
+def Ingest(EPIC, campaign, short_cadence = False, clobber = False, delete_raw = False,
+           get_hires = True, get_nearby = True, timeout = None, retries = None, workers = 4):
+  '''
+  Concurrently downloads and reads the raw data for a target. Returns a :py:obj:`dict`
+  with the long (`tpf`) and short (`sc_tpf`) cadence target pixel files read by
+  :py:func:`everest.missions.k2.aux.ReadTPF`, the list of K2SFF apertures (`k2sff`),
+  the high resolution image (`hires`) and the list of nearby sources (`nearby`).
+
+  :param int EPIC: The EPIC ID number
+  :param int campaign: The campaign number
+  :param bool short_cadence: Get the short cadence data? Default :py:obj:`False`
+  :param bool clobber: Download the target pixel files even if they exist? Default :py:obj:`False`
+  :param bool delete_raw: Delete the K2SFF file after reading it? Default :py:obj:`False`
+  :param bool get_hires: Download a high resolution image of the target? Default :py:obj:`True`
+  :param bool get_nearby: Retrieve location of nearby sources? Default :py:obj:`True`
+  :param float timeout: The timeout in seconds for the DSS and MAST requests. Default \
+         :py:obj:`everest.config.EVEREST_TIMEOUT`
+  :param int retries: The number of times to retry failed requests. Default \
+         :py:obj:`everest.config.EVEREST_RETRIES`
+  :param int workers: The number of threads. Default `4`
+
+  '''
+
+  tpf, sc_tpf = TPFFiles(EPIC, campaign)
+  files = [tpf, sc_tpf] if short_cadence else [tpf]
+  pool = ThreadPool(workers)
+  try:
+
+    # The K2SFF apertures don't depend on anything else
+    k2sff = pool.apply_async(Retry(_GetK2SFFApertures, retries), (EPIC,), dict(delete_raw = delete_raw))
+
+    # Download the target pixel files in parallel
+    if clobber or not all([os.path.exists(f) for f in files]):
+      star = Retry(kplr_client.k2_star, retries)(EPIC)
+      tpfs = Retry(star.get_target_pixel_files, retries)()
+      for res in [pool.apply_async(Retry(t.fetch, retries)) for t in tpfs]:
+        res.get()
+
+    # Read the long cadence file and query DSS and MAST
+    with pyfits.open(tpf) as f:
+      data = ReadTPF(f)
+    kwargs = dict(tpf = data, timeout = timeout, retries = retries)
+    hires = pool.apply_async(GetHiResImage, (EPIC,), kwargs) if get_hires else None
+    nearby = pool.apply_async(GetSources, (EPIC,), kwargs) if get_nearby else None
+
+    # Meanwhile, read the short cadence file
+    if short_cadence:
+      with pyfits.open(sc_tpf) as f:
+        sc_data = ReadTPF(f)
+    else:
+      sc_data = None
+
+    # Collect the results
+    try:
+      k2sff_apertures = k2sff.get()
+    except Exception:
+      k2sff_apertures = None
+    if k2sff_apertures is None:
+      k2sff_apertures = [None for i in range(20)]
+    return dict(tpf = data, sc_tpf = sc_data, k2sff = k2sff_apertures,
+                hires = hires.get() if hires is not None else None,
+                nearby = nearby.get() if nearby is not None else [])
+
+  finally:
+    pool.terminate()
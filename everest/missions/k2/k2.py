@@ -11,33 +11,32 @@ Implements several routines specific to the `K2` mission.
 from __future__ import division, print_function, absolute_import, unicode_literals
 from . import sysrem
 from .aux import *
+from .ingest import Ingest, TPFFiles
+from .basis import BasisSettings, GetNeighborBasis
+from .neighbors import GetNeighborIndex
+from .rawdata import RawDataExists, SaveRawData, LoadRawData
 from ...config import EVEREST_SRC, EVEREST_DAT, EVEREST_DEV, MAST_ROOT, EVEREST_MAJOR_MINOR
+from ...store import ModelExists, LoadModel
 from ...utils import DataContainer, sort_like, AP_COLLAPSED_PIXEL, AP_SATURATED_PIXEL
 from ...math import SavGol, Interpolate, Scatter, Downbin
-try:
-  import pyfits
-except ImportError:
-  try:
-    import astropy.io.fits as pyfits
-  except ImportError:
-    raise Exception('Please install the `pyfits` package.')
 import matplotlib.pyplot as pl
 from matplotlib.ticker import ScalarFormatter, MaxNLocator
 import k2plr as kplr; kplr_client = kplr.API()
-from k2plr.config import KPLR_ROOT
 import numpy as np
 import george
-from tempfile import NamedTemporaryFile
 import random
-import os, sys, shutil
+import os, sys
 import time
+import warnings
+from scipy.ndimage import binary_dilation
 import logging
 log = logging.getLogger(__name__)
 
 __all__ = ['Setup', 'Season', 'Breakpoints', 'GetData', 'GetNeighbors', 
            'Statistics', 'TargetDirectory', 'HasShortCadence', 'DVSFile',
            'InjectionStatistics', 'HDUCards', 'CSVFile', 'FITSFile', 'FITSUrl', 'CDPP',
-           'GetTargetCBVs', 'FitCBVs', 'PlanetStatistics']
+           'GetTargetCBVs', 'FitCBVs', 'PlanetStatistics', 'IndexModel', 'PreprocessTPF',
+           'GetNeighborRegressors']
 
 def Setup():
   '''
@@ -171,7 +170,7 @@ def GetData(EPIC, season = None, cadence = 'lc', clobber = False, delete_raw = F
             aperture_name = 'k2sff_15', saturated_aperture_name = 'k2sff_19',
             max_pixels = 75, download_only = False, saturation_tolerance = -0.1, 
             bad_bits = [1,2,3,4,5,6,7,8,9,11,12,13,14,16,17], get_hires = True, 
-            get_nearby = True, **kwargs):
+            get_nearby = True, float32 = False, timeout = None, retries = None, **kwargs):
   '''
   Returns a :py:obj:`DataContainer` instance with the raw data for the target.
   
@@ -184,7 +183,8 @@ def GetData(EPIC, season = None, cadence = 'lc', clobber = False, delete_raw = F
          :py:func:`GetCustomAperture`. Default `k2sff_15`
   :param str saturated_aperture_name: The name of the aperture to use if the target is \
          saturated. Default `k2sff_19`
-  :param int max_pixels: Maximum number of pixels in the TPF. Default 75
+  :param int max_pixels: Maximum number of pixels in the TPF. Set to :py:obj:`None` \
+         for no limit. Default 75
   :param bool download_only: Download raw TPF and return? Default :py:obj:`False`
   :param float saturation_tolerance: Target is considered saturated if flux is within \
          this fraction of the pixel well depth. Default -0.1
@@ -192,6 +192,12 @@ def GetData(EPIC, season = None, cadence = 'lc', clobber = False, delete_raw = F
          computing the model. Default `[1,2,3,4,5,6,7,8,9,11,12,13,14,16,17]`
   :param bool get_hires: Download a high resolution image of the target? Default :py:obj:`True`
   :param bool get_nearby: Retrieve location of nearby sources? Default :py:obj:`True`
+  :param bool float32: Store the pixel fluxes in single precision when downloading the data? \
+         Default :py:obj:`False`
+  :param float timeout: The timeout in seconds for the DSS and MAST requests. Default \
+         :py:obj:`everest.config.EVEREST_TIMEOUT`
+  :param int retries: The number of times to retry failed downloads. Default \
+         :py:obj:`everest.config.EVEREST_RETRIES`
   
   '''
   
@@ -200,108 +206,71 @@ def GetData(EPIC, season = None, cadence = 'lc', clobber = False, delete_raw = F
     campaign = Season(EPIC)
   else:
     campaign = season
+  
+  # No limit on the aperture size?
+  if max_pixels is None:
+    max_pixels = np.inf
 
   # Is there short cadence data available for this target?
   short_cadence = HasShortCadence(EPIC, season = campaign)
   if cadence == 'sc' and not short_cadence:
     raise ValueError("Short cadence data not available for this target.")
     
-  # Local file name
-  filename = os.path.join(EVEREST_DAT, 'k2', 'c%02d' % campaign, 
-                         ('%09d' % EPIC)[:4] + '00000', ('%09d' % EPIC)[4:],
-                         'data.npz')
+  # Local directory
+  path = TargetDirectory(EPIC, campaign)
   
   # Download?
-  if clobber or not os.path.exists(filename):
-
-    # Get the TPF
-    tpf = os.path.join(KPLR_ROOT, 'data', 'k2', 'target_pixel_files', 
-                       str(EPIC), 'ktwo%09d-c%02d_lpd-targ.fits.gz' % (EPIC, campaign))
-    sc_tpf = os.path.join(KPLR_ROOT, 'data', 'k2', 'target_pixel_files', 
-                          str(EPIC), 'ktwo%09d-c%02d_spd-targ.fits.gz' % (EPIC, campaign))
-    if clobber or not os.path.exists(tpf):                 
-      kplr_client.k2_star(EPIC).get_target_pixel_files(fetch = True)
+  if clobber or not RawDataExists(path):
 
-    with pyfits.open(tpf) as f:
-      qdata = f[1].data
-      
-      # Get the TPF aperture
-      tpf_aperture = (f[2].data & 2) // 2
+    # Download and read the raw data
+    raw = Ingest(EPIC, campaign, short_cadence = short_cadence, clobber = clobber, 
+                 delete_raw = delete_raw, get_hires = get_hires, get_nearby = get_nearby, 
+                 timeout = timeout, retries = retries)
+    tpf = raw['tpf']
+    sc_tpf = raw['sc_tpf']
     
-      # Get the enlarged TPF aperture
-      tpf_big_aperture = np.array(tpf_aperture)
-      for i in range(tpf_big_aperture.shape[0]):
-        for j in range(tpf_big_aperture.shape[1]):
-          if f[2].data[i][j] == 1:
-            for n in [(i - 1, j), (i + 1, j), (i, j - 1), (i, j + 1)]:
-              if n[0] >= 0 and n[0] < tpf_big_aperture.shape[0]:
-                if n[1] >= 0 and n[1] < tpf_big_aperture.shape[1]:
-                  if tpf_aperture[n[0]][n[1]] == 1:
-                    tpf_big_aperture[i][j] = 1
+    # Get the TPF aperture
+    tpf_aperture = (tpf['mask'] & 2) // 2
     
-    # Is there short cadence data?
-    if short_cadence:
-      with pyfits.open(sc_tpf) as f:
-        sc_qdata = f[1].data
-    
-    # Get K2SFF apertures
-    try:
-      k2sff = kplr.K2SFF(EPIC)
-      k2sff_apertures = k2sff.apertures
-      if delete_raw:
-        os.remove(k2sff._file)
-    except:
-      k2sff_apertures = [None for i in range(20)]
+    # Get the enlarged TPF aperture: the collected pixels 
+    # that share an edge with a pixel in the TPF aperture
+    tpf_big_aperture = np.array(tpf_aperture)
+    tpf_big_aperture[(tpf['mask'] == 1) & binary_dilation(tpf_aperture == 1)] = 1
     
     # Make a dict of all our apertures
     # We're not getting K2SFF apertures 0-9 any more
     apertures = {'tpf': tpf_aperture, 'tpf_big': tpf_big_aperture}
     for i in range(10,20):
-      apertures.update({'k2sff_%02d' % i: k2sff_apertures[i]})
+      apertures.update({'k2sff_%02d' % i: raw['k2sff'][i]})
     
     # Get the header info
-    fitsheader = [pyfits.getheader(tpf, 0).cards,
-                  pyfits.getheader(tpf, 1).cards,
-                  pyfits.getheader(tpf, 2).cards]
+    fitsheader = tpf['cards']
     if short_cadence:
-      sc_fitsheader = [pyfits.getheader(sc_tpf, 0).cards,
-                       pyfits.getheader(sc_tpf, 1).cards,
-                       pyfits.getheader(sc_tpf, 2).cards]
+      sc_fitsheader = sc_tpf['cards']
     else:
       sc_fitsheader = None
-      
-    # Get a hi res image of the target
-    if get_hires:
-      hires = GetHiResImage(EPIC)
-    else:
-      hires = None
-    
-    # Get nearby sources
-    if get_nearby:
-      nearby = GetSources(EPIC)
-    else:
-      nearby = []
+    hires = raw['hires']
+    nearby = raw['nearby']
     
     # Delete?
     if delete_raw:
-      os.remove(tpf)
-      if short_cadence:
-        os.remove(sc_tpf)
+      for f in TPFFiles(EPIC, campaign)[:2 if short_cadence else 1]:
+        os.remove(f)
   
     # Get the arrays
-    cadn = np.array(qdata.field('CADENCENO'), dtype='int32')
-    time = np.array(qdata.field('TIME'), dtype='float64')
-    fpix = np.array(qdata.field('FLUX'), dtype='float64')
-    fpix_err = np.array(qdata.field('FLUX_ERR'), dtype='float64')
-    qual = np.array(qdata.field('QUALITY'), dtype=int)
+    cadn = tpf['cadn']
+    time = tpf['time']
+    fpix = tpf['fpix']
+    fpix_err = tpf['fpix_err']
+    qual = tpf['qual']
     
     # Get rid of NaNs in the time array by interpolating
     naninds = np.where(np.isnan(time))
     time = Interpolate(np.arange(0, len(time)), naninds, time)
     
     # Get the motion vectors (if available!)
-    pc1 = np.array(qdata.field('POS_CORR1'), dtype='float64')
-    pc2 = np.array(qdata.field('POS_CORR2'), dtype='float64')
+    pc1 = tpf['pc1']
+    pc2 = tpf['pc2']
     if not np.all(np.isnan(pc1)) and not np.all(np.isnan(pc2)):
       pc1 = Interpolate(time, np.where(np.isnan(pc1)), pc1)
       pc2 = Interpolate(time, np.where(np.isnan(pc2)), pc2)
@@ -311,15 +280,15 @@ def GetData(EPIC, season = None, cadence = 'lc', clobber = False, delete_raw = F
     
     # Do the same for short cadence
     if short_cadence:
-      sc_cadn = np.array(sc_qdata.field('CADENCENO'), dtype='int32')
-      sc_time = np.array(sc_qdata.field('TIME'), dtype='float64')
-      sc_fpix = np.array(sc_qdata.field('FLUX'), dtype='float64')
-      sc_fpix_err = np.array(sc_qdata.field('FLUX_ERR'), dtype='float64')
-      sc_qual = np.array(sc_qdata.field('QUALITY'), dtype=int)
+      sc_cadn = sc_tpf['cadn']
+      sc_time = sc_tpf['time']
+      sc_fpix = sc_tpf['fpix']
+      sc_fpix_err = sc_tpf['fpix_err']
+      sc_qual = sc_tpf['qual']
       sc_naninds = np.where(np.isnan(sc_time))
       sc_time = Interpolate(np.arange(0, len(sc_time)), sc_naninds, sc_time)
-      sc_pc1 = np.array(sc_qdata.field('POS_CORR1'), dtype='float64')
-      sc_pc2 = np.array(sc_qdata.field('POS_CORR2'), dtype='float64')
+      sc_pc1 = sc_tpf['pc1']
+      sc_pc2 = sc_tpf['pc2']
       if not np.all(np.isnan(sc_pc1)) and not np.all(np.isnan(sc_pc2)):
         sc_pc1 = Interpolate(sc_time, np.where(np.isnan(sc_pc1)), sc_pc1)
         sc_pc2 = Interpolate(sc_time, np.where(np.isnan(sc_pc2)), sc_pc2)
@@ -338,53 +307,77 @@ def GetData(EPIC, season = None, cadence = 'lc', clobber = False, delete_raw = F
     # Static pixel images for plotting
     pixel_images = [fpix[0], fpix[len(fpix) // 2], fpix[len(fpix) - 1]]
     
-    # Atomically write to disk.
-    # http://stackoverflow.com/questions/2333872/atomic-writing-to-file-with-python
-    if not os.path.exists(os.path.dirname(filename)):
-      os.makedirs(os.path.dirname(filename))                   
-    f = NamedTemporaryFile("wb", delete = False)
-    np.savez_compressed(f, cadn = cadn, time = time, fpix = fpix, fpix_err = fpix_err, 
-                        qual = qual, apertures = apertures,  
-                        pc1 = pc1, pc2 = pc2, fitsheader = fitsheader,
-                        pixel_images = pixel_images, nearby = nearby, hires = hires,
-                        sc_cadn = sc_cadn, sc_time = sc_time, sc_fpix = sc_fpix,
-                        sc_fpix_err = sc_fpix_err, sc_qual = sc_qual,
-                        sc_pc1 = sc_pc1, sc_pc2 = sc_pc2, sc_fitsheader = sc_fitsheader)
-    f.flush()
-    os.fsync(f.fileno())
-    f.close()
-    shutil.move(f.name, filename)
+    # Atomically write to disk
+    SaveRawData(path, dict(cadn = cadn, time = time, fpix = fpix, fpix_err = fpix_err, 
+                           qual = qual, apertures = apertures,  
+                           pc1 = pc1, pc2 = pc2, fitsheader = fitsheader,
+                           pixel_images = pixel_images, nearby = nearby, hires = hires,
+                           sc_cadn = sc_cadn, sc_time = sc_time, sc_fpix = sc_fpix,
+                           sc_fpix_err = sc_fpix_err, sc_qual = sc_qual,
+                           sc_pc1 = sc_pc1, sc_pc2 = sc_pc2, sc_fitsheader = sc_fitsheader), 
+                float32 = float32)
+    
+    # Add the target to the neighbor index
+    star = Catalog().lookup(EPIC)
+    if star is not None:
+      GetNeighborIndex(campaign).add_target(EPIC, star[1], star[2], apertures, nearby, fpix.shape[1:])
     
     if download_only:
       return
   
   # Load
-  data = np.load(filename)
-  apertures = data['apertures'][()]
-  pixel_images = data['pixel_images']
-  nearby = data['nearby']
-  hires = data['hires'][()]
+  data = LoadRawData(path, cadence = cadence)
+  return PreprocessTPF(EPIC, campaign, data, cadence = cadence, aperture_name = aperture_name, 
+                       saturated_aperture_name = saturated_aperture_name, max_pixels = max_pixels,
+                       saturation_tolerance = saturation_tolerance, bad_bits = bad_bits)
+
+def _NanMedian(x):
+  '''
+  Returns the median of the finite values in each row of the 2D array :py:obj:`x`,
+  like :py:func:`numpy.nanmedian` with `axis = 1`, but much faster for arrays
+  with many short rows.
+  
+  '''
+  
+  s = np.sort(x, axis = 1)
+  n = np.sum(~np.isnan(s), axis = 1)
+  rows = np.arange(len(s))
+  lo = s[rows, np.maximum(n - 1, 0) // 2]
+  hi = s[rows, n // 2 - (n == 0)]
+  res = np.where(n % 2, lo, (lo + hi) / 2.)
+  res[n == 0] = np.nan
+  return res
+
+def PreprocessTPF(EPIC, campaign, data, cadence = 'lc', aperture_name = 'k2sff_15', 
+                  saturated_aperture_name = 'k2sff_19', max_pixels = 75, 
+                  saturation_tolerance = -0.1, bad_bits = [1,2,3,4,5,6,7,8,9,11,12,13,14,16,17]):
+  '''
+  Selects the aperture, collapses saturated columns, removes the background and flags
+  bad cadences in the raw target pixel data loaded by :py:func:`everest.missions.k2.rawdata.LoadRawData`.
+  Returns the :py:obj:`DataContainer` described in :py:func:`GetData`, or :py:obj:`None`
+  if no suitable aperture is available. Note that the apertures in :py:obj:`data` are
+  modified in place.
+  
+  :param int EPIC: The EPIC ID number
+  :param int campaign: The campaign number
+  :param dict data: The raw data for the requested :py:obj:`cadence`
+  :param str cadence: The light curve cadence. Default `lc`
   
+  The remaining keyword arguments are described in :py:func:`GetData`.
+  
+  '''
+  
+  if max_pixels is None:
+    max_pixels = np.inf
+  apertures = data['apertures']
   if cadence == 'lc':
     fitsheader = data['fitsheader']
-    cadn = data['cadn']
-    time = data['time']
-    fpix = data['fpix']
-    fpix_err = data['fpix_err']
-    qual = data['qual']
-    pc1 = data['pc1']
-    pc2 = data['pc2']
-  elif cadence == 'sc':
-    fitsheader = data['sc_fitsheader']
-    cadn = data['sc_cadn']
-    time = data['sc_time']
-    fpix = data['sc_fpix']
-    fpix_err = data['sc_fpix_err']
-    qual = data['sc_qual']
-    pc1 = data['sc_pc1']
-    pc2 = data['sc_pc2']
   else:
-    raise ValueError("Invalid value for the cadence.")
+    fitsheader = data['sc_fitsheader']
+  time = data['time']
+  fpix = data['fpix']
+  fpix_err = data['fpix_err']
+  qual = data['qual']
     
   # Select the "saturated aperture" to check if the star is saturated
   # If it is, we will use this aperture instead
@@ -408,25 +401,18 @@ def GetData(EPIC, season = None, cadence = 'lc', clobber = False, delete_raw = F
     
   # Compute the saturation flux and the 97.5th percentile 
   # flux in each pixel of the saturated aperture. We're going
-  # to compare these to decide if the star is saturated.
+  # to compare these to decide if the star is saturated. This
+  # is the order statistic of rank `int(0.975 * n)` of the `n` 
+  # finite fluxes in the pixel (`np.sort` puts the NaNs last).
   satflx = SaturationFlux(EPIC) * (1. + saturation_tolerance)
   f97 = np.zeros((fpix.shape[1], fpix.shape[2]))
-  for i in range(fpix.shape[1]):
-    for j in range(fpix.shape[2]):
-      if saturated_aperture[i,j]:
-        # Let's remove NaNs...
-        tmp = np.delete(fpix[:,i,j], np.where(np.isnan(fpix[:,i,j])))
-        # ... and really bad outliers...
-        if len(tmp):
-          f = SavGol(tmp)
-          med = np.nanmedian(f)
-          MAD = 1.4826 * np.nanmedian(np.abs(f - med))
-          bad = np.where((f > med + 10. * MAD) | (f < med - 10. * MAD))[0]
-          np.delete(tmp, bad)
-          # ... so we can compute the 97.5th percentile flux
-          i97 = int(0.975 * len(tmp))
-          tmp = tmp[np.argsort(tmp)[i97]]
-          f97[i,j] = tmp
+  sap = np.nonzero(saturated_aperture)
+  if len(sap[0]):
+    tmp = np.sort(fpix[:, sap[0], sap[1]], axis = 0)
+    n = np.sum(~np.isnan(tmp), axis = 0)
+    i97 = (0.975 * n).astype(int)
+    good = (n > 0)
+    f97[sap[0][good], sap[1][good]] = tmp[i97[good], np.flatnonzero(good)]
   
   # Check if any of the pixels are actually saturated
   if np.nanmax(f97) <= satflx:
@@ -460,6 +446,9 @@ def GetData(EPIC, season = None, cadence = 'lc', clobber = False, delete_raw = F
   # Treat saturated and unsaturated stars differently.
   if saturated:
     
+    # The saturated columns
+    satcols = np.any(f97 > satflx, axis = 0)
+    
     # We need to check if we have too many pixels *after* collapsing the columns.
     # Sort the apertures in decreasing order of pixels, but keep the aperture
     # chosen by the user first.
@@ -469,77 +458,55 @@ def GetData(EPIC, season = None, cadence = 'lc', clobber = False, delete_raw = F
     aperture_names = np.append([aperture_name], np.delete(aperture_names, np.argmax(aperture_names == aperture_name)))
     
     # Loop through them. Pick the first one that satisfies the `max_pixels` constraint
+    ncol = np.sum(satcols)
     for aperture_name in aperture_names:        
       aperture = apertures[aperture_name]
       aperture[np.isnan(fpix[0])] = 0
-      ncol = 0
       apcopy = np.array(aperture)
-      for j in range(apcopy.shape[1]):
-        if np.any(f97[:,j] > satflx):
-          apcopy[:,j] = 0
-          ncol += 1
+      apcopy[:,satcols] = 0
       if np.sum(apcopy) + ncol <= max_pixels:
         break
     if np.sum(apcopy) + ncol > max_pixels:
       log.error("No apertures available with fewer than %d pixels. Aborting." % max_pixels)
       return None
-  
-    # Now, finally, we collapse the saturated columns into single pixels
-    # and make the pixel array 2D
-    ncol = 0
-    fpixnew = []
-    ferrnew = []
     
     # HACK: K2SFF sometimes clips the heads/tails of saturated columns
     # That's really bad, since that's where all the information is. Let's
     # artificially extend the aperture by two pixels at the top and bottom
     # of each saturated column. This *could* increase contamination, but
     # it's unlikely since the saturated target is by definition really bright
-    ext = 0
-    for j in range(aperture.shape[1]):
-      if np.any(f97[:,j] > satflx):
-        for i in range(aperture.shape[0]):
-          if (aperture[i,j] == 0) and (np.nanmedian(fpix[:,i,j]) > 0):
-            if (i+2 < aperture.shape[0]) and aperture[i+2,j] == 1:
-              aperture[i,j] = 2
-              ext += 1
-            elif (i+1 < aperture.shape[0]) and aperture[i+1,j] == 1:
-              aperture[i,j] = 2
-              ext += 1
-            elif (i-1 >= 0) and aperture[i-1,j] == 1:
-              aperture[i,j] = 2
-              ext += 1
-            elif (i-2 >= 0) and aperture[i-2,j] == 1:
-              aperture[i,j] = 2
-              ext += 1
-    if ext: 
-      log.info("Extended saturated columns by %d pixel(s)." % ext)        
+    sub = aperture[:,satcols]
+    near = np.zeros(sub.shape, dtype = bool)
+    for d in [1, 2]:
+      near[:-d] |= (sub[d:] == 1)
+      near[d:] |= (sub[:-d] == 1)
+    ext = (sub == 0) & near
+    if np.any(ext):
+      with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        med = np.nanmedian(fpix[:, ext.nonzero()[0], np.flatnonzero(satcols)[ext.nonzero()[1]]], axis = 0)
+      ext[ext] = (med > 0)
+    sub[ext] = 2
+    aperture[:,satcols] = sub
+    if np.sum(ext): 
+      log.info("Extended saturated columns by %d pixel(s)." % np.sum(ext))
     
-    for j in range(aperture.shape[1]):
-      if np.any(f97[:,j] > satflx):
-        marked = False
-        collapsed = np.zeros(len(fpix[:,0,0]))
-        collapsed_err2 = np.zeros(len(fpix[:,0,0]))
-        for i in range(aperture.shape[0]):
-          if aperture[i,j]:
-            if not marked:
-              aperture[i,j] = AP_COLLAPSED_PIXEL
-              marked = True
-            else:
-              aperture[i,j] = AP_SATURATED_PIXEL
-            collapsed += fpix[:,i,j]
-            collapsed_err2 += fpix_err[:,i,j] ** 2
-        if np.any(collapsed):
-          fpixnew.append(collapsed)
-          ferrnew.append(np.sqrt(collapsed_err2))
-          ncol += 1
-      else:
-        for i in range(aperture.shape[0]):
-          if aperture[i,j]:
-            fpixnew.append(fpix[:,i,j])
-            ferrnew.append(fpix_err[:,i,j])
-    fpix2D = np.array(fpixnew).T
-    fpix_err2D = np.array(ferrnew).T
+    # Now, finally, we collapse the saturated columns into single pixels
+    # and make the pixel array 2D. The columns are summed with `cumsum`
+    # so that the pixels are added in order, one at a time. Unsaturated
+    # pixels and collapsed columns are ordered by column, then by row.
+    inap = (aperture != 0)
+    sub = inap[:,satcols]
+    first = sub & (np.cumsum(sub, axis = 0) == 1)
+    aperture[:,satcols] = np.where(first, AP_COLLAPSED_PIXEL, np.where(sub, AP_SATURATED_PIXEL, aperture[:,satcols]))
+    collapsed = np.cumsum(np.where(sub, fpix[:,:,satcols], 0.), axis = 1)[:,-1]
+    collapsed_err2 = np.cumsum(np.where(sub, fpix_err[:,:,satcols] ** 2, 0.), axis = 1)[:,-1]
+    keep = np.any(collapsed != 0, axis = 0)
+    ncol = np.sum(keep)
+    jj, ii = np.nonzero(inap.T & ~satcols.reshape(-1, 1))
+    order = np.argsort(np.concatenate([jj, np.flatnonzero(satcols)[keep]]), kind = 'mergesort')
+    fpix2D = np.hstack([fpix[:, ii, jj], collapsed[:,keep]])[:,order]
+    fpix_err2D = np.hstack([fpix_err[:, ii, jj], np.sqrt(collapsed_err2[:,keep])])[:,order]
     log.info("Collapsed %d saturated column(s)." % ncol)
 
   else:
@@ -561,16 +528,16 @@ def GetData(EPIC, season = None, cadence = 'lc', clobber = False, delete_raw = F
     # Make the pixel flux array 2D
     aperture[np.isnan(fpix[0])] = 0
     ap = np.where(aperture & 1)
-    fpix2D = np.array([f[ap] for f in fpix], dtype='float64')
-    fpix_err2D = np.array([p[ap] for p in fpix_err], dtype='float64')
+    fpix2D = np.array(fpix[:, ap[0], ap[1]], dtype='float64')
+    fpix_err2D = np.array(fpix_err[:, ap[0], ap[1]], dtype='float64')
     
   # Compute the background
   binds = np.where(aperture ^ 1)
   if RemoveBackground(EPIC) and (len(binds[0]) > 0):
-    bkg = np.nanmedian(np.array([f[binds] for f in fpix], dtype='float64'), axis = 1)
+    bkg = _NanMedian(np.array(fpix[:, binds[0], binds[1]], dtype='float64'))
     # Uncertainty of the median: http://davidmlane.com/hyperstat/A106993.html
-    bkg_err = 1.253 * np.nanmedian(np.array([e[binds] for e in fpix_err], 
-                      dtype='float64'), axis = 1) / np.sqrt(len(binds[0]))
+    bkg_err = 1.253 * _NanMedian(np.array(fpix_err[:, binds[0], binds[1]], 
+                      dtype='float64')) / np.sqrt(len(binds[0]))
     bkg = bkg.reshape(-1, 1)
     bkg_err = bkg_err.reshape(-1, 1)
   else:
@@ -587,19 +554,22 @@ def GetData(EPIC, season = None, cadence = 'lc', clobber = False, delete_raw = F
   nanmask = np.where(np.isnan(flux) | (flux == 0))[0]
   
   # Get flagged data points -- we won't train our model on them                         
-  badmask = []
-  for b in bad_bits:
-    badmask += list(np.where(qual & 2 ** (b - 1))[0])
+  bits = np.bitwise_or.reduce([2 ** (b - 1) for b in bad_bits]) if len(bad_bits) else 0
+  badmask = list(np.flatnonzero(qual & bits))
   
   # Flag >10 sigma outliers -- same thing.
-  tmpmask = np.array(list(set(np.concatenate([badmask, nanmask]))))
+  tmpmask = np.array(list(set(np.concatenate([badmask, nanmask]))), dtype = int)
   t = np.delete(time, tmpmask)
   f = np.delete(flux, tmpmask)
   f = SavGol(f)
   med = np.nanmedian(f)
   MAD = 1.4826 * np.nanmedian(np.abs(f - med))
   bad = np.where((f > med + 10. * MAD) | (f < med - 10. * MAD))[0]
-  badmask.extend([np.argmax(time == t[i]) for i in bad])
+  # Map the outliers back to the (first) matching cadence
+  if np.all(np.diff(time) >= 0):
+    badmask.extend(np.searchsorted(time, t[bad]))
+  else:
+    badmask.extend([np.argmax(time == t[i]) for i in bad])
   
   # Campaign 2 hack: the first day or two are screwed up
   if campaign == 2:
@@ -616,30 +586,30 @@ def GetData(EPIC, season = None, cadence = 'lc', clobber = False, delete_raw = F
   fpix_err = Interpolate(time, nanmask, fpix_err)
 
   # Return
-  data = DataContainer()
-  data.ID = EPIC
-  data.campaign = campaign
-  data.cadn = cadn
-  data.time = time
-  data.fpix = fpix
-  data.fpix_err = fpix_err
-  data.nanmask = nanmask
-  data.badmask = badmask
-  data.aperture = aperture
-  data.aperture_name = aperture_name
-  data.apertures = apertures
-  data.quality = qual
-  data.Xpos = pc1
-  data.Ypos = pc2
-  data.meta = fitsheader
-  data.mag = fitsheader[0]['KEPMAG'][1]
-  data.pixel_images = pixel_images
-  data.nearby = nearby
-  data.hires = hires
-  data.saturated = saturated
-  data.bkg = bkg
+  out = DataContainer()
+  out.ID = EPIC
+  out.campaign = campaign
+  out.cadn = data['cadn']
+  out.time = time
+  out.fpix = fpix
+  out.fpix_err = fpix_err
+  out.nanmask = nanmask
+  out.badmask = badmask
+  out.aperture = aperture
+  out.aperture_name = aperture_name
+  out.apertures = apertures
+  out.quality = qual
+  out.Xpos = data['pc1']
+  out.Ypos = data['pc2']
+  out.meta = fitsheader
+  out.mag = fitsheader[0]['KEPMAG'][1]
+  out.pixel_images = data['pixel_images']
+  out.nearby = data['nearby']
+  out.hires = data['hires']
+  out.saturated = saturated
+  out.bkg = bkg
     
-  return data
+  return out
 
 def GetNeighbors(EPIC, model = None, neighbors = 10, mag_range = (11., 13.), 
                  cdpp_range = None, aperture_name = 'k2sff_15', 
@@ -664,10 +634,14 @@ def GetNeighbors(EPIC, model = None, neighbors = 10, mag_range = (11., 13.),
   
   # Get the IDs
   campaign = Season(EPIC)
-  epics, kepmags, channels, short_cadence = np.array(GetK2Stars()[campaign]).T
-  short_cadence = np.array(short_cadence, dtype = bool)
-  epics = np.array(epics, dtype = int)
+  catalog = Catalog()
+  rows = catalog.select(campaign = campaign)
+  epics = catalog.epic[rows]
+  kepmags = catalog.kepmag[rows]
+  channels = catalog.channel[rows]
+  short_cadence = (catalog.sc[rows] == 1)
   c = GetNeighboringChannels(Channel(EPIC))
+  index = GetNeighborIndex(campaign)
   
   # Manage kwargs
   if aperture_name is None:
@@ -714,62 +688,37 @@ def GetNeighbors(EPIC, model = None, neighbors = 10, mag_range = (11., 13.),
       if (star == EPIC) or (star in targets):
         continue
     
-      # Ensure raw light curve file exists
-      if not os.path.exists(os.path.join(TargetDirectory(star, campaign), 'data.npz')):
-        continue
-      
-      # Ensure crowding is OK. This is quite conservative, as we
-      # need to prevent potential astrophysical false positive contamination
-      # from crowded planet-hosting neighbors when doing neighboring PLD.
-      contam = False
-      data = np.load(os.path.join(TargetDirectory(star, campaign), 'data.npz'))
-      aperture = data['apertures'][()][aperture_name]
-      fpix = data['fpix']
-      for source in data['nearby'][()]:
-        # Ignore self
-        if source['ID'] == star:
+      # Ensure the raw light curve file exists and the aperture is not
+      # contaminated. Targets whose data was saved before the neighbor
+      # index existed are added to it the first time they are vetted.
+      # The index is not told when data is deleted, so check the disk too
+      eligible = index.eligible(star, aperture_name)
+      if eligible is None:
+        if not RawDataExists(TargetDirectory(star, campaign)):
           continue
-        # Ignore really dim stars
-        if source['mag'] < kp - 5:
-          continue
-        # Compute source position
-        x = int(np.round(source['x'] - source['x0']))
-        y = int(np.round(source['y'] - source['y0']))
-        # If the source is within two pixels of the edge
-        # of the target aperture, reject the target
-        for j in [x - 2, x - 1, x, x + 1, x + 2]:
-          if j < 0:
-            # Outside the postage stamp
-            continue
-          for i in [y - 2, y - 1, y, y + 1, y + 2]:
-            if i < 0:
-              # Outside the postage stamp
-              continue
-            try:
-              if aperture[i][j]:
-                # Oh-oh!
-                contam = True
-            except IndexError:
-              # Out of bounds... carry on!
-              pass
-      if contam:
+        data = LoadRawData(TargetDirectory(star, campaign), arrays = False)
+        index.add_target(star, kp, channel, data['apertures'], data['nearby'], 
+                         data['pixel_images'][0].shape)
+        eligible = index.eligible(star, aperture_name)
+      elif eligible and not RawDataExists(TargetDirectory(star, campaign)):
         continue
-      
-      # HACK: This happens for K2SFF M67 targets in C05.
-      # Let's skip them
-      if aperture.shape != fpix.shape[1:]:
+      if not eligible:
         continue
       
       # Reject if the model is not present
       if model is not None:
-        if not os.path.exists(os.path.join(TargetDirectory(star, campaign), model + '.npz')):
+        cdpp = index.cdpp(star, model)
+        if cdpp is None:
+          if not ModelExists(TargetDirectory(star, campaign), model):
+            continue
+          cdpp = LoadModel(TargetDirectory(star, campaign), model)['cdpp'][()]
+          index.add_model(star, model, cdpp)
+        elif not ModelExists(TargetDirectory(star, campaign), model):
           continue
         
         # Reject if CDPP out of range
-        if cdpp_range is not None:
-          cdpp = np.load(os.path.join(TargetDirectory(star, campaign), model + '.npz'))['cdpp']
-          if (cdpp > cdpp_hi) or (cdpp < cdpp_lo):
-            continue
+        if (cdpp > cdpp_hi) or (cdpp < cdpp_lo):
+          continue
     
       # Passed all the tests!
       targets.append(star)
@@ -783,6 +732,41 @@ def GetNeighbors(EPIC, model = None, neighbors = 10, mag_range = (11., 13.),
   # Return what we have anyway.
   return targets
 
+def GetNeighborRegressors(EPIC, neighbors, season = None, cadence = 'lc', aperture_name = None, 
+                          saturated_aperture_name = None, max_pixels = 75, 
+                          saturation_tolerance = -0.1, **kwargs):
+  '''
+  Returns the first order *PLD* regressors of each of the :py:obj:`neighbors` of `EPIC` 
+  from the shared neighbor basis of their module (see :py:mod:`everest.missions.k2.basis`),
+  or :py:obj:`None` for the neighbors that are not in the basis.
+  
+  :param int EPIC: The EPIC ID number
+  :param list neighbors: The EPIC ID numbers of the neighbors
+  :param int season: The observing season (campaign). Default :py:obj:`None`
+  :param str cadence: The light curve cadence. Default `lc`
+  :param str aperture_name: The name of the aperture to use. Default `k2sff_15`
+  :param str saturated_aperture_name: The name of the aperture to use if the target is \
+         saturated. Default `k2sff_19`
+  :param int max_pixels: Maximum number of pixels in the TPF. Default 75
+  :param float saturation_tolerance: Target is considered saturated if flux is within \
+         this fraction of the pixel well depth. Default -0.1
+  
+  '''
+  
+  if season is None:
+    season = Season(EPIC)
+  settings = BasisSettings(cadence, aperture_name, saturated_aperture_name, 
+                           max_pixels, saturation_tolerance)
+  regressors = []
+  for neighbor in neighbors:
+    module = Module(neighbor)
+    if module is None:
+      regressors.append(None)
+      continue
+    basis = GetNeighborBasis(season, module, cadence, settings['aperture_name'])
+    regressors.append(basis.get(neighbor, settings))
+  return regressors
+
 def PlanetStatistics(model = 'nPLD', compare_to = 'everest1', **kwargs):
   '''
   Computes and plots the CDPP statistics comparison between `model` and
@@ -890,9 +874,9 @@ def ShortCadenceStatistics(campaign = None, clobber = False, model = 'nPLD', plo
           sys.stdout.flush()
           nf = os.path.join(EVEREST_DAT, 'k2', 'c%02d' % camp, 
                            ('%09d' % stars[i])[:4] + '00000', 
-                           ('%09d' % stars[i])[4:], model + '.npz')
+                           ('%09d' % stars[i])[4:])
           try:
-            data = np.load(nf)          
+            data = LoadModel(nf, model)
             print("{:>09d} {:>15.3f} {:>15.3f} {:>15.3f} {:>15d}".format(stars[i], kpmgs[i], data['cdppr'][()], data['cdpp'][()], int(data['saturated'])), file = f)
           except:
             print("{:>09d} {:>15.3f} {:>15.3f} {:>15.3f} {:>15d}".format(stars[i], kpmgs[i], np.nan, np.nan, 0), file = f)
@@ -1038,9 +1022,9 @@ def Statistics(season = None, clobber = False, model = 'nPLD', injection = False
         sys.stdout.flush()
         nf = os.path.join(EVEREST_DAT, 'k2', 'c%02d' % campaign, 
                          ('%09d' % stars[i])[:4] + '00000', 
-                         ('%09d' % stars[i])[4:], model + '.npz')
+                         ('%09d' % stars[i])[4:])
         try:
-          data = np.load(nf)
+          data = LoadModel(nf, model)
           
           # Remove NaNs and flagged cadences
           flux = np.delete(data['fraw'] - data['model'], np.array(list(set(np.concatenate([data['nanmask'], data['badmask']])))))
@@ -1305,13 +1289,13 @@ def InjectionStatistics(campaign = 0, clobber = False, model = 'nPLD', plot = Tr
           try:
             
             # Unmasked
-            data = np.load(os.path.join(path, '%s_Inject_U%g.npz' % (model, depth)))
+            data = LoadModel(path, '%s_Inject_U%g' % (model, depth))
             assert depth == data['inject'][()]['depth'], ""
             ucontrol = data['inject'][()]['rec_depth_control']
             urecovered = data['inject'][()]['rec_depth']
         
             # Masked
-            data = np.load(os.path.join(path, '%s_Inject_M%g.npz' % (model, depth)))
+            data = LoadModel(path, '%s_Inject_M%g' % (model, depth))
             assert depth == data['inject'][()]['depth'], ""
             mcontrol = data['inject'][()]['rec_depth_control']
             mrecovered = data['inject'][()]['rec_depth']
@@ -1582,7 +1566,8 @@ def GetTargetCBVs(model):
   model.XCBV = sysrem.GetCBVs(season, model = name,
                               niter = model.cbv_niter,
                               sv_win = model.cbv_win, 
-                              sv_order = model.cbv_order)
+                              sv_order = model.cbv_order,
+                              method = getattr(model, 'cbv_method', 'sysrem'))
   
 def FitCBVs(model):
   '''
@@ -1690,4 +1675,16 @@ def FitCBVs(model):
     # Finally, interpolate back to short cadence
     m = np.interp(model.time, time, m)
     
-  return m
\ No newline at end of file
+  return m
+
+def IndexModel(model):
+  '''
+  Records the CDPP of a saved de-trended model in the campaign's neighbor index,
+  so that :py:func:`GetNeighbors` does not have to load it. This is called
+  internally whenever a model is saved.
+  
+  :param model: An instance of the :py:obj:`everest` model for the target
+  
+  '''
+  
+  GetNeighborIndex(model.season).add_model(model.ID, model.name, model.cdpp)
\ No newline at end of file
@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+:py:mod:`neighbors.py` - Neighbor eligibility index
+---------------------------------------------------
+
+A per-campaign index of the properties that decide whether a target can
+be used as a neighbor in *nPLD* (see :py:func:`everest.missions.k2.GetNeighbors`):
+its channel and magnitude, whether each of its apertures is contaminated by
+a nearby source or does not match the target pixel file, and the CDPP of each
+of its de-trended models. Records are appended to a log file in the campaign
+directory as the raw data (:py:func:`everest.missions.k2.GetData`) and the
+models (:py:func:`IndexModel`) are saved, so that several processes can add
+to the index concurrently, and the log is read back incrementally. Deleted
+files are not recorded, so callers should still check that the raw data and
+models of the targets they select exist (a cheap check compared to loading them).
+
+'''
+
+from __future__ import division, print_function, absolute_import, unicode_literals
+from ...config import EVEREST_DAT
+import os
+import json
+import numpy as np
+import logging
+log = logging.getLogger(__name__)
+
+__all__ = ['Contaminated', 'NeighborIndex', 'GetNeighborIndex']
+
+def Contaminated(ID, kp, aperture, nearby):
+  '''
+  Returns :py:obj:`True` if a source in :py:obj:`nearby` no more than 5 magnitudes fainter
+  than the target is within two pixels of the edge of the target :py:obj:`aperture`.
+  This is quite conservative, as we need to prevent potential astrophysical false
+  positive contamination from crowded planet-hosting neighbors when doing neighboring PLD.
+
+  :param int ID: The target ID
+  :param float kp: The *Kepler* magnitude of the target
+  :param ndarray aperture: The target aperture
+  :param list nearby: The list of nearby sources (see :py:func:`everest.missions.k2.aux.GetSources`)
+
+  '''
+
+  for source in nearby:
+    # Ignore self
+    if source['ID'] == ID:
+      continue
+    # Ignore really dim stars
+    if source['mag'] < kp - 5:
+      continue
+    # Compute source position
+    x = int(np.round(source['x'] - source['x0']))
+    y = int(np.round(source['y'] - source['y0']))
+    # If the source is within two pixels of the edge
+    # of the target aperture, reject the target
+    for j in [x - 2, x - 1, x, x + 1, x + 2]:
+      if j < 0:
+        # Outside the postage stamp
+        continue
+      for i in [y - 2, y - 1, y, y + 1, y + 2]:
+        if i < 0:
+          # Outside the postage stamp
+          continue
+        try:
+          if aperture[i][j]:
+            # Oh-oh!
+            return True
+        except IndexError:
+          # Out of bounds... carry on!
+          pass
+  return False
+
+class NeighborIndex(object):
+  '''
+  The neighbor eligibility index for a `K2` campaign. Use :py:func:`GetNeighborIndex`
+  to get the up-to-date shared instance for a campaign.
+
+  :param int campaign: The `K2` campaign number
+
+  '''
+
+  def __init__(self, campaign):
+    '''
+
+    '''
+
+    self.campaign = int(campaign)
+    self.file = os.path.join(EVEREST_DAT, 'k2', 'c%02d' % self.campaign, 'neighbors.log')
+    self.targets = {}
+    self._offset = 0
+    self.refresh()
+
+  def __contains__(self, EPIC):
+    '''
+
+    '''
+
+    return EPIC in self.targets
+
+  def refresh(self):
+    '''
+    Reads the records appended to the log since the last call.
+
+    '''
+
+    if not os.path.exists(self.file):
+      return
+    with open(self.file, 'r') as f:
+      f.seek(self._offset)
+      while True:
+        line = f.readline()
+        # Ignore partially written records
+        if not line.endswith('\n'):
+          break
+        self._offset = f.tell()
+        try:
+          self._apply(json.loads(line))
+        except ValueError:
+          log.warn('Skipping corrupt record in the neighbor index.')
+
+  def _apply(self, record):
+    '''
+    Updates the in-memory index with a record.
+
+    '''
+
+    EPIC = record['epic']
+    if 'model' in record:
+      self.targets.setdefault(EPIC, {'models': {}})['models'][record['model']] = record['cdpp']
+    else:
+      models = self.targets.get(EPIC, {}).get('models', {})
+      self.targets[EPIC] = dict(record, models = models)
+
+  def _append(self, record):
+    '''
+    Appends a record to the log in a single write and applies it.
+
+    '''
+
+    if not os.path.exists(os.path.dirname(self.file)):
+      os.makedirs(os.path.dirname(self.file))
+    with open(self.file, 'a') as f:
+      f.write(json.dumps(record) + '\n')
+    self._apply(record)
+
+  def add_target(self, EPIC, kp, channel, apertures, nearby, shape):
+    '''
+    Records the eligibility of each of the target's :py:obj:`apertures`.
+
+    :param int EPIC: The EPIC number of the target
+    :param float kp: The *Kepler* magnitude of the target
+    :param int channel: The channel number of the target
+    :param dict apertures: The target apertures
+    :param list nearby: The list of nearby sources
+    :param tuple shape: The shape of the target pixel file images
+
+    '''
+
+    contam = {}
+    match = {}
+    for name, aperture in apertures.items():
+      if aperture is None:
+        continue
+      contam[name] = bool(Contaminated(EPIC, kp, aperture, nearby))
+      match[name] = (tuple(np.shape(aperture)) == tuple(shape))
+    self._append({'epic': int(EPIC), 'kp': float(kp), 'channel': int(channel),
+                  'contam': contam, 'match': match})
+
+  def add_model(self, EPIC, model, cdpp):
+    '''
+    Records the CDPP of the de-trended :py:obj:`model` of a target.
+
+    '''
+
+    self._append({'epic': int(EPIC), 'model': model, 'cdpp': float(cdpp)})
+
+  def eligible(self, EPIC, aperture_name):
+    '''
+    Returns :py:obj:`True` if aperture :py:obj:`aperture_name` of target :py:obj:`EPIC`
+    is uncontaminated and matches the target pixel file, :py:obj:`False` if not, and
+    :py:obj:`None` if the raw data for the target has not been indexed.
+
+    '''
+
+    target = self.targets.get(EPIC, {})
+    if 'contam' not in target:
+      return None
+    if aperture_name not in target['contam']:
+      return False
+    return (not target['contam'][aperture_name]) and target['match'][aperture_name]
+
+  def cdpp(self, EPIC, model):
+    '''
+    Returns the CDPP of the de-trended :py:obj:`model` of target :py:obj:`EPIC`,
+    or :py:obj:`None` if the model has not been indexed.
+
+    '''
+
+    return self.targets.get(EPIC, {}).get('models', {}).get(model, None)
+
+_indices = {}
+
+def GetNeighborIndex(campaign):
+  '''
+  Returns the :py:class:`NeighborIndex` for a campaign, updated with any records
+  added by other processes since the last call.
+
+  '''
+
+  campaign = int(campaign)
+  if campaign not in _indices:
+    _indices[campaign] = NeighborIndex(campaign)
+  else:
+    _indices[campaign].refresh()
+  return _indices[campaign]
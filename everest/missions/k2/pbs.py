@@ -10,8 +10,12 @@ Routines for submitting batch jobs to a cluster.
 
 from __future__ import division, print_function, absolute_import, unicode_literals
 from .aux import *
-from .k2 import GetData, FITSFile
+from .k2 import GetData, FITSFile, TargetDirectory
+from .basis import BuildNeighborBasis
+from .rawdata import RawDataExists
 from ...config import EVEREST_SRC, EVEREST_DAT, EVEREST_DEV
+from ...pack import Exists, ListDir, Remove
+from ...store import ModelExists
 from ...utils import ExceptionHook, FunctionWrapper
 from ...pool import Pool
 import os, sys, subprocess
@@ -83,9 +87,8 @@ def _Download(campaign, subcampaign):
   # Download the TPF data for each one
   for i, EPIC in enumerate(stars):
     print("Downloading data for EPIC %d (%d/%d)..." % (EPIC, i + 1, nstars))
-    if not os.path.exists(os.path.join(EVEREST_DAT, 'k2', 'c%02d' % int(campaign), 
-                         ('%09d' % EPIC)[:4] + '00000', ('%09d' % EPIC)[4:],
-                         'data.npz')):
+    if not RawDataExists(os.path.join(EVEREST_DAT, 'k2', 'c%02d' % int(campaign), 
+                         ('%09d' % EPIC)[:4] + '00000', ('%09d' % EPIC)[4:])):
       try:
         GetData(EPIC, download_only = True)
       except KeyboardInterrupt:
@@ -206,6 +209,11 @@ def _Run(campaign, subcampaign, epic, strkwargs):
         campaign = campaign + 0.1 * subcampaign
       # Get all the stars
       stars = GetK2Campaign(campaign, epics_only = True, cadence = cadence)
+      # Precompute the neighbor regressors shared by all the nPLD runs
+      if (kwargs.get('model', 'nPLD') == 'nPLD') and (kwargs.get('parent_model', None) is None) \
+         and (kwargs.get('aperture', None) != 'custom') and (kwargs.get('saturated_aperture', None) != 'custom'):
+        modules = [module for module in range(2, 25) if Channels(module) is not None]
+        pool.map(FunctionWrapper(_BuildNeighborBasis, int(campaign), cadence, kwargs), modules)
       # Run
       pool.map(m, stars)
   
@@ -213,6 +221,19 @@ def _Run(campaign, subcampaign, epic, strkwargs):
     
     m(epic)
 
+def _BuildNeighborBasis(module, campaign, cadence, kwargs):
+  '''
+  Builds the neighbor basis store for a module with the model settings in :py:obj:`kwargs`.
+  
+  '''
+  
+  BuildNeighborBasis(campaign, module, cadence = cadence, 
+                     aperture_name = kwargs.get('aperture', None),
+                     saturated_aperture_name = kwargs.get('saturated_aperture', None),
+                     max_pixels = kwargs.get('max_pixels', 75),
+                     saturation_tolerance = kwargs.get('saturation_tolerance', -0.1))
+  return True
+
 def Publish(campaign = 0, EPIC = None, nodes = 5, ppn = 12, walltime = 100, 
             mpn = None, email = None, queue = None, **kwargs):
   '''
@@ -319,6 +340,58 @@ def _Publish(campaign, subcampaign, strkwargs):
     # Run
     pool.map(m, stars)
 
+def RenderDVS(campaign = 0, EPIC = None, model = 'nPLD', cadence = 'lc', clobber = False, pool = 'AnyPool'):
+  '''
+  Renders the DVS figures of the models saved by headless runs (see the :py:obj:`headless`
+  option of :py:class:`everest.detrender.Detrender`) in parallel. Targets without a saved
+  model and targets whose DVS already exists are skipped. :py:func:`Publish` renders the
+  DVS of the targets it publishes, so this is only needed to inspect the de-trending
+  before publication.
+  
+  :param campaign: The K2 campaign number. If this is an :py:class:`int`, renders \
+                   all targets in that campaign. If a :py:class:`float` in the form \
+                   `X.Y`, renders the `Y^th` decile of campaign `X`.
+  :param EPIC: A target or a list of targets to render. Default :py:obj:`None` (all targets)
+  :param str model: The name of the model. Default `nPLD`
+  :param str cadence: Long (:py:obj:`lc`) or short (:py:obj:`sc`) cadence? Default :py:obj:`lc`
+  :param bool clobber: Overwrite existing figures? Default :py:obj:`False`
+  :param str pool: The :py:func:`everest.pool.Pool` to use. Default `AnyPool`
+    
+  '''
+  
+  if EPIC is None:
+    stars = GetK2Campaign(campaign, epics_only = True, cadence = cadence)
+  else:
+    stars = [int(star) for star in np.atleast_1d(EPIC)]
+  m = FunctionWrapper(_RenderDVS, int(campaign), model = model, cadence = cadence, clobber = clobber)
+  with Pool(pool) as p:
+    p.map(m, stars)
+
+def _RenderDVS(EPIC, campaign, model = 'nPLD', cadence = 'lc', clobber = False):
+  '''
+  Renders the DVS of a single target.
+  
+  '''
+  
+  from ... import detrender
+  
+  name = model if cadence == 'lc' else '%s.sc' % model
+  path = TargetDirectory(EPIC, campaign)
+  if not ModelExists(path, name):
+    return False
+  if (not clobber) and Exists(os.path.join(path, name + '.pdf')):
+    return True
+  try:
+    m = getattr(detrender, model)(EPIC, season = campaign, cadence = cadence, 
+                                  is_parent = True, headless = True)
+    m.plot_dvs(clobber = clobber)
+  except:
+    log.error('Unable to render the DVS for EPIC %d.' % EPIC)
+    for line in traceback.format_exception_only(*sys.exc_info()[:2]):
+      log.error(line.replace('\n', ''))
+    return False
+  return True
+
 def Status(season = range(18), model = 'nPLD', purge = False, injection = False, cadence = 'lc', **kwargs):
   '''
   Shows the progress of the de-trending runs for the specified campaign(s).
@@ -359,23 +432,26 @@ def Status(season = range(18), model = 'nPLD', purge = False, injection = False,
     bad = []
     remain = []
     total = len(stars)
-    if os.path.exists(os.path.join(EVEREST_DAT, 'k2', 'c%02d' % c)):
+    if Exists(os.path.join(EVEREST_DAT, 'k2', 'c%02d' % c)):
       path = os.path.join(EVEREST_DAT, 'k2', 'c%02d' % c)
-      for folder in [f for f in os.listdir(path) if f.endswith('00000')]:
-        for subfolder in os.listdir(os.path.join(path, folder)):
+      for folder in [f for f in ListDir(path) if f.endswith('00000')]:
+        for subfolder in ListDir(os.path.join(path, folder)):
           ID = int(folder[:4] + subfolder)
           if ID in stars:
-            if os.path.exists(os.path.join(EVEREST_DAT, 'k2', 'c%02d' % c, folder, subfolder, 'data.npz')):
+            # List the target directory once rather than checking each file
+            files = ListDir(os.path.join(path, folder, subfolder))
+            if ('data.npz' in files) or ('data' in files and 
+               Exists(os.path.join(path, folder, subfolder, 'data', 'meta.pickle'))):
               down += 1
-            if os.path.exists(os.path.join(EVEREST_DAT, 'k2', 'c%02d' % c, folder, subfolder, FITSFile(ID, c, cadence = cadence))):
+            if FITSFile(ID, c, cadence = cadence) in files:
               fits += 1
-            if os.path.exists(os.path.join(EVEREST_DAT, 'k2', 'c%02d' % c, folder, subfolder, model + '.npz')):
+            if (model + '.npz' in files) or (model + '.model' in files):
               proc += 1
-            elif os.path.exists(os.path.join(EVEREST_DAT, 'k2', 'c%02d' % c, folder, subfolder, model + '.err')):
+            elif model + '.err' in files:
               err += 1
               bad.append(folder[:4] + subfolder)
               if purge:
-                os.remove(os.path.join(EVEREST_DAT, 'k2', 'c%02d' % c, folder, subfolder, model + '.err'))
+                Remove(os.path.join(path, folder, subfolder, model + '.err'))
             else:
               remain.append(folder[:4] + subfolder)
     if proc == total:
@@ -440,16 +516,18 @@ def InjectionStatus(campaign = range(18), model = 'nPLD', purge = False,
     done = [[0 for d in depths], [0 for d in depths]]
     err = [[0 for d in depths], [0 for d in depths]]
     total = len(stars)
-    if os.path.exists(os.path.join(EVEREST_DAT, 'k2', 'c%02d' % c)):
+    if Exists(os.path.join(EVEREST_DAT, 'k2', 'c%02d' % c)):
       path = os.path.join(EVEREST_DAT, 'k2', 'c%02d' % c)
-      for folder in os.listdir(path):
-        for subfolder in os.listdir(os.path.join(path, folder)):
+      for folder in [f for f in ListDir(path) if f.endswith('00000')]:
+        for subfolder in ListDir(os.path.join(path, folder)):
           ID = int(folder[:4] + subfolder)
+          files = ListDir(os.path.join(path, folder, subfolder))
           for m, mask in enumerate(['U', 'M']):
             for d, depth in enumerate(depths):
-              if os.path.exists(os.path.join(EVEREST_DAT, 'k2', 'c%02d' % c, folder, subfolder, '%s_Inject_%s%g.npz' % (model, mask, depth))):
+              name = '%s_Inject_%s%g' % (model, mask, depth)
+              if (name + '.npz' in files) or (name + '.model' in files):
                 done[m][d] += 1
-              elif os.path.exists(os.path.join(EVEREST_DAT, 'k2', 'c%02d' % c, folder, subfolder, '%s_Inject_%s%g.err' % (model, mask, depth))):
+              elif '%s_Inject_%s%g.err' % (model, mask, depth) in files:
                 err[m][d] += 1
     for d, depth in enumerate(depths):
       for m, mask in enumerate(['F', 'T']):
@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+:py:mod:`rawdata.py` - Raw data storage
+---------------------------------------
+
+The on-disk layout of the raw target data written by :py:func:`everest.missions.k2.GetData`.
+Each target directory contains a `data` folder with one uncompressed `.npy` file per
+array and cadence (e.g., `lc_fpix.npy` and `sc_fpix.npy`), so that a long cadence run
+never reads the short cadence arrays and the pixel fluxes can be memory-mapped, and a
+small `meta.pickle` sidecar with the apertures, nearby sources, images and FITS headers.
+The pixel fluxes may optionally be stored in single precision; they are always returned
+in double precision. Targets saved in the original single compressed `data.npz` file
+are still read, and can be converted with :py:func:`MigrateRawData`. Both layouts
+are also read from season pack files (see :py:mod:`everest.pack`).
+
+'''
+
+from __future__ import division, print_function, absolute_import, unicode_literals
+from ...config import EVEREST_DAT
+from ...pack import Exists, Open, Load, Remove
+import os
+import shutil
+import pickle
+import tempfile
+import numpy as np
+import logging
+log = logging.getLogger(__name__)
+
+__all__ = ['RawDataExists', 'SaveRawData', 'LoadRawData', 'MigrateRawData']
+
+#: The current version of the raw data layout
+RAWDATA_VERSION = 1
+
+#: The per-cadence arrays
+ARRAYS = ('cadn', 'time', 'fpix', 'fpix_err', 'qual', 'pc1', 'pc2')
+
+#: The metadata stored in the sidecar
+META = ('apertures', 'pixel_images', 'nearby', 'hires', 'fitsheader', 'sc_fitsheader')
+
+def RawDataExists(path):
+  '''
+  Returns :py:obj:`True` if the raw data for the target in directory :py:obj:`path`
+  exists in either layout.
+
+  '''
+
+  return Exists(os.path.join(path, 'data', 'meta.pickle')) or \
+         Exists(os.path.join(path, 'data.npz'))
+
+def SaveRawData(path, data, float32 = False):
+  '''
+  Atomically saves the raw target data to the directory :py:obj:`path`, replacing
+  any existing data.
+
+  :param str path: The target directory
+  :param dict data: The arrays in :py:obj:`ARRAYS` for the long cadence data, the same \
+         arrays prefixed by `sc_` for the short cadence data, and the metadata in :py:obj:`META`. \
+         Arrays that are :py:obj:`None` are not saved
+  :param bool float32: Store the pixel fluxes and their errors in single precision? \
+         Default :py:obj:`False`
+
+  '''
+
+  if not os.path.exists(path):
+    os.makedirs(path)
+  tmp = tempfile.mkdtemp(dir = path, prefix = '.data')
+  try:
+    for prefix in ['', 'sc_']:
+      for key in ARRAYS:
+        x = data.get(prefix + key, None)
+        if x is None:
+          continue
+        x = np.asarray(x)
+        if float32 and key in ['fpix', 'fpix_err']:
+          x = x.astype('float32')
+        np.save(os.path.join(tmp, '%s_%s.npy' % (prefix[:-1] or 'lc', key)), x)
+    meta = dict([(key, data.get(key, None)) for key in META])
+    meta['version'] = RAWDATA_VERSION
+    with open(os.path.join(tmp, 'meta.pickle'), 'wb') as f:
+      pickle.dump(meta, f, protocol = 2)
+      f.flush()
+      os.fsync(f.fileno())
+  except:
+    shutil.rmtree(tmp, ignore_errors = True)
+    raise
+
+  # Discard any packed copy of the data
+  Remove(os.path.join(path, 'data'))
+
+  # Swap the directories
+  if os.path.exists(os.path.join(path, 'data')):
+    old = tempfile.mkdtemp(dir = path, prefix = '.data')
+    os.rename(os.path.join(path, 'data'), os.path.join(old, 'data'))
+    os.rename(tmp, os.path.join(path, 'data'))
+    shutil.rmtree(old, ignore_errors = True)
+  else:
+    os.rename(tmp, os.path.join(path, 'data'))
+
+def LoadRawData(path, cadence = 'lc', arrays = True):
+  '''
+  Loads the raw target data from the directory :py:obj:`path`. Returns a :py:obj:`dict`
+  with the metadata in :py:obj:`META` and the arrays in :py:obj:`ARRAYS` for the
+  requested :py:obj:`cadence` (without the `sc_` prefix). Pixel fluxes stored in
+  double precision are returned as read-only memory maps.
+
+  :param str path: The target directory
+  :param str cadence: The light curve cadence. Default `lc`
+  :param bool arrays: Load the arrays? If :py:obj:`False`, returns only the metadata. \
+         Default :py:obj:`True`
+
+  '''
+
+  if cadence not in ['lc', 'sc']:
+    raise ValueError("Invalid value for the cadence.")
+  folder = os.path.join(path, 'data')
+
+  # The original layout
+  if not Exists(os.path.join(folder, 'meta.pickle')):
+    data = Load(os.path.join(path, 'data.npz'), allow_pickle = True)
+    res = {}
+    for key in META:
+      res[key] = data[key][()]
+    if arrays:
+      prefix = 'sc_' if cadence == 'sc' else ''
+      for key in ARRAYS:
+        res[key] = data[prefix + key][()]
+    return res
+
+  with Open(os.path.join(folder, 'meta.pickle')) as f:
+    res = pickle.load(f)
+  if res.pop('version') > RAWDATA_VERSION:
+    raise Exception('Raw data in %s was saved with a newer version of EVEREST.' % path)
+  if arrays:
+    for key in ARRAYS:
+      file = os.path.join(folder, '%s_%s.npy' % (cadence, key))
+      if not Exists(file):
+        res[key] = None
+      elif key in ['fpix', 'fpix_err']:
+        x = Load(file, mmap_mode = 'r')
+        res[key] = x if x.dtype == np.float64 else np.array(x, dtype = 'float64')
+      else:
+        res[key] = Load(file)
+  return res
+
+def MigrateRawData(campaign = None, float32 = False, remove = True):
+  '''
+  Converts the raw data of all targets saved in the original `data.npz`
+  layout to the current layout.
+
+  :param campaign: The campaign number or a list of campaign numbers. Default \
+         :py:obj:`None` (all campaigns)
+  :param bool float32: Store the pixel fluxes and their errors in single precision? \
+         Default :py:obj:`False`
+  :param bool remove: Delete the `data.npz` files after converting them? Default :py:obj:`True`
+
+  :returns: The number of targets converted
+
+  '''
+
+  root = os.path.join(EVEREST_DAT, 'k2')
+  if campaign is None:
+    folders = [os.path.join(root, c) for c in sorted(os.listdir(root)) if c.startswith('c') and c[1:].isdigit()]
+  else:
+    folders = [os.path.join(root, 'c%02d' % int(c)) for c in np.atleast_1d(campaign)]
+
+  n = 0
+  for folder in folders:
+    for path, _, files in os.walk(folder):
+      if 'data.npz' not in files:
+        continue
+      log.info('Converting %s...' % path)
+      try:
+        data = np.load(os.path.join(path, 'data.npz'), allow_pickle = True)
+        SaveRawData(path, dict([(key, data[key][()]) for key in data.keys()]), float32 = float32)
+      except KeyboardInterrupt:
+        raise
+      except Exception as e:
+        log.error('Unable to convert %s: %s' % (path, e))
+        continue
+      if remove:
+        os.remove(os.path.join(path, 'data.npz'))
+      n += 1
+  return n
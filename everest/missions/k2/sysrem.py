@@ -5,16 +5,20 @@
 ----------------------------------
 
 Routines for computing the co-trending basis vectors (CBVs)
-for each `K2` campaign using the :py:obj:`SysRem` algorithm.
+for each `K2` campaign using the :py:obj:`SysRem` algorithm
+or a randomized singular value decomposition.
 
 '''
 
 from __future__ import division, print_function, absolute_import, unicode_literals
 from ...config import EVEREST_DAT
-from ...utils import InitLog
+from ...store import ModelExists, LoadModel
+from ...utils import InitLog, FunctionWrapper
+from ...pool import ChunkPool
 from .aux import GetK2Campaign, Campaign, Channels
 import os
 import numpy as np
+from timeit import default_timer
 import matplotlib.pyplot as pl
 import george
 from george.kernels import Matern32Kernel, WhiteKernel
@@ -51,10 +55,10 @@ def GetStars(campaign, module, model = 'nPLD', **kwargs):
   # Get the EPIC numbers
   all = GetK2Campaign(campaign)
   stars = np.array([s[0] for s in all if s[2] in channels and 
-          os.path.exists(
+          ModelExists(
           os.path.join(EVEREST_DAT, 'k2', 'c%02d' % int(campaign),
           ('%09d' % s[0])[:4] + '00000', 
-          ('%09d' % s[0])[4:], model + '.npz'))], dtype = int)
+          ('%09d' % s[0])[4:]), model)], dtype = int)
   N = len(stars)
   assert N > 0, "No light curves found for campaign %d, module %d." % (campaign, module)
 
@@ -65,13 +69,13 @@ def GetStars(campaign, module, model = 'nPLD', **kwargs):
   
   for n in range(N):
 
-    # De-trended light curve file name
+    # De-trended light curve directory
     nf = os.path.join(EVEREST_DAT, 'k2', 'c%02d' % int(campaign),
                    ('%09d' % stars[n])[:4] + '00000', 
-                   ('%09d' % stars[n])[4:], model + '.npz')
+                   ('%09d' % stars[n])[4:])
     
     # Get the data
-    data = np.load(nf)
+    data = LoadModel(nf, model)
     t = data['time']
     if n == 0:
       time = t
@@ -97,9 +101,11 @@ def GetStars(campaign, module, model = 'nPLD', **kwargs):
     
   return time, breakpoints, np.array(fluxes), np.array(errors), np.array(kpars)
 
-def SysRem(time, flux, err, ncbv = 5, niter = 50, sv_win = 999, sv_order = 3, **kwargs):
+def SysRem(time, flux, err, ncbv = 5, niter = 50, sv_win = 999, sv_order = 3, inds = slice(None), block = None, **kwargs):
   '''
-  Applies :py:obj:`SysRem` to a given set of light curves.
+  Applies :py:obj:`SysRem` to a given set of light curves. The weighted sums over
+  the light curves are accumulated in blocks of :py:obj:`block` rows, so :py:obj:`flux`
+  and :py:obj:`err` may be memory-mapped arrays larger than the available memory.
   
   :param array_like time: The time array for all of the light curves
   :param array_like flux: A 2D array of the fluxes for each of the light curves, shape `(nfluxes, ntime)`
@@ -108,40 +114,69 @@ def SysRem(time, flux, err, ncbv = 5, niter = 50, sv_win = 999, sv_order = 3, **
   :param int niter: The number of :py:obj:`SysRem` iterations to perform. Default 50
   :param int sv_win: The Savitsky-Golay filter window size. Default 999
   :param int sv_order: The Savitsky-Golay filter order. Default 3
+  :param slice inds: The columns of :py:obj:`flux` and :py:obj:`err` corresponding to \
+                     :py:obj:`time`. Default all columns
+  :param int block: The number of light curves processed at a time. Default all
    
   '''
   
-  nflx, tlen = flux.shape
+  nflx = flux.shape[0]
+  tlen = len(time)
+  if block is None:
+    block = nflx
+  blocks = [slice(i, min(i + block, nflx)) for i in range(0, nflx, block)]
   
-  # Get normalized fluxes
-  med = np.nanmedian(flux, axis = 1).reshape(-1, 1)
-  y = flux - med
+  # Get the median of each of the fluxes
+  med = np.zeros(nflx)
+  for s in blocks:
+    med[s] = np.nanmedian(flux[s, inds], axis = 1)
   
-  # Compute the inverse of the variances
-  invvar = 1. / err ** 2
+  # The weights and regressors of the components removed so far
+  C = np.zeros((nflx, ncbv))
+  A = np.zeros((ncbv, tlen))
     
   # The CBVs for this set of fluxes
   cbvs = np.zeros((ncbv, tlen))
-
+  
+  def Block(s, n):
+    '''
+    Returns the inverse variances and the weighted residual fluxes
+    after removing the first `n` components for the rows `s`.
+    
+    '''
+    
+    invvar = 1. / np.array(err[s, inds]) ** 2
+    y = flux[s, inds] - med[s].reshape(-1, 1) - np.dot(C[s,:n], A[:n])
+    return invvar, y * invvar
+  
   # Recover `ncbv` components
   for n in range(ncbv):
     
-    # Initialize the weights and regressors
-    c = np.zeros(nflx)
+    # Initialize the regressors
     a = np.ones(tlen)
-    f = y * invvar
+    if len(blocks) == 1:
+      cached = Block(blocks[0], n)
     
     # Perform `niter` iterations
     for i in range(niter):
+      
+      num = np.zeros(tlen)
+      den = np.zeros(tlen)
+      for s in blocks:
+        invvar, f = cached if len(blocks) == 1 else Block(s, n)
+        
+        # Compute the `c` vector (the weights)
+        c = np.dot(f, a) / np.dot(invvar, a ** 2)
+        C[s,n] = c
+        
+        # Accumulate the sums for the `a` vector (the regressors)
+        num += np.dot(c, f)
+        den += np.dot(c ** 2, invvar)
+      
+      a = num / den
     
-      # Compute the `c` vector (the weights)
-      c = np.dot(f, a) / np.dot(invvar, a ** 2)
-
-      # Compute the `a` vector (the regressors)
-      a = np.dot(c, f) / np.dot(c ** 2, invvar)
-  
     # Remove this component from all light curves
-    y -= np.outer(c, a)
+    A[n] = a
     
     # Save this regressor after smoothing it a bit
     if sv_win >= len(a):
@@ -152,16 +187,125 @@ def SysRem(time, flux, err, ncbv = 5, niter = 50, sv_win = 999, sv_order = 3, **
     
   return cbvs
 
-def GetCBVs(campaign, model = 'nPLD', clobber = False, **kwargs):
+def RandomizedSVD(time, flux, err, ncbv = 5, npower = 2, oversample = 10, sv_win = 999, sv_order = 3, 
+                  inds = slice(None), block = None, seed = 42, **kwargs):
+  '''
+  An alternative to :py:func:`SysRem` that recovers all :py:obj:`ncbv` signals at once
+  from a randomized singular value decomposition of the light curves whitened by their
+  errors. The errors are assumed to be approximately separable into a per-star and a
+  per-cadence factor, in which case the leading right singular vectors rescaled by
+  the per-cadence factor are the weighted least-squares signals. The data is read
+  :py:obj:`npower` + 1 times, in blocks of :py:obj:`block` rows.
+  
+  :param array_like time: The time array for all of the light curves
+  :param array_like flux: A 2D array of the fluxes for each of the light curves, shape `(nfluxes, ntime)`
+  :param array_like err: A 2D array of the flux errors for each of the light curves, shape `(nfluxes, ntime)`
+  :param int ncbv: The number of signals to recover. Default 5
+  :param int npower: The number of power iterations (at least one). Default 2
+  :param int oversample: The number of additional random vectors. Default 10
+  :param int sv_win: The Savitsky-Golay filter window size. Default 999
+  :param int sv_order: The Savitsky-Golay filter order. Default 3
+  :param slice inds: The columns of :py:obj:`flux` and :py:obj:`err` corresponding to \
+                     :py:obj:`time`. Default all columns
+  :param int block: The number of light curves processed at a time. Default all
+  :param int seed: The random number generator seed. Default 42
+  
+  '''
+  
+  nflx = flux.shape[0]
+  tlen = len(time)
+  if block is None:
+    block = nflx
+  blocks = [slice(i, min(i + block, nflx)) for i in range(0, nflx, block)]
+  med = np.zeros(nflx)
+  sumiv = np.zeros(tlen)
+  
+  def Product(M, first = False):
+    '''
+    Returns :math:`\\mathbf{Z}^\\top \\mathbf{Z} \\mathbf{M}`, where :math:`\\mathbf{Z}`
+    are the whitened fluxes, computing the medians and the per-cadence
+    weights on the first pass.
+    
+    '''
+    
+    res = np.zeros_like(M)
+    for s in blocks:
+      e = np.array(err[s, inds])
+      if first:
+        med[s] = np.nanmedian(flux[s, inds], axis = 1)
+        sumiv[:] += np.sum(1. / e ** 2, axis = 0)
+      Z = (flux[s, inds] - med[s].reshape(-1, 1)) / e
+      res += np.dot(Z.T, np.dot(Z, M))
+    return res
+  
+  # The randomized range finder with power iterations
+  Y = Product(np.random.RandomState(seed).randn(tlen, ncbv + oversample), first = True)
+  for i in range(max(1, npower)):
+    Q, _ = np.linalg.qr(Y)
+    Y = Product(Q)
+  
+  # The right singular vectors from the projected Gram matrix
+  w, W = np.linalg.eigh(np.dot(Q.T, Y))
+  V = np.dot(Q, W[:,::-1][:,:ncbv])
+  
+  # Un-whiten and smooth the signals
+  cbvs = np.zeros((ncbv, tlen))
+  if sv_win >= tlen:
+    sv_win = tlen - 1
+    if sv_win % 2 == 0:
+      sv_win -= 1
+  for n in range(ncbv):
+    a = V[:,n] / np.sqrt(sumiv)
+    a *= np.sqrt(tlen) / np.sqrt(np.sum(a ** 2))
+    cbvs[n] = savgol_filter(a - np.nanmedian(a), sv_win, sv_order)
+  
+  return cbvs
+
+def _GetModule(module, campaign, path, model = 'nPLD', clobber = False, **kwargs):
+  '''
+  Saves the light curves of all stars on a given module to disk. Returns the
+  number of stars, or :py:obj:`None` if there are no light curves for this module.
+  
   '''
-  Computes the CBVs for a given campaign.
+  
+  lcfile = os.path.join(path, '%d.npz' % module)
+  if clobber or not os.path.exists(lcfile):
+    try:
+      time, breakpoints, fluxes, errors, kpars = GetStars(campaign, module, model = model, **kwargs)
+    except AssertionError:
+      return None
+    np.savez(lcfile, time = time, breakpoints = breakpoints, fluxes = fluxes, errors = errors, kpars = kpars)
+    return len(fluxes)
+  else:
+    return len(np.load(lcfile)['kpars'])
+
+def GetCBVs(campaign, model = 'nPLD', clobber = False, method = 'sysrem', pool = 'thread', workers = None, memory = 1., **kwargs):
+  '''
+  Computes the CBVs for a given campaign. The light curves of each module are
+  collected in parallel and copied into a single memory-mapped array, on which
+  :py:func:`SysRem` (or :py:func:`RandomizedSVD`) operates in blocks of stars that
+  fit within :py:obj:`memory`.
   
   :param int campaign: The campaign number
   :param str model: The name of the :py:obj:`everest` model. Default `nPLD`
   :param bool clobber: Overwrite existing files? Default `False`
+  :param str method: The CBV extraction method, `sysrem` (:py:func:`SysRem`) or `svd` \
+                     (:py:func:`RandomizedSVD`). Default `sysrem`
+  :param str pool: The :py:class:`everest.pool.ChunkPool` used to collect the light curves. Default `thread`
+  :param int workers: The number of modules collected at a time. Default :py:obj:`None`, i.e., the number of CPUs
+  :param float memory: The memory budget in GB for the blocks of light curves. Default `1`
   
   '''
   
+  if method == 'sysrem':
+    Extract = SysRem
+    suffix = ''
+  elif method == 'svd':
+    Extract = RandomizedSVD
+    suffix = '_svd'
+  else:
+    raise ValueError('Invalid CBV method ``%s``.' % method)
+  
   # Initialize logging?
   if len(logging.getLogger().handlers) == 0:
     InitLog(file_name = None, screen_level = logging.DEBUG)
@@ -173,55 +317,56 @@ def GetCBVs(campaign, model = 'nPLD', clobber = False, **kwargs):
     os.makedirs(path)
   
   # Get the design matrix
-  xfile = os.path.join(path, 'X.npz')
+  xfile = os.path.join(path, 'X%s.npz' % suffix)
   if clobber or not os.path.exists(xfile):
     
+    # Get the light curves
     log.info('Obtaining light curves...')
-    time = None
-    for module in range(2,25):
-      
-      # Get the light curves
-      lcfile = os.path.join(path, '%d.npz' % module)
-      if clobber or not os.path.exists(lcfile):
-        try:
-          time, breakpoints, fluxes, errors, kpars = GetStars(campaign, module, model = model, **kwargs)
-        except AssertionError:
-          continue
-        np.savez(lcfile, time = time, breakpoints = breakpoints, fluxes = fluxes, errors = errors, kpars = kpars)
-      
-      # Load the light curves
-      lcs = np.load(lcfile)
-      if time is None:
+    modules = list(range(2,25))
+    nstars = ChunkPool(pool, workers).map(FunctionWrapper(_GetModule, campaign, path, model = model, 
+                                          clobber = clobber, **kwargs), modules)
+    modules = [module for module, n in zip(modules, nstars) if n is not None]
+    nstars = [n for n in nstars if n is not None]
+    assert len(modules), "No light curves found for campaign %d." % campaign
+    
+    # Copy them into a single array on disk, adding the 
+    # white GP component to the errors
+    ffile = os.path.join(path, 'fluxes.npy')
+    efile = os.path.join(path, 'errors.npy')
+    for i, module in enumerate(modules):
+      lcs = np.load(os.path.join(path, '%d.npz' % module))
+      if i == 0:
         time = lcs['time']
         breakpoints = lcs['breakpoints']
-        fluxes = lcs['fluxes']
-        errors = lcs['errors']
-        kpars = lcs['kpars']
-      else:
-        fluxes = np.vstack([fluxes, lcs['fluxes']])
-        errors = np.vstack([errors, lcs['errors']])
-        kpars = np.vstack([kpars, lcs['kpars']])
+        fluxes = np.lib.format.open_memmap(ffile, mode = 'w+', shape = (sum(nstars), len(time)))
+        errors = np.lib.format.open_memmap(efile, mode = 'w+', shape = (sum(nstars), len(time)))
+        row = 0
+      fluxes[row:row + nstars[i]] = lcs['fluxes']
+      errors[row:row + nstars[i]] = np.sqrt(lcs['errors'] ** 2 + lcs['kpars'][:,:1] ** 2)
+      row += nstars[i]
+    fluxes.flush()
+    errors.flush()
     
     # Compute the design matrix  
-    log.info('Running SysRem...')
+    log.info('Running %s...' % Extract.__name__)
     X = np.ones((len(time), 1 + kwargs.get('ncbv', 5)))
+    block = max(1, int(memory * 1024 ** 3 / (32 * len(time))))
     
     # Loop over the segments
-    new_fluxes = np.zeros_like(fluxes)
     for b in range(len(breakpoints)):
       
       # Get the current segment's indices
       inds = GetChunk(time, breakpoints, b)
-    
-      # Update the error arrays with the white GP component
-      for j in range(len(errors)):
-        errors[j] = np.sqrt(errors[j] ** 2 + kpars[j][0] ** 2)
+      inds = slice(inds[0], inds[-1] + 1)
       
       # Get de-trended fluxes
-      X[inds,1:] = SysRem(time[inds], fluxes[:,inds], errors[:,inds], **kwargs).T
+      X[inds,1:] = Extract(time[inds], fluxes, errors, inds = inds, block = block, **kwargs).T
       
     # Save
     np.savez(xfile, X = X, time = time, breakpoints = breakpoints)
+    del fluxes, errors
+    os.remove(ffile)
+    os.remove(efile)
   
   else:
     
@@ -232,7 +377,7 @@ def GetCBVs(campaign, model = 'nPLD', clobber = False, **kwargs):
     breakpoints = data['breakpoints'][()]
   
   # Plot
-  plotfile = os.path.join(path, 'X.pdf')
+  plotfile = os.path.join(path, 'X%s.pdf' % suffix)
   if clobber or not os.path.exists(plotfile):
     fig, ax = pl.subplots(2, 3, figsize = (12, 8))
     fig.subplots_adjust(left = 0.05, right = 0.95)
@@ -247,4 +392,54 @@ def GetCBVs(campaign, model = 'nPLD', clobber = False, **kwargs):
         ax[n].set_title(n, fontsize = 14)
     fig.savefig(plotfile, bbox_inches = 'tight')
     
-  return X
\ No newline at end of file
+  return X
+
+def CBVBenchmark(campaign, model = 'nPLD', nstars = 100, clobber = False, seed = 42, **kwargs):
+  '''
+  Compares the CBVs computed with :py:func:`SysRem` and with :py:func:`RandomizedSVD`
+  for a given campaign. Reports the time taken by :py:func:`GetCBVs` for each method
+  (which is only meaningful if :py:obj:`clobber` is :py:obj:`True` or the CBVs have
+  not been computed yet) and the CDPP of the CBV-corrected flux
+  (see :py:func:`everest.missions.k2.FitCBVs`) for a random sample of targets.
+  
+  :param int campaign: The campaign number
+  :param str model: The name of the :py:obj:`everest` model. Default `nPLD`
+  :param int nstars: The number of targets to compare. Default 100
+  :param bool clobber: Overwrite existing files? Default `False`
+  :param int seed: The random number generator seed used to pick the targets. Default 42
+  
+  :returns: The array of targets and a dictionary with the time taken and the \
+            array of CDPPs for each method
+  
+  '''
+  
+  from ... import detrender
+  
+  # Compute the CBVs with each method
+  res = {}
+  X = {}
+  for method in ['sysrem', 'svd']:
+    tstart = default_timer()
+    X[method] = GetCBVs(campaign, model = model, clobber = clobber, method = method, **kwargs)
+    res[method] = {'time': default_timer() - tstart, 'cdpp': []}
+    
+  # Pick the targets
+  stars = [EPIC for EPIC in GetK2Campaign(campaign, epics_only = True) if 
+           ModelExists(os.path.join(EVEREST_DAT, 'k2', 'c%02d' % int(campaign),
+           ('%09d' % EPIC)[:4] + '00000', ('%09d' % EPIC)[4:]), model)]
+  stars = np.random.RandomState(seed).permutation(stars)[:nstars]
+  
+  # Fit the CBVs
+  for EPIC in stars:
+    star = getattr(detrender, model)(EPIC, season = campaign)
+    for method in ['sysrem', 'svd']:
+      star.XCBV = X[method]
+      res[method]['cdpp'].append(star.get_cdpp(star.fcor))
+  for method in ['sysrem', 'svd']:
+    res[method]['cdpp'] = np.array(res[method]['cdpp'])
+    log.info('%s: %.1f s, median CDPP = %.2f ppm' % (method, res[method]['time'], 
+             np.nanmedian(res[method]['cdpp'])))
+  log.info('Median CDPP ratio (svd / sysrem) = %.4f' % 
+           np.nanmedian(res['svd']['cdpp'] / res['sysrem']['cdpp']))
+  
+  return stars, res
\ No newline at end of file
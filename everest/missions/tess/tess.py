@@ -17,7 +17,8 @@ log = logging.getLogger(__name__)
 __all__ = ['Setup', 'Season', 'Breakpoints', 'GetData', 'GetNeighbors', 
            'Statistics', 'TargetDirectory', 'HasShortCadence', 
            'InjectionStatistics', 'HDUCards', 'FITSFile', 'FITSUrl', 'CDPP',
-           'GetTargetCBVs', 'FitCBVs', 'PlanetStatistics']
+           'GetTargetCBVs', 'FitCBVs', 'PlanetStatistics', 'IndexModel',
+           'GetNeighborRegressors']
 
 def Setup():
   '''
@@ -219,4 +220,23 @@ def FitCBVs(model):
   
   '''
   
-  raise NotImplementedError('This mission is not yet supported.')
\ No newline at end of file
+  raise NotImplementedError('This mission is not yet supported.')
+
+def IndexModel(model):
+  '''
+  Records a saved de-trended model in the mission's neighbor index. Not used
+  for this mission.
+  
+  '''
+  
+  pass
+
+def GetNeighborRegressors(ID, neighbors, **kwargs):
+  '''
+  Returns the precomputed first order *PLD* regressors of each of the neighbors, 
+  or :py:obj:`None` for the neighbors that must be computed from their data. Not 
+  used for this mission.
+  
+  '''
+  
+  return [None for neighbor in neighbors]
@@ -0,0 +1,519 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+:py:mod:`pack.py` - Season pack files
+-------------------------------------
+
+An optional container for the per-target files in a season directory
+(e.g., ``EVEREST_DAT/k2/c05``). The raw data and model results of many
+targets are appended to a single ``pack.dat`` file, and a ``pack.idx``
+log records the offset, size and modification time of each of them, so
+that a season with tens of thousands of targets is stored in two files
+rather than in hundreds of thousands of small ones. The functions :py:func:`Exists`,
+:py:func:`Open`, :py:func:`Load` and :py:func:`ListDir` take the usual
+on-disk paths (see :py:func:`everest.missions.k2.TargetDirectory`) and read through to
+the pack when a file is not found on disk, so packed and unpacked targets can be mixed
+freely; files written to disk after a target was packed take precedence.
+Packs are created, extracted and compacted with :py:func:`Pack`, :py:func:`Unpack`
+and :py:func:`Compact`, or with the :py:mod:`everest-pack` command. Any number of
+processes may remove files from a pack concurrently (see :py:func:`Remove`), but
+only one process at a time should add files to it, unpack it or compact it.
+
+'''
+
+from __future__ import division, print_function, absolute_import, unicode_literals
+from .config import EVEREST_DAT
+import os
+import io
+import json
+import time
+import numpy as np
+import logging
+log = logging.getLogger(__name__)
+
+__all__ = ['PackFile', 'GetPack', 'Exists', 'Open', 'Load', 'ListDir', 'Remove',
+           'Rename', 'Pack', 'Unpack', 'Compact']
+
+#: Files that are never packed
+EXCLUDE = ('.fits', '.tmp')
+
+#: The minimum time in seconds between checks for records added by other processes
+REFRESH = 5.
+
+class PackFile(object):
+  '''
+  The pack file of a season directory. Use :py:func:`GetPack` to get the
+  up-to-date shared instance for a directory.
+
+  :param str root: The season directory
+
+  '''
+
+  def __init__(self, root):
+    '''
+
+    '''
+
+    self.root = root
+    self.datfile = os.path.join(root, 'pack.dat')
+    self.idxfile = os.path.join(root, 'pack.idx')
+    self._reset()
+    self.refresh()
+
+  def __repr__(self):
+    '''
+
+    '''
+
+    return "<everest.PackFile(%s, %d files)>" % (self.root, len(self.files))
+
+  def __contains__(self, path):
+    '''
+
+    '''
+
+    return path in self.files
+
+  def _reset(self):
+    '''
+
+    '''
+
+    #: The `(offset, size, mtime)` of each file, keyed by its path relative to :py:attr:`root`
+    self.files = {}
+    self._tree = {}
+    self._offset = 0
+    self._size = 0
+    self._checked = 0
+    # The inodes of the index and of the data file it describes, used to
+    # detect packs rewritten by :py:func:`Compact` in another process
+    self._idxino = None
+    self._datino = None
+
+  def refresh(self, force = False):
+    '''
+    Reads the records appended to the index since the last call. Unless
+    :py:obj:`force` is set, the index is checked at most once every
+    :py:obj:`REFRESH` seconds.
+
+    '''
+
+    if not force and (time.time() - self._checked < REFRESH):
+      return
+    self._checked = time.time()
+    try:
+      stat = os.stat(self.idxfile)
+    except OSError:
+      self._reset()
+      return
+    size = stat.st_size
+    if (stat.st_ino != self._idxino) or (size < self._size):
+      # This is a new index, or the pack was compacted
+      self._reset()
+      self._checked = time.time()
+      self._idxino = stat.st_ino
+    if size == self._size:
+      return
+    with open(self.idxfile, 'r') as f:
+      f.seek(self._offset)
+      while True:
+        line = f.readline()
+        # Ignore partially written records
+        if not line.endswith('\n'):
+          break
+        self._offset = f.tell()
+        try:
+          self._apply(json.loads(line))
+        except ValueError:
+          log.warn('Skipping corrupt record in %s.' % self.idxfile)
+    self._size = self._offset
+
+  def _apply(self, record):
+    '''
+    Updates the in-memory index with a record.
+
+    '''
+
+    if 'dat' in record:
+      # The header written by `Compact`
+      self._datino = record['dat']
+      return
+    path = record['path']
+    parts = path.split('/')
+    if record['offset'] is None:
+      if self.files.pop(path, None) is None:
+        return
+      # Prune the directory tree
+      for i in range(len(parts) - 1, -1, -1):
+        folder = '/'.join(parts[:i])
+        self._tree[folder].discard(parts[i])
+        if len(self._tree[folder]):
+          break
+        del self._tree[folder]
+    else:
+      self.files[path] = (record['offset'], record['size'], record['mtime'])
+      for i in range(len(parts)):
+        self._tree.setdefault('/'.join(parts[:i]), set()).add(parts[i])
+
+  def _append(self, *records):
+    '''
+    Appends records to the index in a single write, then applies all the records
+    appended since the last refresh, including those written by other processes.
+
+    '''
+
+    with open(self.idxfile, 'a') as f:
+      f.write(''.join([json.dumps(record) + '\n' for record in records]))
+    self.refresh(force = True)
+
+  def add(self, path, data, mtime = None):
+    '''
+    Appends the :py:obj:`bytes` :py:obj:`data` to the pack as file :py:obj:`path`,
+    replacing any previous version.
+
+    '''
+
+    self.extend([(path, data, mtime)])
+
+  def extend(self, files):
+    '''
+    Appends a list of files, given as `(path, data, mtime)` tuples, to the pack.
+    The data is synced to disk before the index is updated.
+
+    '''
+
+    records = []
+    with open(self.datfile, 'ab') as f:
+      f.seek(0, os.SEEK_END)
+      if not os.path.exists(self.idxfile):
+        records.append({'dat': os.fstat(f.fileno()).st_ino})
+      for path, data, mtime in files:
+        records.append({'path': path, 'offset': f.tell(), 'size': len(data),
+                        'mtime': time.time() if mtime is None else mtime})
+        f.write(data)
+      f.flush()
+      os.fsync(f.fileno())
+    self._append(*records)
+
+  def remove(self, path):
+    '''
+    Removes file :py:obj:`path` from the index. The space it used is reclaimed by :py:func:`Compact`.
+
+    '''
+
+    self.refresh(force = True)
+    if path in self.files:
+      self._append({'path': path, 'offset': None})
+
+  def isdir(self, path):
+    '''
+    Returns :py:obj:`True` if :py:obj:`path` is a directory containing packed files.
+
+    '''
+
+    return path in self._tree and path not in self.files
+
+  def listdir(self, path = ''):
+    '''
+    Returns the names of the packed files and directories in directory :py:obj:`path`.
+
+    '''
+
+    return sorted(self._tree.get(path, []))
+
+  def mtime(self, path):
+    '''
+    Returns the modification time of file :py:obj:`path` when it was packed.
+
+    '''
+
+    return self.files[path][2]
+
+  def read(self, path):
+    '''
+    Returns the contents of file :py:obj:`path`.
+
+    '''
+
+    with self._open() as f:
+      offset, size, _ = self.files[path]
+      f.seek(offset)
+      return f.read(size)
+
+  def _open(self, tries = 20):
+    '''
+    Opens the data file for reading. If it is not the file described by the
+    index (because the pack was compacted by another process), the index is
+    re-read first.
+
+    '''
+
+    for i in range(tries):
+      f = open(self.datfile, 'rb')
+      if (self._datino is None) or (os.fstat(f.fileno()).st_ino == self._datino):
+        return f
+      f.close()
+      # The index is replaced just after the data file
+      if i > 0:
+        time.sleep(0.05)
+      self.refresh(force = True)
+    raise IOError("The pack in '%s' was rewritten while reading it." % self.root)
+
+  def load(self, path, mmap_mode = None, **kwargs):
+    '''
+    Loads the :py:obj:`numpy` file :py:obj:`path`. If :py:obj:`mmap_mode` is set,
+    `.npy` files are returned as memory maps into the pack.
+
+    '''
+
+    if mmap_mode is not None and path.endswith('.npy'):
+      with self._open() as f:
+        offset, _, _ = self.files[path]
+        f.seek(offset)
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+          shape, fortran, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+          shape, fortran, dtype = np.lib.format.read_array_header_2_0(f)
+        start = f.tell()
+      if not dtype.hasobject:
+        return np.memmap(self.datfile, dtype = dtype, mode = mmap_mode, offset = start,
+                         shape = shape, order = 'F' if fortran else 'C')
+    return np.load(io.BytesIO(self.read(path)), **kwargs)
+
+_packs = {}
+_missing = {}
+
+def GetPack(root):
+  '''
+  Returns the :py:class:`PackFile` for season directory :py:obj:`root`,
+  or :py:obj:`None` if the directory has not been packed.
+
+  '''
+
+  pack = _packs.get(root, None)
+  if pack is None:
+    # Directories without a pack are checked again after `REFRESH` seconds
+    if time.time() - _missing.get(root, 0) < REFRESH:
+      return None
+    if not os.path.exists(os.path.join(root, 'pack.idx')):
+      _missing[root] = time.time()
+      return None
+    pack = _packs[root] = PackFile(root)
+  else:
+    pack.refresh()
+  return pack
+
+def _Locate(path):
+  '''
+  Returns the :py:class:`PackFile` that may contain :py:obj:`path` and the path
+  relative to its root, or :py:obj:`(None, None)`.
+
+  '''
+
+  rel = os.path.relpath(os.path.abspath(path), os.path.abspath(EVEREST_DAT))
+  parts = rel.split(os.sep)
+  if len(parts) < 2 or parts[0] == '..':
+    return None, None
+  pack = GetPack(os.path.join(EVEREST_DAT, parts[0], parts[1]))
+  if pack is None:
+    return None, None
+  return pack, '/'.join(parts[2:])
+
+def Exists(path):
+  '''
+  Returns :py:obj:`True` if file or directory :py:obj:`path` exists on disk or in a pack.
+
+  '''
+
+  pack, rel = _Locate(path)
+  if pack is not None and (rel in pack.files or pack.isdir(rel)):
+    return True
+  return os.path.exists(path)
+
+def Open(path):
+  '''
+  Opens file :py:obj:`path` for reading in binary mode.
+
+  '''
+
+  if os.path.exists(path):
+    return open(path, 'rb')
+  pack, rel = _Locate(path)
+  if pack is None or rel not in pack.files:
+    raise IOError("No such file: '%s'" % path)
+  return io.BytesIO(pack.read(rel))
+
+def Load(path, mmap_mode = None, **kwargs):
+  '''
+  Loads the :py:obj:`numpy` file :py:obj:`path` (see :py:func:`numpy.load`).
+
+  '''
+
+  if os.path.exists(path):
+    return np.load(path, mmap_mode = mmap_mode, **kwargs)
+  pack, rel = _Locate(path)
+  if pack is None or rel not in pack.files:
+    raise IOError("No such file: '%s'" % path)
+  return pack.load(rel, mmap_mode = mmap_mode, **kwargs)
+
+def ListDir(path):
+  '''
+  Returns the names of the files and directories in directory :py:obj:`path`,
+  on disk and in the pack.
+
+  '''
+
+  names = set()
+  if os.path.isdir(path):
+    names.update(os.listdir(path))
+  pack, rel = _Locate(path)
+  if pack is not None:
+    if rel == '':
+      names.difference_update(['pack.dat', 'pack.idx'])
+    names.update(pack.listdir(rel))
+  return sorted(names)
+
+def Remove(path):
+  '''
+  Deletes file :py:obj:`path` from disk and from the pack. If :py:obj:`path` is
+  a directory, removes all files in it from the pack (but not from disk).
+
+  '''
+
+  if os.path.isfile(path):
+    os.remove(path)
+  pack, rel = _Locate(path)
+  if pack is not None:
+    if pack.isdir(rel):
+      for file in [f for f in pack.files if f.startswith(rel + '/')]:
+        pack.remove(file)
+    else:
+      pack.remove(rel)
+
+def Rename(src, dst):
+  '''
+  Renames file :py:obj:`src` to :py:obj:`dst`. Packed files are extracted to disk.
+
+  '''
+
+  if os.path.exists(src):
+    os.rename(src, dst)
+  else:
+    with Open(src) as f:
+      data = f.read()
+    if not os.path.exists(os.path.dirname(dst)):
+      os.makedirs(os.path.dirname(dst))
+    with open(dst, 'wb') as f:
+      f.write(data)
+    Remove(src)
+
+def Pack(root, remove = True, exclude = EXCLUDE):
+  '''
+  Moves the files in all subdirectories of season directory :py:obj:`root` into its pack.
+  Files already in the pack are replaced by the versions on disk.
+
+  :param str root: The season directory
+  :param bool remove: Delete the files (and the emptied directories) after packing them? \
+         Default :py:obj:`True`
+  :param tuple exclude: The extensions of the files that are not packed. Default :py:obj:`EXCLUDE`
+
+  :returns: The number of files packed
+
+  '''
+
+  if not os.path.isdir(root):
+    raise ValueError("No such directory: '%s'" % root)
+  _missing.pop(root, None)
+  pack = GetPack(root) or PackFile(root)
+  _packs[root] = pack
+  n = 0
+  for folder in sorted(os.listdir(root)):
+    if not os.path.isdir(os.path.join(root, folder)):
+      continue
+    for path, dirs, files in os.walk(os.path.join(root, folder), topdown = False):
+      batch = []
+      for file in sorted(files):
+        name = os.path.join(path, file)
+        rel = os.path.relpath(name, root).replace(os.sep, '/')
+        # Skip excluded and temporary files
+        if file.endswith(exclude) or any([p.startswith('.') for p in rel.split('/')]):
+          continue
+        with open(name, 'rb') as f:
+          batch.append((rel, f.read(), os.path.getmtime(name)))
+      if len(batch):
+        pack.extend(batch)
+        n += len(batch)
+      if remove:
+        for rel, _, _ in batch:
+          os.remove(os.path.join(root, *rel.split('/')))
+        if not os.listdir(path):
+          os.rmdir(path)
+    log.info('Packed %s.' % folder)
+  return n
+
+def Unpack(root, prefix = '', keep = False):
+  '''
+  Extracts the files in the pack of season directory :py:obj:`root` to disk.
+  Files that also exist on disk are not overwritten.
+
+  :param str root: The season directory
+  :param str prefix: Only extract files whose relative paths start with this. Default all
+  :param bool keep: Keep the pack? If :py:obj:`False`, the extracted files are removed \
+         from it, and the pack is deleted once it is empty. Default :py:obj:`False`
+
+  :returns: The number of files extracted
+
+  '''
+
+  pack = GetPack(root)
+  if pack is None:
+    return 0
+  pack.refresh(force = True)
+  n = 0
+  for rel in sorted(pack.files):
+    if not rel.startswith(prefix):
+      continue
+    name = os.path.join(root, *rel.split('/'))
+    if not os.path.exists(name):
+      if not os.path.exists(os.path.dirname(name)):
+        os.makedirs(os.path.dirname(name))
+      with open(name + '.tmp', 'wb') as f:
+        f.write(pack.read(rel))
+      os.rename(name + '.tmp', name)
+      os.utime(name, (pack.mtime(rel), pack.mtime(rel)))
+      n += 1
+    if not keep:
+      pack.remove(rel)
+  if not keep and not len(pack.files):
+    os.remove(pack.datfile)
+    os.remove(pack.idxfile)
+    del _packs[root]
+  return n
+
+def Compact(root):
+  '''
+  Rewrites the pack of season directory :py:obj:`root`, discarding the
+  contents of removed and replaced files.
+
+  '''
+
+  pack = GetPack(root)
+  if pack is None:
+    return
+  pack.refresh(force = True)
+  datfile = pack.datfile + '.tmp'
+  idxfile = pack.idxfile + '.tmp'
+  offset = 0
+  with open(datfile, 'wb') as d, open(idxfile, 'w') as i:
+    i.write(json.dumps({'dat': os.fstat(d.fileno()).st_ino}) + '\n')
+    for rel in sorted(pack.files):
+      data = pack.read(rel)
+      d.write(data)
+      i.write(json.dumps({'path': rel, 'offset': offset, 'size': len(data),
+                          'mtime': pack.mtime(rel)}) + '\n')
+      offset += len(data)
+  os.rename(datfile, pack.datfile)
+  os.rename(idxfile, pack.idxfile)
+  pack._reset()
+  pack.refresh(force = True)
@@ -24,6 +24,7 @@ try:
     MPI = MPI
 except ImportError:
     MPI = None
+import os
 import signal
 import functools
 import multiprocessing
@@ -31,7 +32,7 @@ import multiprocessing.pool
 import logging
 log = logging.getLogger(__name__)
 
-__all__ = ['MPIPool', 'MultiPool', 'SerialPool', 'Pool']
+__all__ = ['MPIPool', 'MultiPool', 'SerialPool', 'ChunkPool', 'Pool']
 
 class _close_pool_message(object):
     def __repr__(self):
@@ -64,6 +65,48 @@ def _test_function(x):
     
     return np.sum(x) / float(len(x))
 
+_chunk_function = _error_function
+
+def _chunk_initializer(function):
+    '''
+    Sets the :py:class:`ChunkPool` function in a worker process. The
+    function is passed to the forked workers as an initializer argument,
+    so it is inherited rather than unpickled, and each pool has its own.
+    
+    '''
+    
+    global _chunk_function
+    _chunk_function = function
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+def _chunk_function_wrapper(task):
+    '''
+    Calls the :py:class:`ChunkPool` function of the current worker process.
+    
+    '''
+    
+    return _chunk_function(task)
+
+def _available_memory():
+    '''
+    Returns the physical memory currently available in bytes, or
+    :py:obj:`None` if it cannot be determined.
+    
+    '''
+    
+    # On Linux, this includes the reclaimable page cache
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except (IOError, OSError, ValueError):
+        pass
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (AttributeError, ValueError, OSError):
+        return None
+
 def _initializer_wrapper(actual_initializer, *rest):
     """
     We ignore SIGINT. It's up to our parent to kill us in the typical
@@ -483,6 +526,104 @@ class MultiPool(multiprocessing.pool.Pool):
                 self.join()
                 raise
 
+class ChunkPool(object):
+    '''
+    A pool for evaluating a function over the (independent) light curve
+    chunks concurrently. The results are always returned in the order of
+    the tasks, so the final stitching of the chunks is deterministic.
+    
+    Threads are usually the best choice, since the expensive linear
+    algebra in each chunk releases the GIL. Process pools rely on
+    :py:obj:`fork` to share the function (and the object it is bound to)
+    with the workers, so only the task indices and the results are
+    pickled; where :py:obj:`fork` is not available, threads are used instead.
+    Since results are sent back from the worker processes, functions
+    mapped onto a process pool should not rely on side effects.
+    
+    :param str pool: One of `thread`, `process` or `serial`. Default `serial`
+    :param int workers: The maximum number of concurrent tasks. Default :py:obj:`None`, \
+           i.e., the number of CPUs
+    :param float memory: The memory budget in GB. New tasks are started only while \
+           the estimated memory of all running tasks fits within the budget, \
+           though a task is always started if nothing else is running. \
+           Default :py:obj:`None`, i.e., half of the physical memory available \
+           when :py:meth:`map` is called (no limit if this cannot be determined)
+    
+    '''
+    
+    def __init__(self, pool='serial', workers=None, memory=None):
+        '''
+        
+        '''
+        
+        if pool not in ['thread', 'process', 'serial']:
+            raise ValueError('Invalid chunk pool ``%s``.' % pool)
+        self.pool = pool
+        self.workers = workers if workers is not None else multiprocessing.cpu_count()
+        self.memory = memory
+    
+    def _get_pool(self, function, workers):
+        '''
+        Returns the underlying :py:mod:`multiprocessing` pool and the
+        function to send to it.
+        
+        '''
+        
+        if self.pool == 'process':
+            try:
+                ctx = multiprocessing.get_context('fork')
+            except (AttributeError, ValueError):
+                log.warn('Process pools require ``fork``. Using threads instead.')
+            else:
+                return ctx.Pool(workers, _chunk_initializer, (function,)), _chunk_function_wrapper
+        return multiprocessing.pool.ThreadPool(workers), function
+    
+    def map(self, function, tasks, nbytes=None):
+        '''
+        Returns the list :py:obj:`[function(task) for task in tasks]`.
+        
+        :param callable function: The function to evaluate
+        :param iterable tasks: The tasks (usually the chunk indices)
+        :param array_like nbytes: The estimated memory in bytes required by each \
+               of the tasks. Default :py:obj:`None`
+        
+        '''
+        
+        tasks = list(tasks)
+        if nbytes is None:
+            nbytes = [0 for task in tasks]
+        workers = min(self.workers, len(tasks))
+        if (self.pool == 'serial') or (workers <= 1):
+            return [function(task) for task in tasks]
+        if self.memory is not None:
+            budget = self.memory * 1024 ** 3
+        else:
+            available = _available_memory()
+            budget = np.inf if available is None else 0.5 * available
+        
+        pool, func = self._get_pool(function, workers)
+        try:
+            handles = [None for task in tasks]
+            running = []
+            for i, task in enumerate(tasks):
+                # Wait for enough memory to free up
+                while len(running):
+                    running = [j for j in running if not handles[j].ready()]
+                    if (len(running) == 0) or (sum([nbytes[j] for j in running]) + nbytes[i] <= budget):
+                        break
+                    handles[running[0]].wait(0.1)
+                handles[i] = pool.apply_async(func, (task,))
+                running.append(i)
+            results = [h.get() for h in handles]
+        except:
+            pool.terminate()
+            raise
+        else:
+            pool.close()
+        finally:
+            pool.join()
+        return results
+
 def Pool(pool = 'AnyPool', **kwargs):
     '''
     Chooses between the different pools.
@@ -7,6 +7,8 @@ search.py
 Given an `everest` instance, performs a transit search
 and returns an array of delta chi-squared values. This
 approach is similar to that in Foreman-Mackey et al. (2015).
+The single transit depths can then be stacked over a grid
+of periods and epochs with :py:func:`PeriodicSearch`.
 
 '''
 
@@ -25,6 +27,54 @@ except ImportError:
 import logging
 log = logging.getLogger(__name__)
 
+def MatchedFilter(CDK, flux, transit_model, time, gaps = [], amp = 1., block = 2 ** 22):
+  '''
+  Computes the maximum likelihood depth, its variance and the delta chi-squared
+  of a single transit centered on each of the cadences in :py:obj:`time`. Rather
+  than solving the system for one transit at a time, the transit templates are
+  stacked into a matrix and solved for in blocks of columns, and the baseline
+  solve :math:`\mathbf{K}^{-1} \mathbf{f}` is done only once.
+  
+  :param tuple CDK: The Cholesky factorization of the covariance (see :py:func:`scipy.linalg.cho_factor`)
+  :param ndarray flux: The flux (*N*)
+  :param callable transit_model: The normalized transit shape (see :py:class:`everest.transit.TransitShape`)
+  :param ndarray time: The uniformly sampled time array (with the gaps filled in)
+  :param array_like gaps: The indices of :py:obj:`time` corresponding to missing cadences. Default `[]`
+  :param float amp: The amplitude of the templates, typically the median flux. Default `1`
+  :param int block: The maximum number of elements in each block of templates. Default `2 ** 22`
+  
+  :returns: The arrays of depths, depth variances, and delta chi-squared values
+  
+  '''
+  
+  # The baseline solve
+  Kf = cho_solve(CDK, flux)
+  nogaps = np.delete(np.arange(len(time)), gaps)
+  tobs = time[nogaps]
+  
+  # The transit templates, in blocks of columns
+  a = np.zeros(len(time))
+  b = np.zeros(len(time))
+  size = max(1, block // len(tobs))
+  for i in prange(int(np.ceil(len(time) / size))):
+    t0 = time[i * size:(i + 1) * size]
+    trn = amp * np.interp(tobs.reshape(-1, 1) - t0.reshape(1, -1), transit_model.x, transit_model.y)
+    a[i * size:(i + 1) * size] = np.sum(trn * cho_solve(CDK, trn), axis = 0)
+    b[i * size:(i + 1) * size] = np.dot(trn.T, Kf)
+    del trn
+  
+  # The depth, its variance, and the delta chi-squared
+  with np.errstate(divide = 'ignore', invalid = 'ignore'):
+    vard = 1. / a
+    d = vard * b
+    dchisq = 2 * d * b - d ** 2 * a
+  bad = ~np.isfinite(vard)
+  vard[bad] = np.nan
+  d[bad] = np.nan
+  dchisq[bad] = np.nan
+  
+  return d, vard, dchisq
+
 def Search(star, pos_tol = 2.5, neg_tol = 50., **ps_kwargs):
   '''
   NOTE: `pos_tol` is the positive (i.e., above the median) outlier tolerance in standard deviations.
@@ -33,20 +83,20 @@ def Search(star, pos_tol = 2.5, neg_tol = 50., **ps_kwargs):
   '''
   
   # Smooth the light curve
-  t = np.delete(star.time, np.concatenate([star.nanmask, star.badmask]))
-  f = np.delete(star.flux, np.concatenate([star.nanmask, star.badmask]))
+  categories = ('nanmask', 'badmask')
+  f = star.flux[star.masks.unmasked(len(star.time), categories)]
   f = SavGol(f)
   med = np.nanmedian(f)
   
   # Kill positive outliers
   MAD = 1.4826 * np.nanmedian(np.abs(f - med))
   pos_inds = np.where((f > med + pos_tol * MAD))[0]
-  pos_inds = np.array([np.argmax(star.time == t[i]) for i in pos_inds])
+  pos_inds = star.masks.project(pos_inds, len(star.time), categories)
   
   # Kill negative outliers
   MAD = 1.4826 * np.nanmedian(np.abs(f - med))
   neg_inds = np.where((f < med - neg_tol * MAD))[0]
-  neg_inds = np.array([np.argmax(star.time == t[i]) for i in neg_inds])
+  neg_inds = star.masks.project(neg_inds, len(star.time), categories)
   
   # Replace the star.outmask array
   star.outmask = np.concatenate([neg_inds, pos_inds])
@@ -70,15 +120,15 @@ def Search(star, pos_tol = 2.5, neg_tol = 50., **ps_kwargs):
     
     # The masked X.L.X^T term
     A = np.zeros((len(m), len(m)))
+    G = star.get_gram(m)
     for n in range(star.pld_order):
-      XM = star.X(n,m)
-      A += star.lam[b][n] * np.dot(XM, XM.T)
+      A += star.lam[b][n] * G[n]
+    del G
     K += A
     CDK = cho_factor(K)
     
     # Baseline
     med = np.nanmedian(star.fraw[m])
-    lnL0 = -0.5 * np.dot(star.fraw[m], cho_solve(CDK, star.fraw[m]))
     dt = np.median(np.diff(star.time[m]))
 
     # Create a uniform time array and get indices of missing cadences
@@ -101,27 +151,114 @@ def Search(star, pos_tol = 2.5, neg_tol = 50., **ps_kwargs):
     transit_model = TransitShape(**ps_kwargs)
 
     # Now roll the transit model across each cadence
-    dchisq = np.zeros(len(tnogaps))
-    d = np.zeros(len(tnogaps))
-    vard = np.zeros(len(tnogaps))
-    for i in prange(len(tnogaps)):
-      trn = transit_model(tnogaps, tnogaps[i])
-      trn = np.delete(trn, gaps)
-      trn *= med
-      vard[i] = 1. / np.dot(trn, cho_solve(CDK, trn))
-      if not np.isfinite(vard[i]):
-        vard[i] = np.nan
-        d[i] = np.nan
-        dchisq[i] = np.nan
-        continue
-      d[i] = vard[i] * np.dot(trn, cho_solve(CDK, star.fraw[m]))
-      r = star.fraw[m] - trn * d[i]
-      lnL = -0.5 * np.dot(r, cho_solve(CDK, r))
-      dchisq[i] = -2 * (lnL0 - lnL)
+    d, vard, dchisq = MatchedFilter(CDK, star.fraw[m], transit_model, tnogaps, gaps, med)
       
     TIME = np.append(TIME, tnogaps)
     DEPTH = np.append(DEPTH, d)
     VARDEPTH = np.append(VARDEPTH, vard)
     DELCHISQ = np.append(DELCHISQ, dchisq)
 
-  return TIME, DEPTH, VARDEPTH, DELCHISQ
\ No newline at end of file
+  return TIME, DEPTH, VARDEPTH, DELCHISQ
+
+def PeriodicSearch(time, depth, vardepth, periods = None, pmin = 1., pmax = None, dur = 0.1, oversample = 3, ntmin = 2,
+                   block = 2 ** 16):
+  '''
+  Stacks the single transit depths returned by :py:func:`Search` over a grid of
+  periods and epochs, treating the single transit events as independent, and
+  returns the periodogram. For each trial period :math:`P` and epoch :math:`t_0`,
+  the depth is the inverse variance-weighted mean of the single transit depths
+  at times :math:`t_0 + kP`,
+  
+  .. math::
+  
+      \delta = \frac{\sum_k \delta_k / \sigma_k^2}{\sum_k 1 / \sigma_k^2},
+      \qquad \sigma^2 = \frac{1}{\sum_k 1 / \sigma_k^2},
+      \qquad \Delta \chi^2 = \delta^2 / \sigma^2.
+  
+  The sums :math:`\sum 1 / \sigma_k^2` and :math:`\sum \delta_k / \sigma_k^2` are accumulated
+  once on a uniform time grid with the cadence spacing, so each trial period only
+  requires binning these accumulators in phase, which costs :math:`\mathcal{O}(N)`.
+  The periods are binned in blocks, so there is one call to :py:func:`numpy.bincount`
+  per block rather than per period.
+  
+  :param ndarray time: The times of the single transits (see :py:func:`Search`)
+  :param ndarray depth: The single transit depths
+  :param ndarray vardepth: The variance of the single transit depths
+  :param array_like periods: The trial periods in days. Default :py:obj:`None`, in which \
+         case a grid uniform in frequency is used
+  :param float pmin: The minimum period in days for the default grid. Default `1`
+  :param float pmax: The maximum period in days for the default grid. Default :py:obj:`None`, \
+         i.e., half the baseline
+  :param float dur: The approximate transit duration in days, which sets the spacing \
+         of the default grid. Default `0.1`
+  :param int oversample: The oversampling of the default grid. Default `3`
+  :param int ntmin: The minimum number of transits with data. Epochs with fewer \
+         transits are ignored. Default `2`
+  :param int block: The maximum number of phase bin indices in each block of periods. \
+         Default `2 ** 16`
+  
+  :returns: The arrays of periods, and the epoch, depth, depth variance and delta chi-squared \
+            of the best (largest positive depth delta chi-squared) epoch at each period
+  
+  '''
+  
+  # The accumulators on a uniform grid
+  good = np.isfinite(depth) & np.isfinite(vardepth) & (vardepth > 0)
+  time = np.array(time)[good]
+  w = 1. / np.array(vardepth)[good]
+  wd = w * np.array(depth)[good]
+  dt = np.nanmedian(np.diff(time))
+  k = np.array(np.round((time - time[0]) / dt), dtype = int)
+  W = np.bincount(k, weights = w)
+  WD = np.bincount(k, weights = wd)
+  N = np.bincount(k)
+  k = np.where(N > 0)[0]
+  W, WD = W[k], WD[k]
+  baseline = k[-1] * dt
+  
+  # The default period grid, uniform in frequency
+  if periods is None:
+    if pmax is None:
+      pmax = baseline / 2.
+    df = dur / baseline ** 2 / oversample
+    periods = 1. / np.arange(1. / pmax, 1. / pmin, df)[::-1]
+  periods = np.atleast_1d(periods)
+  
+  # Stack in phase, in blocks of periods. The phase bins of all the periods
+  # in a block are binned at once, with the bins of each period padded to
+  # those of the longest one.
+  epoch = np.zeros_like(periods) * np.nan
+  dep = np.zeros_like(periods) * np.nan
+  vardep = np.zeros_like(periods) * np.nan
+  delchisq = np.zeros_like(periods)
+  size = max(1, block // len(k))
+  Wb = np.tile(W, min(size, len(periods)))
+  WDb = np.tile(WD, min(size, len(periods)))
+  for i in prange(int(np.ceil(len(periods) / size))):
+    P = periods[i * size:(i + 1) * size].reshape(-1, 1)
+    n = np.arange(len(P))
+    
+    # The phase bin of each grid point (avoiding the slow floating point modulo)
+    nbins = int(np.ceil(np.max(P) / dt))
+    phase = k * (dt / P)
+    phase -= np.floor(phase)
+    phase *= P / dt
+    phase = phase.astype(int)
+    phase += nbins * n.reshape(-1, 1)
+    phase = phase.ravel()
+    
+    # The stacked accumulators
+    Wp = np.bincount(phase, weights = Wb[:len(phase)], minlength = len(P) * nbins).reshape(-1, nbins)
+    WDp = np.bincount(phase, weights = WDb[:len(phase)], minlength = len(P) * nbins).reshape(-1, nbins)
+    Np = np.bincount(phase, minlength = len(P) * nbins).reshape(-1, nbins)
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+      dchisq = np.where((Np >= ntmin) & (WDp > 0), WDp ** 2 / Wp, 0.)
+    j = np.argmax(dchisq, axis = 1)
+    n = n[dchisq[n, j] > 0]
+    j = j[n]
+    epoch[i * size + n] = time[0] + j * dt
+    dep[i * size + n] = WDp[n, j] / Wp[n, j]
+    vardep[i * size + n] = 1. / Wp[n, j]
+    delchisq[i * size + n] = dchisq[n, j]
+  
+  return periods, epoch, dep, vardep, delchisq
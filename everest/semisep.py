@@ -0,0 +1,553 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+:py:mod:`semisep.py` - Linear-time Matern-3/2 GP
+------------------------------------------------
+
+A Gaussian process with a Matern-3/2 kernel plus white noise,
+
+.. math::
+
+    k(\\tau) = a^2 \\left(1 + \\frac{\sqrt{3}\\tau}{t}\\right) e^{-\sqrt{3}\\tau / t} + w^2 \delta_{\\tau},
+
+whose covariance matrix is *semiseparable* of rank 2. The kernel has an exact
+two-dimensional state space representation (the process and its derivative), so
+the log-likelihood, its gradient, the conditional mean and the solve
+:math:`\mathbf{K}^{-1}\mathbf{y}` may all be computed in :math:`\mathcal{O}(N)`
+with a Kalman filter / Rauch-Tung-Striebel smoother instead of a dense Cholesky
+factorization. The gradient is obtained exactly by propagating the derivatives
+of the filter state alongside the filter itself.
+
+The class :py:class:`Matern32GP` mirrors the parts of the :py:obj:`george.GP`
+interface used by :py:obj:`everest` (:py:meth:`compute`, :py:meth:`lnlikelihood`,
+:py:meth:`grad_lnlikelihood`, :py:meth:`predict`, and :py:meth:`get_matrix`), with
+the kernel parametrized in the same way (:math:`w^2`, :math:`a^2`, :math:`t^2`), so
+the two are interchangeable. See :py:func:`everest.gp.GP`.
+
+'''
+
+from __future__ import division, print_function, absolute_import, unicode_literals
+import numpy as np
+from math import exp, sqrt, pi, isinf, log as ln
+import logging
+log = logging.getLogger(__name__)
+
+__all__ = ['Matern32Kernel', 'Matern32GP']
+
+LOG2PI = ln(2 * pi)
+
+class Matern32Kernel(object):
+  '''
+  A container for the Matern-3/2 kernel parameters. As in :py:obj:`george`, the
+  parameter vector :py:attr:`pars` holds the squared white noise amplitude (if present),
+  the squared red noise amplitude, and the squared timescale (the metric).
+
+  :param float amp: The red noise amplitude :math:`a`
+  :param float tau: The red noise timescale :math:`t`
+  :param float white: The white noise amplitude :math:`w`. Default :py:obj:`None`
+
+  '''
+
+  def __init__(self, amp, tau, white = None):
+    '''
+
+    '''
+
+    self.amp = amp
+    self.tau = tau
+    self.white = white
+
+  @property
+  def pars(self):
+    '''
+    The kernel parameters, :py:obj:`[w ** 2, a ** 2, t ** 2]`, or :py:obj:`[a ** 2, t ** 2]`
+    if there is no white noise term.
+
+    '''
+
+    if self.white is None:
+      return np.array([self.amp ** 2, self.tau ** 2])
+    else:
+      return np.array([self.white ** 2, self.amp ** 2, self.tau ** 2])
+
+  def __call__(self, dt):
+    '''
+    Returns the (red noise) kernel evaluated at time lag(s) :py:obj:`dt`.
+
+    '''
+
+    x = np.sqrt(3.) * np.abs(dt) / self.tau
+    return self.amp ** 2 * (1. + x) * np.exp(-x)
+
+class Matern32GP(object):
+  '''
+  A Matern-3/2 Gaussian process with :math:`\mathcal{O}(N)` inference.
+
+  :param float amp: The red noise amplitude :math:`a`
+  :param float tau: The red noise timescale :math:`t`
+  :param float white: The white noise amplitude :math:`w`. Default :py:obj:`None`
+
+  '''
+
+  def __init__(self, amp, tau, white = None):
+    '''
+
+    '''
+
+    self.kernel = Matern32Kernel(amp, tau, white)
+    self.computed = False
+    self._grid = None
+    self._train = None
+
+  def compute(self, x, yerr = 0.):
+    '''
+    Pre-computes the quantities needed for inference at times :py:obj:`x`
+    with measurement uncertainties :py:obj:`yerr`.
+
+    '''
+
+    x = np.atleast_1d(np.array(x, dtype = float))
+    yerr = np.broadcast_to(np.array(yerr, dtype = float), x.shape)
+    self._order = np.argsort(x, kind = 'mergesort')
+    self._x = x[self._order]
+    self._r = yerr[self._order] ** 2
+    if self.kernel.white is not None:
+      self._r = self._r + self.kernel.white ** 2
+    self._grid = None
+    self._train = None
+    self.computed = True
+
+  def _filter(self, x, y, r, grad = False, store = False):
+    '''
+    The Kalman filter. Points with infinite variance :py:obj:`r` are not
+    observed. Returns the log-likelihood, its gradient with respect to the
+    log of the kernel parameters (if :py:obj:`grad`) and, if :py:obj:`store`,
+    the filtered and predicted states needed by the smoother.
+
+    '''
+
+    # Native floats are much faster than numpy scalars in the loop below
+    x = np.asarray(x, dtype = float).tolist()
+    y = np.asarray(y, dtype = float).tolist()
+    r = np.asarray(r, dtype = float).tolist()
+    a2 = self.kernel.amp ** 2
+    lam = sqrt(3.) / self.kernel.tau
+    q0 = a2
+    q1 = lam ** 2 * a2
+    N = len(x)
+
+    # The parameters: derivatives of the stationary covariance, of `lam`
+    # (which enters the transition matrix), and of the observation variance
+    # with respect to each of the kernel parameters
+    pars = self.kernel.pars
+    dpars = []
+    if self.kernel.white is not None:
+      dpars.append((0., 0., 0., 1.))
+    dpars.append((1., lam ** 2, 0., 0.))
+    dlam = -lam / (2 * self.kernel.tau ** 2)
+    dpars.append((0., 2 * lam * a2 * dlam, dlam, 0.))
+    npars = len(dpars)
+
+    # The state
+    m0 = 0.
+    m1 = 0.
+    p00 = q0
+    p01 = 0.
+    p11 = q1
+    dm = [[0., 0.] for j in range(npars)]
+    dP = [[dq0, 0., dq1] for dq0, dq1, _, _ in dpars]
+    lnlike = 0.
+    dlnlike = [0. for j in range(npars)]
+    if store:
+      MF = np.empty((N, 2))
+      PF = np.empty((N, 3))
+
+    for k in range(N):
+
+      # Predict
+      if k > 0:
+        d = x[k] - x[k - 1]
+        e = exp(-lam * d)
+        a00 = e * (1. + lam * d)
+        a01 = e * d
+        a10 = -e * lam ** 2 * d
+        a11 = e * (1. - lam * d)
+        d00 = p00 - q0
+        d01 = p01
+        d11 = p11 - q1
+        t00 = a00 * d00 + a01 * d01
+        t01 = a00 * d01 + a01 * d11
+        t10 = a10 * d00 + a11 * d01
+        t11 = a10 * d01 + a11 * d11
+        if grad:
+          ea00 = -d * a00 + e * d
+          ea01 = -d * a01
+          ea10 = -d * a10 - 2 * e * lam * d
+          ea11 = -d * a11 - e * d
+          for j in range(npars):
+            dq0, dq1, dl, _ = dpars[j]
+            da00 = ea00 * dl
+            da01 = ea01 * dl
+            da10 = ea10 * dl
+            da11 = ea11 * dl
+            dmj = dm[j]
+            dPj = dP[j]
+            dmj[0], dmj[1] = (da00 * m0 + da01 * m1 + a00 * dmj[0] + a01 * dmj[1],
+                              da10 * m0 + da11 * m1 + a10 * dmj[0] + a11 * dmj[1])
+            # X = dA . D . A^T
+            u00 = da00 * d00 + da01 * d01
+            u01 = da00 * d01 + da01 * d11
+            u10 = da10 * d00 + da11 * d01
+            u11 = da10 * d01 + da11 * d11
+            x00 = u00 * a00 + u01 * a01
+            x01 = u00 * a10 + u01 * a11
+            x10 = u10 * a00 + u11 * a01
+            x11 = u10 * a10 + u11 * a11
+            # A . dD . A^T
+            e00 = dPj[0] - dq0
+            e01 = dPj[1]
+            e11 = dPj[2] - dq1
+            v00 = a00 * e00 + a01 * e01
+            v01 = a00 * e01 + a01 * e11
+            v10 = a10 * e00 + a11 * e01
+            v11 = a10 * e01 + a11 * e11
+            dPj[0] = 2 * x00 + v00 * a00 + v01 * a01 + dq0
+            dPj[1] = x01 + x10 + v00 * a10 + v01 * a11
+            dPj[2] = 2 * x11 + v10 * a10 + v11 * a11 + dq1
+        m0, m1 = a00 * m0 + a01 * m1, a10 * m0 + a11 * m1
+        p00 = t00 * a00 + t01 * a01 + q0
+        p01 = t00 * a10 + t01 * a11
+        p11 = t10 * a10 + t11 * a11 + q1
+
+      # Update
+      if not isinf(r[k]):
+        S = p00 + r[k]
+        v = y[k] - m0
+        k0 = p00 / S
+        k1 = p01 / S
+        lnlike -= 0.5 * (v * v / S + ln(S) + LOG2PI)
+        if grad:
+          for j in range(npars):
+            dmj = dm[j]
+            dPj = dP[j]
+            dS = dPj[0] + dpars[j][3]
+            dv = -dmj[0]
+            dlnlike[j] -= 0.5 * (2 * v * dv / S - v * v * dS / S ** 2 + dS / S)
+            dk0 = (dPj[0] - k0 * dS) / S
+            dk1 = (dPj[1] - k1 * dS) / S
+            dmj[0] += dk0 * v + k0 * dv
+            dmj[1] += dk1 * v + k1 * dv
+            dPj[0] -= 2 * dk0 * S * k0 + k0 * dS * k0
+            dPj[1] -= dk0 * S * k1 + k0 * dS * k1 + k0 * S * dk1
+            dPj[2] -= 2 * dk1 * S * k1 + k1 * dS * k1
+        m0 += k0 * v
+        m1 += k1 * v
+        p00, p01, p11 = p00 - k0 * k0 * S, p01 - k0 * k1 * S, p11 - k1 * k1 * S
+
+      if store:
+        MF[k] = m0, m1
+        PF[k] = p00, p01, p11
+
+    if grad:
+      dlnlike = np.array(dlnlike) * pars
+    if store:
+      return lnlike, dlnlike, MF, PF
+    return lnlike, dlnlike
+
+  def _gains(self, x, r):
+    '''
+    The covariance part of the Kalman filter and Rauch-Tung-Striebel smoother,
+    which does not depend on the data. Returns the transition matrices, the
+    Kalman gains, the smoother gains, and the posterior variance of the red
+    noise process at each of the times :py:obj:`x`.
+
+    '''
+
+    x = np.asarray(x, dtype = float).tolist()
+    r = np.asarray(r, dtype = float).tolist()
+    lam = sqrt(3.) / self.kernel.tau
+    q0 = self.kernel.amp ** 2
+    q1 = lam ** 2 * q0
+    N = len(x)
+    A = [(1., 0., 0., 1.) for k in range(N)]
+    K = [(0., 0.) for k in range(N)]
+    G = [(1., 0., 0., 1.) for k in range(N)]
+    PP = [None for k in range(N)]
+    PF = [None for k in range(N)]
+
+    # Forward pass
+    p00 = q0
+    p01 = 0.
+    p11 = q1
+    for k in range(N):
+      if k > 0:
+        d = x[k] - x[k - 1]
+        e = exp(-lam * d)
+        a00 = e * (1. + lam * d)
+        a01 = e * d
+        a10 = -e * lam ** 2 * d
+        a11 = e * (1. - lam * d)
+        A[k] = (a00, a01, a10, a11)
+        t00 = a00 * (p00 - q0) + a01 * p01
+        t01 = a00 * p01 + a01 * (p11 - q1)
+        t10 = a10 * (p00 - q0) + a11 * p01
+        t11 = a10 * p01 + a11 * (p11 - q1)
+        p00, p01, p11 = (t00 * a00 + t01 * a01 + q0,
+                         t00 * a10 + t01 * a11,
+                         t10 * a10 + t11 * a11 + q1)
+      PP[k] = (p00, p01, p11)
+      if not isinf(r[k]):
+        S = p00 + r[k]
+        k0 = p00 / S
+        k1 = p01 / S
+        K[k] = (k0, k1)
+        p00, p01, p11 = p00 - k0 * k0 * S, p01 - k0 * k1 * S, p11 - k1 * k1 * S
+      PF[k] = (p00, p01, p11)
+
+    # Backward pass
+    var = np.empty(N)
+    s00, s01, s11 = PF[-1]
+    var[-1] = s00
+    for k in range(N - 2, -1, -1):
+      if x[k + 1] == x[k]:
+        # The smoother gain is the identity
+        var[k] = s00
+        continue
+      a00, a01, a10, a11 = A[k + 1]
+      f00, f01, f11 = PF[k]
+      n00, n01, n11 = PP[k + 1]
+      # The gain G = P . A^T . N^-1
+      c00 = f00 * a00 + f01 * a01
+      c01 = f00 * a10 + f01 * a11
+      c10 = f01 * a00 + f11 * a01
+      c11 = f01 * a10 + f11 * a11
+      det = n00 * n11 - n01 * n01
+      g00 = (c00 * n11 - c01 * n01) / det
+      g01 = (c01 * n00 - c00 * n01) / det
+      g10 = (c10 * n11 - c11 * n01) / det
+      g11 = (c11 * n00 - c10 * n01) / det
+      G[k] = (g00, g01, g10, g11)
+      e00 = s00 - n00
+      e01 = s01 - n01
+      e11 = s11 - n11
+      h00 = g00 * e00 + g01 * e01
+      h01 = g00 * e01 + g01 * e11
+      h10 = g10 * e00 + g11 * e01
+      h11 = g10 * e01 + g11 * e11
+      s00, s01, s11 = (f00 + h00 * g00 + h01 * g01,
+                       f01 + h00 * g10 + h01 * g11,
+                       f11 + h10 * g10 + h11 * g11)
+      var[k] = s00
+
+    return A, K, G, var
+
+  def _smooth(self, y, gains):
+    '''
+    The Rauch-Tung-Striebel smoother. Returns the posterior mean of the red
+    noise process given the data :py:obj:`y` and the output of :py:meth:`_gains`.
+    The data :py:obj:`y` may be two-dimensional, in which case each column
+    is smoothed independently in a single pass over the data.
+
+    '''
+
+    A, K, G, _ = gains
+    N = len(A)
+
+    if np.ndim(y) == 1:
+
+      # Native floats are much faster than numpy scalars here
+      y = np.asarray(y, dtype = float).tolist()
+      MP = [None for k in range(N)]
+      MF = [None for k in range(N)]
+      m0 = 0.
+      m1 = 0.
+      for k in range(N):
+        a00, a01, a10, a11 = A[k]
+        m0, m1 = a00 * m0 + a01 * m1, a10 * m0 + a11 * m1
+        MP[k] = (m0, m1)
+        k0, k1 = K[k]
+        v = y[k] - m0
+        m0 += k0 * v
+        m1 += k1 * v
+        MF[k] = (m0, m1)
+      mu = [0. for k in range(N)]
+      s0, s1 = MF[-1]
+      mu[-1] = s0
+      for k in range(N - 2, -1, -1):
+        g00, g01, g10, g11 = G[k]
+        p0, p1 = MP[k + 1]
+        f0, f1 = MF[k]
+        r0 = s0 - p0
+        r1 = s1 - p1
+        s0, s1 = f0 + g00 * r0 + g01 * r1, f1 + g10 * r0 + g11 * r1
+        mu[k] = s0
+      return np.array(mu)
+
+    else:
+
+      Y = np.asarray(y, dtype = float)
+      MP = np.empty((N, 2, Y.shape[1]))
+      MF = np.empty((N, 2, Y.shape[1]))
+      m0 = np.zeros(Y.shape[1])
+      m1 = np.zeros(Y.shape[1])
+      for k in range(N):
+        a00, a01, a10, a11 = A[k]
+        m0, m1 = a00 * m0 + a01 * m1, a10 * m0 + a11 * m1
+        MP[k, 0] = m0
+        MP[k, 1] = m1
+        k0, k1 = K[k]
+        if k0 or k1:
+          v = Y[k] - m0
+          m0 = m0 + k0 * v
+          m1 = m1 + k1 * v
+        MF[k, 0] = m0
+        MF[k, 1] = m1
+      mu = np.empty_like(Y)
+      s0, s1 = MF[-1]
+      mu[-1] = s0
+      for k in range(N - 2, -1, -1):
+        g00, g01, g10, g11 = G[k]
+        r0 = s0 - MP[k + 1, 0]
+        r1 = s1 - MP[k + 1, 1]
+        s0, s1 = MF[k, 0] + g00 * r0 + g01 * r1, MF[k, 1] + g10 * r0 + g11 * r1
+        mu[k] = s0
+      return mu
+
+  def lnlikelihood(self, y, quiet = False):
+    '''
+    Returns the log-likelihood of the data :py:obj:`y`.
+
+    '''
+
+    assert self.computed, "You must call `compute()` first."
+    return self._filter(self._x, np.asarray(y, dtype = float)[self._order], self._r)[0]
+
+  def grad_lnlikelihood(self, y, quiet = False):
+    '''
+    Returns the gradient of the log-likelihood of the data :py:obj:`y` with
+    respect to the *log* of the kernel parameters :py:attr:`kernel.pars`.
+
+    '''
+
+    assert self.computed, "You must call `compute()` first."
+    return self._filter(self._x, np.asarray(y, dtype = float)[self._order], self._r, grad = True)[1]
+
+  def predict(self, y, t):
+    '''
+    Returns the conditional mean and variance of the red noise process
+    at times :py:obj:`t` given the data :py:obj:`y`. Note that unlike
+    :py:obj:`george`, this returns the *variance* rather than the full
+    covariance matrix. The part of the computation that does not depend
+    on :py:obj:`y` is cached, so repeated calls with the same :py:obj:`t`
+    are faster.
+
+    '''
+
+    assert self.computed, "You must call `compute()` first."
+    t = np.atleast_1d(np.array(t, dtype = float))
+    key = t.tobytes()
+    if self._grid is None or self._grid[0] != key:
+      x = np.concatenate([self._x, t])
+      r = np.concatenate([self._r, np.inf * np.ones_like(t)])
+      order = np.argsort(x, kind = 'mergesort')
+      inv = np.empty_like(order)
+      inv[order] = np.arange(len(order))
+      inv = inv[len(self._x):]
+      self._grid = (key, order, inv, self._gains(x[order], r[order]))
+    _, order, inv, gains = self._grid
+    yy = np.concatenate([np.asarray(y, dtype = float)[self._order], np.zeros_like(t)])
+    mu = self._smooth(yy[order], gains)
+    return mu[inv], gains[3][inv]
+
+  def apply_inverse(self, y):
+    '''
+    Returns :math:`\mathbf{K}^{-1}\mathbf{y}`. Since the measurement noise
+    is diagonal, this is simply the residual of the conditional mean of the
+    red noise process divided by the noise variance. If :py:obj:`y` is
+    two-dimensional, the solve is performed for each of its columns.
+
+    '''
+
+    assert self.computed, "You must call `compute()` first."
+    if self._train is None:
+      self._train = self._gains(self._x, self._r)
+    yy = np.asarray(y, dtype = float)[self._order]
+    mu = self._smooth(yy, self._train)
+    alpha = np.empty_like(yy)
+    alpha[self._order] = (yy - mu) / self._r.reshape((-1,) + (1,) * (yy.ndim - 1))
+    return alpha
+
+  def dot(self, y):
+    '''
+    Returns :math:`\mathbf{K}\mathbf{y}`, the product of the covariance matrix
+    (the kernel plus the noise variance) and :py:obj:`y`, without forming the matrix.
+    The kernel is the sum of a lower and an upper triangular semiseparable matrix,
+    whose products are each computed with a single :math:`\mathcal{O}(N)` recursion.
+    If :py:obj:`y` is two-dimensional, the product is computed for each of its columns.
+
+    '''
+
+    assert self.computed, "You must call `compute()` first."
+    yy = np.asarray(y, dtype = float)[self._order]
+    if yy.ndim > 1:
+      Ky = np.empty_like(yy)
+      for j in range(yy.shape[1]):
+        Ky[self._order, j] = self._dot(yy[:, j])
+      return Ky
+    Ky = np.empty_like(yy)
+    Ky[self._order] = self._dot(yy)
+    return Ky
+
+  def _dot(self, y):
+    '''
+    Returns the product of the covariance and :py:obj:`y` at the sorted training points.
+
+    '''
+
+    # Native floats are much faster than numpy scalars in the loops below
+    x = self._x.tolist()
+    yl = y.tolist()
+    lam = sqrt(3.) / self.kernel.tau
+    N = len(x)
+    Ky = [0. for k in range(N)]
+
+    # The lower triangle, including the diagonal: `s0` is the sum of
+    # `exp(-lam * dt) * y` and `s1` the sum of `dt * exp(-lam * dt) * y`
+    s0 = 0.
+    s1 = 0.
+    for k in range(N):
+      if k > 0:
+        d = x[k] - x[k - 1]
+        e = exp(-lam * d)
+        s1 = e * (s1 + d * s0)
+        s0 = e * s0
+      s0 += yl[k]
+      Ky[k] = s0 + lam * s1
+
+    # The strict upper triangle
+    s0 = 0.
+    s1 = 0.
+    for k in range(N - 2, -1, -1):
+      d = x[k + 1] - x[k]
+      e = exp(-lam * d)
+      s0 += yl[k + 1]
+      s1 = e * (s1 + d * s0)
+      s0 = e * s0
+      Ky[k] += s0 + lam * s1
+
+    return self.kernel.amp ** 2 * np.array(Ky) + self._r * y
+
+  def get_matrix(self, x1, x2 = None):
+    '''
+    Returns the dense kernel matrix. Note that this is :math:`\mathcal{O}(N^2)`.
+
+    '''
+
+    x1 = np.atleast_1d(x1)
+    if x2 is None:
+      K = self.kernel(x1[:, None] - x1[None, :])
+      if self.kernel.white is not None:
+        K[np.diag_indices_from(K)] += self.kernel.white ** 2
+      return K
+    else:
+      return self.kernel(x1[:, None] - np.atleast_1d(x2)[None, :])
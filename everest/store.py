@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+:py:mod:`store.py` - Model storage
+----------------------------------
+
+The on-disk layout of the de-trended models saved by :py:meth:`everest.detrender.Detrender.save_model`.
+Each model is a folder `<name>.model` in the target directory. The folder holds a small
+`meta.pickle` record with the scalars, the regularization parameters, the masks, the
+kernel parameters, the CDPPs and the rest of the model state. It also holds one
+uncompressed `.npy` file for each large array (the per-cadence arrays, the pixel fluxes,
+the neighbor regressors, etc.). The large arrays are only read when they are accessed and
+are returned as memory maps, so reading a few scalars from a model doesn't read its
+pixel data. Models saved in the original single `<name>.npz` file are still read. Both
+layouts are also read from season pack files (see :py:mod:`everest.pack`).
+
+'''
+
+from __future__ import division, print_function, absolute_import, unicode_literals
+from .pack import Exists, Open, Load, Remove, Rename
+import os
+import shutil
+import pickle
+import tempfile
+import numpy as np
+import logging
+log = logging.getLogger(__name__)
+
+__all__ = ['ModelExists', 'SaveModel', 'LoadModel', 'DiscardModel', 'ModelData']
+
+#: The current version of the model layout
+MODEL_VERSION = 1
+
+#: Arrays larger than this many bytes are always stored in their own file
+LARGE = 2 ** 16
+
+def _Folder(path, name):
+  '''
+
+  '''
+
+  return os.path.join(path, name + '.model')
+
+def ModelExists(path, name):
+  '''
+  Returns :py:obj:`True` if model :py:obj:`name` exists in the target directory
+  :py:obj:`path` in either layout.
+
+  '''
+
+  return Exists(os.path.join(_Folder(path, name), 'meta.pickle')) or \
+         Exists(os.path.join(path, name + '.npz'))
+
+def SaveModel(path, name, data):
+  '''
+  Atomically saves model :py:obj:`name` to the target directory :py:obj:`path`,
+  replacing any existing version in either layout. As with :py:func:`numpy.savez`,
+  every value is converted to an array.
+
+  :param str path: The target directory
+  :param str name: The model name
+  :param dict data: The model state
+
+  '''
+
+  if not os.path.exists(path):
+    os.makedirs(path)
+  folder = _Folder(path, name)
+  tmp = tempfile.mkdtemp(dir = path, prefix = '.' + name)
+  try:
+    meta = {}
+    arrays = []
+    ncad = np.size(data.get('time', None))
+    for key, value in data.items():
+      value = np.asanyarray(value)
+      if (not value.dtype.hasobject) and (value.ndim > 0) and \
+         ((value.nbytes > LARGE) or (ncad > 1 and value.shape[0] == ncad)):
+        np.save(os.path.join(tmp, key + '.npy'), value)
+        arrays.append(key)
+      else:
+        meta[key] = value
+    meta['_arrays'] = arrays
+    meta['_version'] = MODEL_VERSION
+    with open(os.path.join(tmp, 'meta.pickle'), 'wb') as f:
+      pickle.dump(meta, f, protocol = 2)
+      f.flush()
+      os.fsync(f.fileno())
+  except:
+    shutil.rmtree(tmp, ignore_errors = True)
+    raise
+
+  # Discard any packed copy and any legacy version of the model
+  Remove(folder)
+  Remove(os.path.join(path, name + '.npz'))
+
+  # Swap the directories
+  if os.path.exists(folder):
+    old = tempfile.mkdtemp(dir = path, prefix = '.' + name)
+    os.rename(folder, os.path.join(old, 'model'))
+    os.rename(tmp, folder)
+    shutil.rmtree(old, ignore_errors = True)
+  else:
+    os.rename(tmp, folder)
+
+def LoadModel(path, name):
+  '''
+  Returns a :py:class:`ModelData` instance for model :py:obj:`name` in the target
+  directory :py:obj:`path`.
+
+  '''
+
+  return ModelData(path, name)
+
+def DiscardModel(path, name):
+  '''
+  Moves a model that could not be loaded out of the way, appending `.bad` to its name.
+
+  '''
+
+  folder = _Folder(path, name)
+  if os.path.exists(folder):
+    if os.path.exists(folder + '.bad'):
+      shutil.rmtree(folder + '.bad', ignore_errors = True)
+    os.rename(folder, folder + '.bad')
+  Remove(folder)
+  file = os.path.join(path, name + '.npz')
+  if Exists(file):
+    Rename(file, file + '.bad')
+
+class ModelData(object):
+  '''
+  A read-only, :py:obj:`dict`-like view of a saved model. Values are returned as arrays,
+  as they would be by a :py:class:`numpy.lib.npyio.NpzFile`. The large arrays are memory-mapped
+  when they are first accessed.
+
+  :param str path: The target directory
+  :param str name: The model name
+
+  '''
+
+  def __init__(self, path, name):
+    '''
+
+    '''
+
+    self.path = path
+    self.name = name
+    self.folder = _Folder(path, name)
+    self._cache = {}
+    if Exists(os.path.join(self.folder, 'meta.pickle')):
+      with Open(os.path.join(self.folder, 'meta.pickle')) as f:
+        self._meta = pickle.load(f)
+      if self._meta.pop('_version') > MODEL_VERSION:
+        raise Exception('Model %s in %s was saved with a newer version of EVEREST.' % (name, path))
+      self.arrays = set(self._meta.pop('_arrays'))
+      self._npz = None
+    else:
+      # The original layout
+      file = os.path.join(path, name + '.npz')
+      if not Exists(file):
+        raise IOError("No such model: '%s'" % file)
+      self._npz = Load(file, allow_pickle = True)
+      self._meta = None
+      self.arrays = set()
+
+  def keys(self):
+    '''
+    Returns the names of the saved attributes.
+
+    '''
+
+    if self._npz is not None:
+      return list(self._npz.keys())
+    return list(self._meta.keys()) + sorted(self.arrays)
+
+  def __contains__(self, key):
+    '''
+
+    '''
+
+    return key in self.keys()
+
+  def __getitem__(self, key):
+    '''
+
+    '''
+
+    if self._npz is not None:
+      return self._npz[key]
+    elif key in self.arrays:
+      return self.load(key)
+    return self._meta[key]
+
+  def load(self, key, mmap_mode = 'r'):
+    '''
+    Returns the large array :py:obj:`key` as a memory map. Use `mmap_mode = 'c'` for a
+    copy-on-write map that may be modified in place without changing the file.
+
+    '''
+
+    if (key, mmap_mode) not in self._cache:
+      x = Load(os.path.join(self.folder, key + '.npy'), mmap_mode = mmap_mode)
+      self._cache[(key, mmap_mode)] = x.view(np.ndarray) if isinstance(x, np.memmap) else x
+    return self._cache[(key, mmap_mode)]
@@ -27,6 +27,7 @@ from .basecamp import Basecamp
 from .detrender import pPLD
 from .gp import GetCovariance, GP
 from .config import QUALITY_BAD, QUALITY_NAN, QUALITY_OUT, QUALITY_REC, QUALITY_TRN, EVEREST_DEV, EVEREST_FITS, EVEREST_MAJOR_MINOR
+from .store import SaveModel
 from .utils import InitLog, Formatter
 import george
 import os, sys, platform
@@ -219,6 +220,9 @@ class Everest(Basecamp):
     
     # Load the FITS file
     self.load_fits()
+    
+    # Cache the lambda paths when re-computing long cadence models
+    self.lambda_paths = (self.cadence == 'lc')
 
   def __repr__(self):
     '''
@@ -251,6 +255,10 @@ class Everest(Basecamp):
     For long cadence `k2` light curves, this should take several seconds. For short
     cadence `k2` light curves, it may take a few minutes.
     Note that this is a simple wrapper around :py:func:`everest.Basecamp.compute`.
+    For long cadence light curves, if only one *PLD* order's :py:obj:`lambda` changed
+    since the last call, the model is computed from a cached lambda path (see
+    :py:class:`everest.linalg.LambdaPaths`), so that subsequent calls along the same
+    path are much faster.
     
     '''
     
@@ -299,16 +307,14 @@ class Everest(Basecamp):
       f = self.fraw[m] - med
       
       # The X^2 matrices
-      A = np.zeros((len(m), len(m)))
       B = np.zeros((len(c), len(m)))
+      G = self.get_gram(m, c)
       
       # Loop over all orders
       for n in range(self.pld_order):
-        XM = self.X(n,m)
-        XC = self.X(n,c)
-        A += self.reclam[b][n] * np.dot(XM, XM.T)
-        B += self.reclam[b][n] * np.dot(XC, XM.T)
-        del XM, XC
+        B += self.reclam[b][n] * G[n]
+      del G
+      A = B[np.searchsorted(c, m)]
       
       W = np.linalg.solve(mK + A, f)
       mod[b] = np.dot(B, W)
@@ -367,6 +373,7 @@ class Everest(Basecamp):
       self.cbv_niter = f[1].header['CBVNITER']
       self.cbv_win = f[1].header['CBVWIN']
       self.cbv_order = f[1].header['CBVORD']
+      self.cbv_method = f[1].header.get('CBVMETH', 'sysrem')
       self.cadn = f[1].data['CADN']
       self.cdivs = f[1].header['CDIVS']
       self.cdpp = f[1].header['CDPP']
@@ -480,6 +487,11 @@ class Everest(Basecamp):
     self.meta = None
     self._transit_model = None
     self.transit_depth = None
+    self.solver = 'auto'
+    self.chunk_pool = 'serial'
+    self.chunk_workers = None
+    self.chunk_memory = None
+    self.design_memory = 0.5
   
   def plot_aperture(self, show = True):
     '''
@@ -582,8 +594,9 @@ class Everest(Basecamp):
         ax.plot(O2(time), O2(flux), 'r.', markersize = ms, alpha = 0.25)
       ax.plot(O3(time), O3(flux), 'b.', markersize = ms, alpha = 0.25)
       
-      # Plot the GP
-      if n == 0 and plot_gp and self.cadence != 'sc':
+      # Plot the GP. This is cheap for the linear-time `Basic` kernel,
+      # but too expensive for short cadence with the dense solver
+      if n == 0 and plot_gp and (self.cadence != 'sc' or self.kernel == 'Basic'):
         gp = GP(self.kernel, self.kernel_params)
         gp.compute(self.apply_mask(time), self.apply_mask(fraw_err))
         med = np.nanmedian(self.apply_mask(flux))
@@ -960,15 +973,13 @@ class Everest(Basecamp):
       mK = GetCovariance(self.kernel, self.kernel_params, self.time[m], self.fraw_err[m])
       med = np.nanmedian(self.fraw[m])
       f = self.fraw[m] - med
-      A = np.zeros((len(m), len(m)))
       B = np.zeros((len(c), len(m)))
+      G = self.get_gram(m, c, order = min(self.lam_idx + 1, self.pld_order))
       for n in range(self.pld_order):
         if (self.lam_idx >= n) and (self.lam[b][n] is not None):
-          XM = self.X(n,m)
-          XC = self.X(n,c)
-          A += self.lam[b][n] * np.dot(XM, XM.T)
-          B += self.lam[b][n] * np.dot(XC, XM.T)
-          del XM, XC
+          B += self.lam[b][n] * G[n]
+      del G
+      A = B[m]
       W = np.linalg.solve(mK + A, f)
       model = np.dot(B, W)
       del A, B, W
@@ -1073,13 +1084,17 @@ class Everest(Basecamp):
   
   def _save_npz(self):
     '''
-    Saves all of the de-trending information to disk in an `npz` file
+    Saves all of the de-trending information to disk (see :py:mod:`everest.store`)
     
     '''
     
     # Save the data
     d = dict(self.__dict__)
     d.pop('_weights', None)
+    d.pop('_lambda_paths', None)
+    d.pop('_design', None)
+    d.pop('_masks', None)
+    d.update(self.masks.__getstate__())
     d.pop('_A', None)
     d.pop('_B', None)
     d.pop('_f', None)
@@ -1090,7 +1105,7 @@ class Everest(Basecamp):
     d.pop('clobber_tpf', None)
     d.pop('_mission', None)
     d.pop('debug', None)
-    np.savez(os.path.join(self.dir, self.name + '.npz'), **d)
+    SaveModel(self.dir, self.name, d)
   
   def optimize(self, piter = 3, pmaxf = 300, ppert = 0.1):
     '''
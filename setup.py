@@ -53,7 +53,7 @@ setup(name = 'everest-pipeline',
                           'k2plr>=0.2.5',
                           'PyPDF2'
                          ],
-      scripts=['bin/everest', 'bin/everest-stats', 'bin/everest-status'],
+      scripts=['bin/everest', 'bin/everest-stats', 'bin/everest-status', 'bin/everest-pack'],
       include_package_data = True,
       zip_safe = False,
       test_suite='nose.collector',
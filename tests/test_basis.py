@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+test_basis.py
+-------------
+
+Test the shared neighbor basis on a synthetic module.
+
+'''
+
+import everest
+from everest.missions.k2 import basis, k2
+from everest.missions.k2.basis import BasisSettings, GetNeighborBasis, BuildNeighborBasis
+from everest.math import Interpolate
+from everest.utils import DataContainer
+import numpy as np
+import glob
+
+#: The stars on the module. The last one has no usable data.
+STARS = [201000001, 201000002, 201000003, 201000004]
+
+class _Catalog(object):
+  '''
+
+  '''
+
+  def __init__(self):
+    '''
+
+    '''
+
+    # The last star is too faint to be a neighbor
+    self.epic = np.array(STARS + [201000005])
+    self.kepmag = np.array([11., 12., 13., 12.5, 16.])
+    self.channel = np.array([1, 2, 3, 4, 1])
+    self.sc = np.zeros(5, dtype = int)
+
+  def select(self, campaign = None):
+    '''
+
+    '''
+
+    return np.arange(len(self.epic))
+
+class _Index(object):
+  '''
+
+  '''
+
+  def eligible(self, EPIC, aperture_name):
+    '''
+
+    '''
+
+    return None
+
+def setup_basis(tmpdir, monkeypatch):
+  '''
+
+  '''
+
+  calls = []
+  def GetData(EPIC, **kwargs):
+    calls.append(EPIC)
+    if EPIC == STARS[-1]:
+      return None
+    np.random.seed(EPIC % 1000)
+    data = DataContainer()
+    data.time = np.linspace(0, 10, 200)
+    data.fpix = 100. + np.random.random((200, 5 + EPIC % 3))
+    data.nanmask = np.array([20])
+    data.badmask = np.array([50, 51])
+    return data
+
+  monkeypatch.setattr(basis, 'EVEREST_DAT', str(tmpdir))
+  monkeypatch.setattr(basis, '_bases', {})
+  monkeypatch.setattr(basis, 'Catalog', _Catalog)
+  monkeypatch.setattr(basis, 'Channels', lambda module: [1, 2, 3, 4])
+  monkeypatch.setattr(basis, 'GetNeighborIndex', lambda campaign: _Index())
+  monkeypatch.setattr(basis, 'RawDataExists', lambda path: True)
+  monkeypatch.setattr(k2, 'TargetDirectory', lambda EPIC, season: str(tmpdir))
+  monkeypatch.setattr(k2, 'Module', lambda EPIC: 2)
+  monkeypatch.setattr(k2, 'GetData', GetData)
+  monkeypatch.setattr(everest.missions.k2, 'GetData', GetData)
+  return GetData, calls
+
+def test_basis(tmpdir, monkeypatch):
+  '''
+
+  '''
+
+  GetData, calls = setup_basis(tmpdir, monkeypatch)
+  settings = BasisSettings()
+  b = BuildNeighborBasis(1, 2)
+  assert sorted(b.columns) == STARS[:3]
+  assert b.skipped == set([STARS[-1]])
+
+  # The regressors are computed as in `nPLD`
+  for star in STARS[:3]:
+    data = GetData(star)
+    mask = np.array(list(set(np.concatenate([data.badmask, data.nanmask]))), dtype = int)
+    fraw = np.sum(data.fpix, axis = 1)
+    X1 = b.get(star, settings)
+    assert np.array_equal(X1, Interpolate(data.time, mask, data.fpix / fraw.reshape(-1, 1)))
+    assert not X1.flags.writeable
+  assert b.get(STARS[0], BasisSettings(max_pixels = 50)) is None
+  assert b.get(STARS[-1], settings) is None
+
+  # The store is up to date, including the skipped star
+  ncalls = len(calls)
+  assert BuildNeighborBasis(1, 2) is b
+  assert len(calls) == ncalls
+
+  # Rebuilding replaces the array, and other processes pick up the new store
+  BuildNeighborBasis(1, 2, clobber = True)
+  assert len(calls) == ncalls + len(STARS)
+  assert len(glob.glob(b.dir + '/*.npy')) == 1
+  monkeypatch.setattr(basis, '_bases', {})
+  other = GetNeighborBasis(1, 2)
+  assert other is not b
+  assert other.covers(STARS, settings)
+  assert np.array_equal(other.get(STARS[1], settings), b.get(STARS[1], settings))
+
+def test_npld_basis(tmpdir, monkeypatch):
+  '''
+
+  '''
+
+  # One of the neighbors is not in the store
+  GetData, calls = setup_basis(tmpdir, monkeypatch)
+  BuildNeighborBasis(1, 2)
+  neighbors = [STARS[0], 201000007, STARS[2]]
+
+  # The design matrix from the store should match the one computed from the data
+  X1N = []
+  for clobber_tpf in [False, True]:
+    del calls[:]
+    star = everest.nPLD.__new__(everest.nPLD)
+    star.mission = 'k2'
+    star.ID = 201000009
+    star._season = 1
+    star.cadence = 'lc'
+    star.clobber_tpf = clobber_tpf
+    star.aperture_name = None
+    star.saturated_aperture_name = None
+    star.max_pixels = 75
+    star.saturation_tolerance = -0.1
+    star.setup(neighbors = neighbors, neighbor_workers = 1)
+    X1N.append(star.X1N)
+    assert calls == ([201000007] if not clobber_tpf else neighbors)
+  assert X1N[0].shape == (200, sum([5 + n % 3 for n in neighbors]))
+  assert np.array_equal(X1N[0], X1N[1])
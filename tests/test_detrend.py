@@ -10,12 +10,13 @@ Test the de-trending core.
 
 import everest
 from everest.config import EVEREST_DAT
+from everest.pack import Exists
 from k2plr.config import KPLR_ROOT
 import os
 import numpy as np
 import shutil
 
-def test_detrend():
+def setup_data():
   '''
   
   '''
@@ -52,6 +53,13 @@ def test_detrend():
   if not os.path.exists(dest):
     os.makedirs(dest)
   np.savez(os.path.join(dest, 'X.npz'), time = time, X = X, breakpoints = breakpoints)
+
+def test_detrend():
+  '''
+  
+  '''
+  
+  setup_data()
   
   # Run the de-trending
   star = everest.rPLD(201367065, clobber = True, mission = 'k2',
@@ -63,4 +71,24 @@ def test_detrend():
   assert (star.cdpp > 15.) and (star.cdpp < 19.), "De-trended CDPP is different from benchmark value (17.302 ppm)."
   
   # Publish
-  star.publish()
\ No newline at end of file
+  star.publish()
+
+def test_headless():
+  '''
+  
+  '''
+  
+  setup_data()
+  
+  # De-trend without plotting
+  kwargs = dict(mission = 'k2', giter = 1, gmaxf = 3, lambda_arr = [1e0, 1e5, 1e10], oiter = 3,
+                pld_order = 2, get_hires = False, get_nearby = False)
+  star = everest.rPLD(201367065, clobber = True, headless = True, **kwargs)
+  pdf = os.path.join(star.dir, star.name + '.pdf')
+  assert not Exists(pdf)
+  assert len(star.dvs_lc) == 3 and len(star.dvs_cv) == 2
+  
+  # Render the DVS from the saved model
+  star = everest.rPLD(201367065, **kwargs)
+  star.plot_dvs()
+  assert Exists(pdf)
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+test_gram.py
+------------
+
+Test the implicit PLD Gram matrices against the explicit design matrices.
+
+'''
+
+import everest
+from everest.gram import Gram
+from everest.design import DesignMatrices
+import numpy as np
+from itertools import combinations_with_replacement as multichoose
+
+def test_gram():
+  '''
+
+  '''
+
+  # Random fractional pixel fluxes and neighbor regressors
+  np.random.seed(1234)
+  fpix = np.random.random((60, 8))
+  X1 = fpix / np.sum(fpix, axis = 1).reshape(-1, 1)
+  X1N = np.random.random((60, 3))
+
+  # The explicit design matrix, as in `Basecamp.X()`
+  def X(n, j):
+    X = np.prod(list(multichoose(X1[j].T, n + 1)), axis = 1).T
+    return np.hstack([X, X1N[j] ** (n + 1)])
+
+  m = np.arange(0, 40)
+  c = np.arange(10, 60)
+  G = Gram(X1[c], X1[m], 4, X1N[c], X1N[m])
+  for n in range(4):
+    assert np.allclose(G[n], np.dot(X(n, c), X(n, m).T), rtol = 1e-10, atol = 0)
+
+def test_design():
+  '''
+
+  '''
+
+  # Random pixel fluxes and neighbor regressors
+  np.random.seed(1234)
+  fpix = np.random.random((60, 8))
+  norm = np.sum(fpix, axis = 1)
+  X1N = np.random.random((60, 3))
+  j = np.arange(5, 50)
+
+  # The incrementally built design matrices should match the explicit ones
+  design = DesignMatrices()
+  X1 = fpix[j] / norm[j].reshape(-1, 1)
+  for n in range(4):
+    X = np.hstack([np.prod(list(multichoose(X1.T, n + 1)), axis = 1).T, X1N[j] ** (n + 1)])
+    assert np.allclose(design(fpix, norm, n, j, X1N), X, rtol = 1e-12, atol = 0)
+
+  # Replacing the normalization should invalidate the cache
+  design(fpix, 2 * norm, 0, j, X1N)
+  assert np.allclose(design(fpix, 2 * norm, 0, j)[:, :8], X1 / 2)
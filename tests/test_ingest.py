@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+test_ingest.py
+--------------
+
+Test the download helpers against a local stub server standing in for MAST.
+
+'''
+
+import everest
+from everest.missions.k2 import aux
+from six.moves import urllib
+from six.moves.BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+import threading
+import time
+import pytest
+
+CSV = b'''EPIC,RA,Dec,Kepler mag
+integer,ra,dec,float
+201367065,11:26:48.00,-01:30:00.0,11.5
+201367066,11:26:50.40,-01:29:24.0,15.2
+'''
+
+class Handler(BaseHTTPRequestHandler):
+  '''
+  Serves the MAST search results. The `/flaky` endpoint fails with a 503 on
+  every other request, `/slow` stalls and `/missing` is a 404.
+
+  '''
+
+  hits = 0
+
+  def do_GET(self):
+    '''
+
+    '''
+
+    Handler.hits += 1
+    path = self.path.split('?')[0]
+    if path == '/missing':
+      self.send_error(404)
+      return
+    elif path == '/flaky' and Handler.hits % 2 == 1:
+      self.send_error(503)
+      return
+    elif path == '/slow':
+      time.sleep(1.)
+    self.send_response(200)
+    self.send_header('Content-Type', 'text/csv')
+    self.send_header('Content-Length', str(len(CSV)))
+    self.end_headers()
+    self.wfile.write(CSV)
+
+  def log_message(self, *args):
+    '''
+
+    '''
+
+    pass
+
+@pytest.fixture
+def server():
+  '''
+
+  '''
+
+  httpd = HTTPServer(('127.0.0.1', 0), Handler)
+  thread = threading.Thread(target = httpd.serve_forever)
+  thread.daemon = True
+  thread.start()
+  Handler.hits = 0
+  yield 'http://127.0.0.1:%d' % httpd.server_address[1]
+  httpd.shutdown()
+  httpd.server_close()
+
+def test_fetch_retries(server):
+  '''
+
+  '''
+
+  assert aux.Fetch(server + '/flaky', retries = 2, backoff = 0.) == CSV
+  assert Handler.hits == 2
+
+def test_fetch_client_error(server):
+  '''
+
+  '''
+
+  with pytest.raises(urllib.error.HTTPError):
+    aux.Fetch(server + '/missing', retries = 2, backoff = 0.)
+  assert Handler.hits == 1
+
+def test_fetch_timeout(server):
+  '''
+
+  '''
+
+  start = time.time()
+  with pytest.raises((IOError, OSError)):
+    aux.Fetch(server + '/slow', timeout = 0.1, retries = 1, backoff = 0.)
+  assert time.time() - start < 1.
+
+def test_mast(server, monkeypatch):
+  '''
+
+  '''
+
+  monkeypatch.setattr(aux, 'MAST_EPIC_URL', server + '/flaky')
+  epicid, ra, dec, kepmag = aux.MASTRADec(171.7, -1.5, 60., retries = 1)
+  assert list(epicid) == [201367065, 201367066]
+  assert list(kepmag) == [11.5, 15.2]
+  assert abs(ra[0] - 171.7) < 1e-8 and abs(dec[0] + 1.5) < 1e-8
+
+  # Failed queries return no sources
+  monkeypatch.setattr(aux, 'MAST_EPIC_URL', server + '/missing')
+  assert len(aux.MASTRADec(171.7, -1.5, 60.)[0]) == 0
+
+def test_retry(server):
+  '''
+
+  '''
+
+  # Server errors are retried, but a missing file is not
+  fetch = lambda path: urllib.request.urlopen(server + path).read()
+  assert aux.Retry(fetch, retries = 2, backoff = 0.)('/flaky') == CSV
+  assert Handler.hits == 2
+  with pytest.raises(urllib.error.HTTPError):
+    aux.Retry(fetch, retries = 2, backoff = 0.)('/missing')
+  assert Handler.hits == 3
@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+test_linalg.py
+--------------
+
+Test the specialized linear solvers against dense solves.
+
+'''
+
+import everest
+from everest.linalg import LambdaPath, Woodbury, MaskedSolver, PLDOperator
+from everest.semisep import Matern32GP
+from everest.search import MatchedFilter
+from scipy.linalg import cho_factor, cho_solve
+import numpy as np
+
+class _Shape(object):
+  '''
+  A Gaussian stand-in for :py:class:`everest.transit.TransitShape`.
+
+  '''
+
+  def __init__(self, window = 0.5, width = 0.05):
+    '''
+
+    '''
+
+    self.x = np.linspace(-window / 2, window / 2, 5000)
+    self.y = -np.exp(-0.5 * (self.x / width) ** 2)
+
+  def __call__(self, time, t0 = 0.):
+    '''
+
+    '''
+
+    return np.interp(time, self.x + t0, self.y)
+
+def test_lambda_path():
+  '''
+
+  '''
+
+  # A random positive definite system with two PLD orders
+  np.random.seed(1234)
+  N = 200
+  L = np.random.randn(N, N)
+  K = np.dot(L, L.T) + N * np.eye(N)
+  X = [np.random.randn(N, 5), np.random.randn(N, 15)]
+  A = [np.dot(x, x.T) for x in X]
+  B = A
+  f = np.random.randn(N)
+
+  # Vary the second order, keeping the first fixed
+  path = LambdaPath([10., 1.], 1, A, B, K, f)
+  for lam in [0., 1e-2, 1., 1e2, 1e4]:
+    W = np.linalg.solve(K + 10. * A[0] + lam * A[1], f)
+    model = np.dot(10. * B[0] + lam * B[1], W)
+    assert np.allclose(path(lam), model, rtol = 1e-8, atol = 1e-10 * np.max(np.abs(model)))
+
+def test_woodbury():
+  '''
+
+  '''
+
+  # The regressor-space solve should match the cadence-space solve
+  np.random.seed(1234)
+  N = 200
+  L = np.random.randn(N, N)
+  K = np.dot(L, L.T) + N * np.eye(N)
+  X = np.random.randn(N, 20)
+  lam = np.concatenate([10. * np.ones(5), 1e3 * np.ones(15)])
+  f = np.random.randn(N)
+  A = np.dot(X * lam, X.T)
+  model = np.dot(A, np.linalg.solve(K + A, f))
+  w = Woodbury(lambda y: np.linalg.solve(K, y), X, lam, f)
+  assert np.allclose(np.dot(X, w), model)
+
+def test_masked_solver():
+  '''
+
+  '''
+
+  # Solving with some indices masked should match the dense subsystem
+  np.random.seed(1234)
+  N = 200
+  L = np.random.randn(N, N)
+  S = np.dot(L, L.T) + N * np.eye(N)
+  g = np.random.randn(N)
+  solver = MaskedSolver(S)
+  for r in [[], [5, 17, 150], [17, 150, 151, 199]]:
+    m = np.delete(np.arange(N), r)
+    y = solver.solve(g, r)
+    assert np.allclose(y[m], np.linalg.solve(S[np.ix_(m, m)], g[m]))
+    assert np.all(y[r] == 0)
+
+def test_semisep():
+  '''
+
+  '''
+
+  # A random Matern-3/2 light curve
+  np.random.seed(1234)
+  N = 300
+  t = np.sort(20 * np.random.random(N))
+  err = 0.5 * np.ones(N)
+  gp = Matern32GP(2., 1.5, white = 0.3)
+  K = gp.get_matrix(t) + np.diag(err ** 2)
+  y = np.dot(np.linalg.cholesky(K), np.random.randn(N))
+  gp.compute(t, err)
+
+  # Log likelihood
+  lnlike = -0.5 * (np.dot(y, np.linalg.solve(K, y)) + np.linalg.slogdet(K)[1] + N * np.log(2 * np.pi))
+  assert np.allclose(gp.lnlikelihood(y), lnlike)
+
+  # Solve, product and conditional mean
+  assert np.allclose(gp.apply_inverse(y), np.linalg.solve(K, y))
+  assert np.allclose(gp.dot(y), np.dot(K, y))
+  gp = Matern32GP(2., 1.5)
+  gp.compute(t, np.sqrt(err ** 2 + 0.3 ** 2))
+  ts = np.linspace(0, 20, 50)
+  mu = np.dot(gp.get_matrix(ts, t), np.linalg.solve(K, y))
+  assert np.allclose(gp.predict(y, ts)[0], mu)
+
+def test_pld_operator():
+  '''
+
+  '''
+
+  # The iterative solve should match the regressor-space solve
+  np.random.seed(1234)
+  N = 500
+  t = np.sort(20 * np.random.random(N))
+  err = 0.5 * np.ones(N)
+  gp = Matern32GP(2., 1.5)
+  gp.compute(t, err)
+  X = np.random.randn(N, 20)
+  lam = np.concatenate([10. * np.ones(5), 1e3 * np.ones(15)])
+  f = np.random.randn(N)
+  model = np.dot(X, Woodbury(gp.apply_inverse, X, lam, f))
+  for nprec in [0, 5]:
+    op = PLDOperator(gp.dot, gp.apply_inverse, X, nprec = nprec)
+    W = op.solve(f, lam)
+    assert np.allclose(np.dot(X, op.weights(W, lam)), model)
+  
+  # Warm starts from a nearby solution
+  W2 = op.solve(np.vstack([f, f]).T, 2 * lam, x0 = np.vstack([W, W]).T)
+  assert np.allclose(np.dot(X, op.weights(W2, 2 * lam))[:,1], 
+                     np.dot(X, Woodbury(gp.apply_inverse, X, 2 * lam, f)))
+
+def test_matched_filter():
+  '''
+
+  '''
+
+  # A random covariance on a uniform grid with a few missing cadences
+  np.random.seed(1234)
+  N = 300
+  time = 0.02 * np.arange(N)
+  gaps = np.array([10, 11, 12, 150, 299])
+  n = N - len(gaps)
+  L = np.random.randn(n, n)
+  K = 0.1 * np.dot(L, L.T) / n + np.eye(n)
+  CDK = cho_factor(K)
+  shape = _Shape()
+  med = 100.
+  f = med + np.random.randn(n) + 5 * np.delete(shape(time, time[100]), gaps)
+
+  # The old search, one cho_solve per cadence
+  lnL0 = -0.5 * np.dot(f, cho_solve(CDK, f))
+  d = np.zeros(N)
+  vard = np.zeros(N)
+  dchisq = np.zeros(N)
+  for i in range(N):
+    trn = np.delete(shape(time, time[i]), gaps) * med
+    vard[i] = 1. / np.dot(trn, cho_solve(CDK, trn))
+    d[i] = vard[i] * np.dot(trn, cho_solve(CDK, f))
+    r = f - trn * d[i]
+    lnL = -0.5 * np.dot(r, cho_solve(CDK, r))
+    dchisq[i] = -2 * (lnL0 - lnL)
+
+  # Solved in blocks of templates, including a partial last block
+  for block in [2 ** 22, 7 * n]:
+    D, VARD, DCHISQ = MatchedFilter(CDK, f, shape, time, gaps, med, block = block)
+    assert np.allclose(D, d)
+    assert np.allclose(VARD, vard)
+    assert np.allclose(DCHISQ, dchisq, atol = 1e-8 * np.max(np.abs(dchisq)))
@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+test_mask.py
+------------
+
+Test the light curve masks against index arrays.
+
+'''
+
+import everest
+from everest.mask import Mask
+import numpy as np
+import pytest
+
+def test_mask():
+  '''
+
+  '''
+
+  N = 100
+  masks = Mask(N)
+  masks['badmask'] = [3, 50, -1]
+  masks['outmask'] = np.array([-100, 10, 50])
+  assert np.array_equal(masks['badmask'], [3, 50, 99])
+  assert np.array_equal(masks['outmask'], [0, 10, 50])
+  mask = np.unique(np.arange(N)[[3, 50, -1, -100, 10, 50]])
+  assert np.array_equal(masks.indices(N), mask)
+  assert np.array_equal(masks.unmasked(N), np.delete(np.arange(N), mask))
+  assert np.array_equal(masks.chunk(N, 5, 60), [i for i in range(6, 61) if i not in mask])
+
+  # Out of bounds or unresolvable negative indices
+  with pytest.raises(IndexError):
+    masks['outmask'] = [-101]
+  with pytest.raises(IndexError):
+    Mask()['outmask'] = [-1]
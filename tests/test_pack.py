@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+test_pack.py
+------------
+
+Test reading through season packs, and reading a pack while
+other processes modify it.
+
+'''
+
+import everest
+from everest import pack
+from everest.pack import PackFile, GetPack, Pack, Unpack, Compact, Exists, Open, Load, ListDir, Remove
+import numpy as np
+import os
+
+def setup_season(tmpdir, monkeypatch):
+  '''
+
+  '''
+
+  monkeypatch.setattr(pack, 'EVEREST_DAT', str(tmpdir))
+  root = os.path.join(str(tmpdir), 'k2', 'c01')
+  target = os.path.join(root, '201300000', '201367065')
+  os.makedirs(os.path.join(target, 'data'))
+  np.save(os.path.join(target, 'data', 'lc_fpix.npy'), np.arange(60.).reshape(20, 3))
+  np.savez(os.path.join(target, 'nPLD.npz'), cdpp = 31.4)
+  with open(os.path.join(target, 'meta.txt'), 'wb') as f:
+    f.write(b'meta')
+  return root, target
+
+def test_read_through(tmpdir, monkeypatch):
+  '''
+
+  '''
+
+  root, target = setup_season(tmpdir, monkeypatch)
+  assert Pack(root) == 3
+  assert not os.path.exists(os.path.join(root, '201300000'))
+
+  # The packed files and directories
+  assert Exists(target)
+  assert Exists(os.path.join(target, 'data', 'lc_fpix.npy'))
+  assert not Exists(os.path.join(target, 'data', 'sc_fpix.npy'))
+  assert ListDir(root) == ['201300000']
+  assert ListDir(target) == ['data', 'meta.txt', 'nPLD.npz']
+  with Open(os.path.join(target, 'meta.txt')) as f:
+    assert f.read() == b'meta'
+  assert Load(os.path.join(target, 'nPLD.npz'))['cdpp'] == 31.4
+
+  # Arrays are memory-mapped straight from the pack
+  x = Load(os.path.join(target, 'data', 'lc_fpix.npy'), mmap_mode = 'r')
+  assert isinstance(x, np.memmap)
+  assert os.path.abspath(x.filename) == os.path.abspath(os.path.join(root, 'pack.dat'))
+  assert np.array_equal(x, np.arange(60.).reshape(20, 3))
+  assert np.array_equal(Load(os.path.join(target, 'data', 'lc_fpix.npy')), x)
+
+  # Files written to disk take precedence
+  os.makedirs(os.path.join(target, 'data'))
+  np.save(os.path.join(target, 'data', 'lc_fpix.npy'), np.zeros((20, 3)))
+  assert np.all(Load(os.path.join(target, 'data', 'lc_fpix.npy'), mmap_mode = 'r') == 0)
+  assert ListDir(os.path.join(target, 'data')) == ['lc_fpix.npy']
+
+  # Removing the directory removes its packed files, but not the files on disk
+  Remove(target)
+  assert not Exists(os.path.join(target, 'meta.txt'))
+  assert ListDir(target) == ['data']
+  assert np.all(Load(os.path.join(target, 'data', 'lc_fpix.npy')) == 0)
+  assert len(GetPack(root).files) == 0
+
+def test_unpack(tmpdir, monkeypatch):
+  '''
+
+  '''
+
+  root, target = setup_season(tmpdir, monkeypatch)
+  mtime = os.path.getmtime(os.path.join(target, 'meta.txt'))
+  Pack(root)
+
+  # Extract one target, keeping the pack
+  assert Unpack(root, prefix = '201300000/201367065/data', keep = True) == 1
+  assert os.path.exists(os.path.join(target, 'data', 'lc_fpix.npy'))
+  assert not os.path.exists(os.path.join(target, 'meta.txt'))
+  assert len(GetPack(root).files) == 3
+
+  # Extract everything; files already on disk are not overwritten
+  np.save(os.path.join(target, 'data', 'lc_fpix.npy'), np.zeros((20, 3)))
+  assert Unpack(root) == 2
+  assert np.all(np.load(os.path.join(target, 'data', 'lc_fpix.npy')) == 0)
+  assert np.load(os.path.join(target, 'nPLD.npz'))['cdpp'] == 31.4
+  assert os.path.getmtime(os.path.join(target, 'meta.txt')) == mtime
+  assert not os.path.exists(os.path.join(root, 'pack.dat'))
+  assert not os.path.exists(os.path.join(root, 'pack.idx'))
+  assert GetPack(root) is None
+
+def test_compact(tmpdir):
+  '''
+
+  '''
+
+  # Pack a few files of different sizes
+  root = str(tmpdir)
+  os.makedirs(os.path.join(root, '201367065'))
+  files = {}
+  for name, size in [('c.npz', 300), ('a.npz', 100), ('b.npz', 200)]:
+    files['201367065/' + name] = (name[0] * size).encode('ascii')
+    with open(os.path.join(root, '201367065', name), 'wb') as f:
+      f.write(files['201367065/' + name])
+  assert Pack(root) == 3
+
+  # A reader that loaded the index before compaction, as in another process
+  reader = PackFile(root)
+  assert reader.read('201367065/a.npz') == files['201367065/a.npz']
+
+  # Replace a file and compact, so that the offsets of all files change
+  # while the index keeps the same number of records
+  files['201367065/a.npz'] = b'z' * 50
+  GetPack(root).add('201367065/a.npz', files['201367065/a.npz'])
+  Compact(root)
+  for rel, data in files.items():
+    assert reader.read(rel) == data
+  reader.refresh(force = True)
+  assert sorted(reader.files) == sorted(files)
+
+def test_concurrent_remove(tmpdir):
+  '''
+
+  '''
+
+  # Two processes remove different files from the same pack
+  root = str(tmpdir)
+  os.makedirs(os.path.join(root, '201367065'))
+  for name in ['a.npz', 'b.npz', 'c.npz']:
+    with open(os.path.join(root, '201367065', name), 'wb') as f:
+      f.write(name.encode('ascii'))
+  Pack(root)
+  one = PackFile(root)
+  two = PackFile(root)
+  one.remove('201367065/a.npz')
+  two.remove('201367065/b.npz')
+  assert sorted(two.files) == ['201367065/c.npz']
+  one.refresh(force = True)
+  assert sorted(one.files) == ['201367065/c.npz']
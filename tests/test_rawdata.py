@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+test_rawdata.py
+---------------
+
+Test saving and loading the raw target data in both layouts.
+
+'''
+
+import everest
+from everest.missions.k2 import rawdata
+from everest.missions.k2.rawdata import RawDataExists, SaveRawData, LoadRawData, MigrateRawData
+import numpy as np
+import os
+
+def setup_data():
+  '''
+
+  '''
+
+  np.random.seed(42)
+  data = {}
+  for prefix, ncad in [('', 100), ('sc_', 300)]:
+    data[prefix + 'cadn'] = np.arange(ncad)
+    data[prefix + 'time'] = np.linspace(0, 10, ncad)
+    data[prefix + 'fpix'] = 1000. + np.random.randn(ncad, 12)
+    data[prefix + 'fpix_err'] = np.sqrt(data[prefix + 'fpix'])
+    data[prefix + 'qual'] = np.zeros(ncad, dtype = int)
+    data[prefix + 'pc1'] = np.random.randn(ncad)
+    data[prefix + 'pc2'] = np.random.randn(ncad)
+  data['apertures'] = {'k2sff_15': np.ones((3, 4), dtype = bool)}
+  data['pixel_images'] = [np.ones((3, 4)), np.ones((3, 4)), np.ones((3, 4))]
+  data['nearby'] = [{'ID': 1, 'mag': 12.}]
+  data['hires'] = None
+  data['fitsheader'] = [{'KEPMAG': 12.}]
+  data['sc_fitsheader'] = None
+  return data
+
+def test_rawdata(tmpdir):
+  '''
+
+  '''
+
+  path = str(tmpdir)
+  d = setup_data()
+  assert not RawDataExists(path)
+  SaveRawData(path, d)
+  assert RawDataExists(path)
+
+  # Each cadence only gets its own arrays
+  for cadence, prefix in [('lc', ''), ('sc', 'sc_')]:
+    data = LoadRawData(path, cadence = cadence)
+    for key in rawdata.ARRAYS:
+      assert np.array_equal(data[key], d[prefix + key])
+    assert data['fpix'].dtype == np.float64
+    assert isinstance(data['fpix'], np.memmap)
+  assert data['apertures']['k2sff_15'].shape == (3, 4)
+  assert data['hires'] is None
+  assert data['fitsheader'][0]['KEPMAG'] == 12.
+
+  # Just the metadata
+  data = LoadRawData(path, arrays = False)
+  assert 'fpix' not in data
+  assert data['nearby'][0]['ID'] == 1
+
+def test_float32(tmpdir):
+  '''
+
+  '''
+
+  # Stored in single precision, but returned in double precision
+  path = str(tmpdir)
+  d = setup_data()
+  SaveRawData(path, d, float32 = True)
+  assert np.load(os.path.join(path, 'data', 'lc_fpix.npy')).dtype == np.float32
+  data = LoadRawData(path)
+  for key in ['fpix', 'fpix_err']:
+    assert data[key].dtype == np.float64
+    assert np.allclose(data[key], d[key], rtol = 1e-6)
+  assert np.array_equal(data['time'], d['time'])
+
+def test_legacy(tmpdir, monkeypatch):
+  '''
+
+  '''
+
+  # A target saved in the original layout
+  monkeypatch.setattr(rawdata, 'EVEREST_DAT', str(tmpdir))
+  path = os.path.join(str(tmpdir), 'k2', 'c01', '201300000', '201367065')
+  os.makedirs(path)
+  d = setup_data()
+  np.savez(os.path.join(path, 'data.npz'), **d)
+  assert RawDataExists(path)
+  for cadence, prefix in [('lc', ''), ('sc', 'sc_')]:
+    data = LoadRawData(path, cadence = cadence)
+    for key in rawdata.ARRAYS:
+      assert np.array_equal(data[key], d[prefix + key])
+  assert data['apertures']['k2sff_15'].shape == (3, 4)
+  assert data['hires'] is None
+
+  # Convert it to the current layout
+  assert MigrateRawData(campaign = 1, float32 = True) == 1
+  assert not os.path.exists(os.path.join(path, 'data.npz'))
+  assert os.path.exists(os.path.join(path, 'data', 'meta.pickle'))
+  for cadence, prefix in [('lc', ''), ('sc', 'sc_')]:
+    data = LoadRawData(path, cadence = cadence)
+    assert np.allclose(data['fpix'], d[prefix + 'fpix'], rtol = 1e-6)
+    assert np.array_equal(data['qual'], d[prefix + 'qual'])
+  assert data['nearby'][0]['ID'] == 1
+  assert MigrateRawData(campaign = 1) == 0
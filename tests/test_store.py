@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+test_store.py
+-------------
+
+Test saving and loading models in both storage layouts.
+
+'''
+
+import everest
+from everest.store import ModelExists, SaveModel, LoadModel
+import numpy as np
+import os
+
+def model_state():
+  '''
+
+  '''
+
+  np.random.seed(42)
+  ncad = 500
+  return dict(time = np.linspace(0, 10, ncad), fpix = np.random.randn(ncad, 20),
+              cdpp = 31.4, lam = [[1e5, None, None], [1e4, 1e3, None]],
+              outmask = np.array([3, 17, 250]), kernel_params = np.array([1., 2., 3.]),
+              inject = {'depth': 0.01, 'rec_depth': 0.0098}, breakpoints = np.array([249, 999999]))
+
+def test_store(tmpdir):
+  '''
+
+  '''
+
+  path = str(tmpdir)
+  d = model_state()
+  assert not ModelExists(path, 'nPLD')
+  SaveModel(path, 'nPLD', d)
+  assert ModelExists(path, 'nPLD')
+  data = LoadModel(path, 'nPLD')
+
+  # The large arrays are stored separately and memory-mapped
+  assert data.arrays == set(['time', 'fpix'])
+  assert np.array_equal(data['fpix'], d['fpix'])
+  assert isinstance(data['fpix'].base, np.memmap)
+
+  # Everything else comes back as it would from an npz file
+  assert data['cdpp'][()] == 31.4
+  assert data['lam'][()][1][2] is None
+  assert data['inject'][()]['depth'] == 0.01
+  assert np.array_equal(data['outmask'], d['outmask'])
+  assert set(data.keys()) == set(d.keys())
+
+  # Copy-on-write maps don't touch the file
+  fpix = data.load('fpix', mmap_mode = 'c')
+  fpix *= 2
+  assert np.array_equal(LoadModel(path, 'nPLD')['fpix'], d['fpix'])
+
+def test_legacy(tmpdir):
+  '''
+
+  '''
+
+  path = str(tmpdir)
+  d = model_state()
+  np.savez(os.path.join(path, 'rPLD.npz'), **d)
+  assert ModelExists(path, 'rPLD')
+  data = LoadModel(path, 'rPLD')
+  assert data['cdpp'][()] == 31.4
+  assert np.array_equal(data['fpix'], d['fpix'])
+
+  # Saving replaces the legacy file
+  SaveModel(path, 'rPLD', dict((key, data[key][()]) for key in data.keys()))
+  assert not os.path.exists(os.path.join(path, 'rPLD.npz'))
+  assert LoadModel(path, 'rPLD')['lam'][()][0][0] == 1e5